@@ -0,0 +1,171 @@
+"""Event-driven tracking of agent removals and stage changes.
+
+Scenario loops typically check after every iteration whether an agent is in
+:code:`simulation.removed_agents()` and look up :code:`simulation.agent(id)`
+to follow its progress along the journey. :class:`AgentEventTracker` turns
+both into a list of events per iteration instead, e.g.::
+
+    tracker = AgentEventTracker(simulation, agent_ids=[agent_id])
+    while simulation.agent_count() > 0:
+        simulation.iterate()
+        for event in tracker.update():
+            print(event.format())
+
+The cost per iteration does not depend on the number of agents:
+
+- removals are read from :code:`simulation.removed_agents()`, which only
+  contains the agents removed in the last iteration,
+- stage changes are only reported for the watched agents, and a watched
+  agent is only looked up if the number of agents targeting its current
+  stage changed. The counts are kept by the simulation, reading them costs
+  one call per stage targeted by a watched agent.
+
+A stage change is missed if it is exactly compensated in the same iteration,
+i.e., an agent leaves a stage while another one starts targeting it and the
+same holds for all stages involved.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+REMOVED = "removed"
+STAGE_CHANGE = "stage_change"
+
+
+@dataclass(frozen=True)
+class AgentEvent:
+    """Removal or stage change of an agent."""
+
+    iteration: int
+    agent_id: int
+    kind: str
+    """Either :data:`REMOVED` or :data:`STAGE_CHANGE`."""
+    stage_id: Optional[int] = None
+    """Stage targeted after the change, None for removals."""
+    previous_stage_id: Optional[int] = None
+    """Stage targeted before the change, None if the agent was not watched."""
+
+    def format(self) -> str:
+        if self.kind == REMOVED:
+            return f"Iteration {self.iteration}: agent {self.agent_id} was removed"
+        return (
+            f"Iteration {self.iteration}: agent {self.agent_id} targets stage "
+            f"{self.stage_id} (previously {self.previous_stage_id})"
+        )
+
+
+class AgentEventTracker:
+    """Collects the removals and stage changes after each iteration."""
+
+    def __init__(
+        self,
+        simulation,
+        agent_ids: Optional[Iterable[int]] = None,
+        on_removed: Optional[Callable[[AgentEvent], None]] = None,
+        on_stage_change: Optional[Callable[[AgentEvent], None]] = None,
+    ):
+        """Creates the tracker, events are collected from the next iteration on.
+
+        Args:
+            simulation: simulation to track
+            agent_ids: agents whose stage changes are reported, removals are
+                reported for all agents
+            on_removed: called with each removal event
+            on_stage_change: called with each stage change event
+        """
+        self.simulation = simulation
+        self.on_removed = on_removed
+        self.on_stage_change = on_stage_change
+        self.removed: Set[int] = set()
+        """Ids of all agents removed since the creation of the tracker."""
+
+        # watched agents by the stage they target, the stage proxies and the
+        # number of agents targeting each stage at the last update
+        self._stage_of: Dict[int, int] = {}
+        self._agents_by_stage: Dict[int, Set[int]] = {}
+        self._stages = {}
+        self._targeting: Dict[int, int] = {}
+        for agent_id in agent_ids or []:
+            self._watch(agent_id, simulation.agent(agent_id).stage_id)
+
+    def iterate(self, count: int = 1) -> List[AgentEvent]:
+        """Advances the simulation and collects the events of each iteration.
+
+        Args:
+            count: number of iterations to advance
+
+        Returns:
+            The events of all iterations, in order
+        """
+        events = []
+        # removed_agents() only holds the removals of the last iteration
+        for _ in range(count):
+            self.simulation.iterate()
+            events.extend(self.update())
+        return events
+
+    def update(self) -> List[AgentEvent]:
+        """Collects the events of the last iteration.
+
+        Has to be called after every single iteration if the simulation is
+        advanced elsewhere, e.g., by :class:`loop_profiler.LoopProfiler`.
+
+        Returns:
+            The events of the last iteration, removals first
+        """
+        iteration = self.simulation.iteration_count()
+        events = []
+        for agent_id in self.simulation.removed_agents():
+            self.removed.add(agent_id)
+            self._unwatch(agent_id)
+            events.append(AgentEvent(iteration, agent_id, REMOVED))
+
+        changed_stages = [
+            stage_id
+            for stage_id, stage in self._stages.items()
+            if stage.count_targeting() != self._targeting[stage_id]
+        ]
+        for stage_id in changed_stages:
+            self._targeting[stage_id] = self._stages[stage_id].count_targeting()
+        for stage_id in changed_stages:
+            for agent_id in list(self._agents_by_stage.get(stage_id, ())):
+                new_stage_id = self.simulation.agent(agent_id).stage_id
+                if new_stage_id != stage_id:
+                    self._unwatch(agent_id)
+                    self._watch(agent_id, new_stage_id)
+                    events.append(
+                        AgentEvent(
+                            iteration, agent_id, STAGE_CHANGE, new_stage_id, stage_id
+                        )
+                    )
+
+        for event in events:
+            callback = (
+                self.on_removed if event.kind == REMOVED else self.on_stage_change
+            )
+            if callback is not None:
+                callback(event)
+        return events
+
+    def stage_of(self, agent_id: int) -> Optional[int]:
+        """Stage targeted by a watched agent, None if it is not watched."""
+        return self._stage_of.get(agent_id)
+
+    def _watch(self, agent_id: int, stage_id: int) -> None:
+        self._stage_of[agent_id] = stage_id
+        self._agents_by_stage.setdefault(stage_id, set()).add(agent_id)
+        if stage_id not in self._stages:
+            self._stages[stage_id] = self.simulation.get_stage(stage_id)
+            self._targeting[stage_id] = self._stages[stage_id].count_targeting()
+
+    def _unwatch(self, agent_id: int) -> None:
+        stage_id = self._stage_of.pop(agent_id, None)
+        if stage_id is None:
+            return
+        agents = self._agents_by_stage[stage_id]
+        agents.discard(agent_id)
+        if not agents:
+            # no watched agent targets the stage any more
+            del self._agents_by_stage[stage_id]
+            del self._stages[stage_id]
+            del self._targeting[stage_id]
@@ -0,0 +1,264 @@
+"""Runs the cases of a parameter study of a scenario in parallel.
+
+A scenario is one of the ``sim_*.py`` scripts or a scenario file (see
+:mod:`scenario`). Each case calls its ``setup_simulation`` (or
+``Scenario.create_simulation``) with one combination of the parameter grid,
+runs the simulation until all agents left (or ``MAX_ITERATIONS`` of the
+scenario) and writes its own trajectory file. The summary of all cases is written to
+``summary.csv`` in the output directory, e.g.::
+
+    python batch_runner.py bottleneck runs/bottleneck \\
+        --param seed=1:51 --param bottleneck_width=1.0,1.5,2.0 --processes 8
+
+runs 150 cases with 8 worker processes.
+"""
+
+import argparse
+import ast
+import concurrent.futures
+import dataclasses
+import importlib
+import itertools
+import os
+import pathlib
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from gait_observer import GaitStatisticsObserver
+from scenario import load_scenario
+
+SCENARIOS = {
+    "corridor": "sim_corridor",
+    "corner": "sim_corner",
+    "bottleneck": "sim_bottleneck",
+    "four_way_crossing": "sim_four_way_crossing",
+    "zigzag": "sim_zigzag",
+    "arc_circle": "sim_arc_circle",
+}
+"""Module of each scenario, providing setup_simulation and MAX_ITERATIONS."""
+
+
+@dataclasses.dataclass
+class Case:
+    """One simulation of a parameter study."""
+
+    index: int
+    scenario: str
+    params: Dict[str, Any]
+    trajectory_file: pathlib.Path
+    max_iterations: Optional[int] = None
+
+
+def parameter_grid(**values: List[Any]) -> List[Dict[str, Any]]:
+    """All combinations of the given parameter values.
+
+    Args:
+        values: values of each parameter
+
+    Returns:
+        One dict of parameters per combination
+    """
+    names = list(values)
+    return [
+        dict(zip(names, combination))
+        for combination in itertools.product(*(values[name] for name in names))
+    ]
+
+
+def create_cases(
+    scenario: str,
+    grid: List[Dict[str, Any]],
+    output_dir: pathlib.Path,
+    max_iterations: Optional[int] = None,
+) -> List[Case]:
+    """Creates the cases of a parameter study.
+
+    Args:
+        scenario: name of the scenario, see :data:`SCENARIOS`, or path of a
+            scenario file
+        grid: parameters of each case, see :func:`parameter_grid`
+        output_dir: directory of the trajectory files
+        max_iterations: iteration limit of each case, inclusive like in the
+            scenario scripts (default: the one of the scenario)
+
+    Returns:
+        The cases, numbered in the order of the grid
+    """
+    if scenario not in SCENARIOS and not pathlib.Path(scenario).is_file():
+        raise ValueError(
+            f"Unknown scenario {scenario!r}, expected one of {list(SCENARIOS)} "
+            "or a scenario file."
+        )
+    name = scenario if scenario in SCENARIOS else pathlib.Path(scenario).stem
+    return [
+        Case(
+            index=index,
+            scenario=scenario,
+            params=params,
+            trajectory_file=pathlib.Path(output_dir) / f"{name}_{index:04d}.sqlite",
+            max_iterations=max_iterations,
+        )
+        for index, params in enumerate(grid)
+    ]
+
+
+def scenario_setup(scenario: str) -> Tuple[Callable, int]:
+    """Setup function and iteration limit of a scenario.
+
+    Args:
+        scenario: name of the scenario, see :data:`SCENARIOS`, or path of a
+            scenario file
+
+    Returns:
+        The function creating the simulation (with the trajectory file and
+        the parameters as keyword arguments) and MAX_ITERATIONS
+    """
+    if scenario in SCENARIOS:
+        module = importlib.import_module(SCENARIOS[scenario])
+        return module.setup_simulation, module.MAX_ITERATIONS
+    scenario = load_scenario(scenario)
+    return scenario.create_simulation, scenario.max_iterations
+
+
+def run_case(case: Case) -> Dict[str, Any]:
+    """Runs a single case.
+
+    Errors are not raised but reported in the error column, so a failing case
+    does not abort the whole study.
+
+    Args:
+        case: case to run
+
+    Returns:
+        Summary row of the case
+    """
+    row = {"case": case.index, "scenario": case.scenario, **case.params}
+    row["trajectory_file"] = str(case.trajectory_file)
+    start = time.perf_counter()
+    try:
+        setup_simulation, max_iterations = scenario_setup(case.scenario)
+        max_iterations = case.max_iterations or max_iterations
+
+        case.trajectory_file.unlink(missing_ok=True)
+        simulation = setup_simulation(
+            trajectory_file=case.trajectory_file, **case.params
+        )
+        row["agents"] = simulation.agent_count()
+
+        observer = GaitStatisticsObserver(simulation)
+        while (
+            simulation.agent_count() > 0
+            and simulation.iteration_count() <= max_iterations
+        ):
+            simulation.iterate()
+            observer()
+
+        summary = observer.summary()
+        row.update(
+            iterations=simulation.iteration_count(),
+            elapsed_time=simulation.elapsed_time(),
+            remaining_agents=simulation.agent_count(),
+            mean_speed=observer.mean_speed,
+            speed_std=observer.speed_std,
+            mean_steps=summary["steps"].mean(),
+        )
+    except Exception:
+        row["error"] = traceback.format_exc(limit=-1).strip()
+    row["wall_time"] = time.perf_counter() - start
+    return row
+
+
+def run_batch(
+    cases: List[Case], processes: Optional[int] = None, progress: bool = True
+) -> pd.DataFrame:
+    """Runs the cases in a pool of worker processes.
+
+    The summary is written to summary.csv next to the trajectory files of
+    the cases.
+
+    Args:
+        cases: cases to run, see :func:`create_cases`
+        processes: number of worker processes (default: number of CPUs)
+        progress: print a line after each finished case
+
+    Returns:
+        DataFrame with the summary row of each case, ordered by case
+    """
+    if not cases:
+        return pd.DataFrame()
+    for directory in {case.trajectory_file.parent for case in cases}:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    rows = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes or os.cpu_count()
+    ) as executor:
+        futures = [executor.submit(run_case, case) for case in cases]
+        for future in concurrent.futures.as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            if progress:
+                status = "failed" if "error" in row else "done"
+                print(
+                    f"[{len(rows)}/{len(cases)}] case {row['case']} {status} "
+                    f"in {row['wall_time']:.1f} s"
+                )
+
+    summary = pd.DataFrame(rows).sort_values("case", ignore_index=True)
+    summary.to_csv(cases[0].trajectory_file.parent / "summary.csv", index=False)
+    return summary
+
+
+def _parse_param(text):
+    # NAME=A,B,C or NAME=START:STOP[:STEP] (integer range)
+    name, _, values = text.partition("=")
+    if not name or not values:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUES, got {text!r}.")
+    if ":" in values:
+        return name, list(range(*(int(value) for value in values.split(":"))))
+
+    def parse(value):
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+
+    return name, [parse(value) for value in values.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run a parameter study of a scenario in parallel."
+    )
+    parser.add_argument(
+        "scenario", help=f"one of {', '.join(SCENARIOS)} or a scenario file"
+    )
+    parser.add_argument("output_dir", type=pathlib.Path)
+    parser.add_argument(
+        "--param",
+        type=_parse_param,
+        action="append",
+        default=[],
+        metavar="NAME=VALUES",
+        help="values of a setup_simulation parameter, e.g., seed=1:11 or "
+        "desired_speed_mean=1.3,1.5",
+    )
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--max-iterations", type=int)
+    args = parser.parse_args(argv)
+
+    cases = create_cases(
+        args.scenario,
+        parameter_grid(**dict(args.param)),
+        args.output_dir,
+        max_iterations=args.max_iterations,
+    )
+    summary = run_batch(cases, processes=args.processes)
+    print(summary.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
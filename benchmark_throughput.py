@@ -0,0 +1,404 @@
+"""Throughput benchmark of HumanoidModelV0 against CollisionFreeSpeedModel.
+
+The corridor, corner, bottleneck and four way crossing layouts of the
+``sim_*.py`` scripts are scaled up with the number of agents, so the agents
+are spawned with the same density for all agent counts. Each case (layout,
+model, number of agents) runs a fixed number of iterations in a fresh worker
+process, one case after another, and records:
+
+- iterations per second and agent-steps (agents moved in one iteration) per
+  second of :code:`Simulation.iterate`,
+- the share of the iteration time spent in the trajectory writer,
+- the peak resident memory of the worker process.
+
+The results are written as JSON, together with the JuPedSim version and the
+machine, for tracking the performance over time, e.g.::
+
+    python benchmark_throughput.py --agents 10 100 1000 10000 --iterations 200 \\
+        --output benchmarks/throughput.json
+"""
+
+import argparse
+import concurrent.futures
+import dataclasses
+import datetime
+import json
+import os
+import pathlib
+import platform
+import resource
+import tempfile
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional
+
+import jupedsim as jps
+import numpy as np
+import pandas as pd
+import shapely
+import shapely.affinity
+
+import sim_bottleneck
+import sim_corner
+import sim_corridor
+import sim_four_way_crossing
+from spawn_cache import distribute_by_number_cached
+
+AREA_PER_AGENT = 1.0
+"""Spawning area per agent in m², the layouts are scaled up to provide it."""
+
+DEFAULT_AGENT_COUNTS = [10, 100, 1000, 10000]
+
+DEFAULT_ITERATIONS = 200
+
+
+@dataclasses.dataclass
+class Layout:
+    """Geometry of a benchmark, the agents spawned in spawn_areas[i] walk to exits[i]."""
+
+    geometry: shapely.Geometry
+    spawn_areas: List[shapely.Polygon]
+    exits: List[shapely.Polygon]
+
+    def scaled(self, num_agents: int) -> "Layout":
+        """The layout scaled to provide :data:`AREA_PER_AGENT` for each agent.
+
+        Args:
+            num_agents: number of agents to spawn
+
+        Returns:
+            The scaled layout, the layout itself if it is large enough
+        """
+        spawn_area = sum(area.area for area in self.spawn_areas)
+        factor = max(1.0, np.sqrt(num_agents * AREA_PER_AGENT / spawn_area))
+
+        def scale(geometry):
+            return shapely.affinity.scale(
+                geometry, xfact=factor, yfact=factor, origin=(0, 0)
+            )
+
+        return Layout(
+            geometry=scale(self.geometry),
+            spawn_areas=[scale(area) for area in self.spawn_areas],
+            exits=[scale(area) for area in self.exits],
+        )
+
+
+LAYOUTS = {
+    "corridor": Layout(
+        sim_corridor.area, [sim_corridor.spawning_area], [sim_corridor.exit_area]
+    ),
+    "corner": Layout(
+        sim_corner.area, [sim_corner.spawning_area], [sim_corner.exit_area]
+    ),
+    "bottleneck": Layout(
+        sim_bottleneck.area,
+        [sim_bottleneck.spawning_area],
+        [sim_bottleneck.exit_area],
+    ),
+    "four_way_crossing": Layout(
+        sim_four_way_crossing.area,
+        [
+            shapely.box(x - 1, y - 1, x + 1, y + 1)
+            for x, y in sim_four_way_crossing.starting_positions
+        ],
+        sim_four_way_crossing.exit_area_list,
+    ),
+}
+
+
+def _humanoid_model():
+    return (
+        jps.HumanoidModelV0(),
+        jps.SqliteHumanoidTrajectoryWriter,
+        lambda journey_id, stage_id, position, v0: jps.HumanoidModelV0AgentParameters(
+            journey_id=journey_id,
+            stage_id=stage_id,
+            position=position,
+            desiredSpeed=v0,
+            height=1.75,
+        ),
+    )
+
+
+def _collision_free_speed_model():
+    return (
+        jps.CollisionFreeSpeedModel(),
+        jps.SqliteTrajectoryWriter,
+        lambda journey_id, stage_id, position, v0: jps.CollisionFreeSpeedModelAgentParameters(
+            journey_id=journey_id, stage_id=stage_id, position=position, v0=v0
+        ),
+    )
+
+
+MODELS: Dict[str, Callable] = {
+    "HumanoidModelV0": _humanoid_model,
+    "CollisionFreeSpeedModel": _collision_free_speed_model,
+}
+"""Factories of the model, its trajectory writer type and its agent parameters."""
+
+
+class TimedTrajectoryWriter:
+    """Trajectory writer measuring the time spent in the wrapped writer."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.write_time = 0.0
+
+    def begin_writing(self, simulation) -> None:
+        start = time.perf_counter()
+        self.writer.begin_writing(simulation)
+        self.write_time += time.perf_counter() - start
+
+    def write_iteration_state(self, simulation) -> None:
+        start = time.perf_counter()
+        self.writer.write_iteration_state(simulation)
+        self.write_time += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.writer, name)
+
+
+def setup_benchmark(
+    layout: str,
+    model: str,
+    num_agents: int,
+    trajectory_file: pathlib.Path,
+    seed: int = 1,
+):
+    """Creates the simulation of a benchmark case.
+
+    Args:
+        layout: name of the layout, see :data:`LAYOUTS`
+        model: name of the model, see :data:`MODELS`
+        num_agents: number of agents, spread evenly over the spawning areas
+        trajectory_file: output file
+        seed: seed of the agent positions and desired speeds
+
+    Returns:
+        The simulation and its timed trajectory writer
+    """
+    scaled = LAYOUTS[layout].scaled(num_agents)
+    operational_model, writer_type, agent_parameters = MODELS[model]()
+    writer = TimedTrajectoryWriter(
+        writer_type(output_file=pathlib.Path(trajectory_file))
+    )
+    simulation = jps.Simulation(
+        model=operational_model,
+        geometry=scaled.geometry,
+        trajectory_writer=writer,
+    )
+
+    rng = np.random.default_rng(seed)
+    groups = np.array_split(np.arange(num_agents), len(scaled.spawn_areas))
+    for spawn_area, exit_area, group in zip(scaled.spawn_areas, scaled.exits, groups):
+        if len(group) == 0:
+            continue
+        exit_id = simulation.add_exit_stage(exit_area.exterior.coords[:-1])
+        journey_id = simulation.add_journey(jps.JourneyDescription([exit_id]))
+        positions = distribute_by_number_cached(
+            polygon=spawn_area,
+            number_of_agents=len(group),
+            distance_to_agents=0.5,
+            distance_to_polygon=0.2,
+            seed=seed,
+        )
+        for position, v0 in zip(positions, rng.normal(1.34, 0.2, len(group))):
+            simulation.add_agent(
+                agent_parameters(journey_id, exit_id, position, float(v0))
+            )
+    return simulation, writer
+
+
+def run_benchmark_case(
+    layout: str,
+    model: str,
+    num_agents: int,
+    iterations: int = DEFAULT_ITERATIONS,
+    seed: int = 1,
+    trajectory_dir: Optional[pathlib.Path] = None,
+) -> Dict[str, Any]:
+    """Runs a single benchmark case.
+
+    Run each case in its own process, the peak memory is the one of the whole
+    process. Errors are not raised but reported in the error column.
+
+    Args:
+        layout: name of the layout, see :data:`LAYOUTS`
+        model: name of the model, see :data:`MODELS`
+        num_agents: number of agents
+        iterations: number of iterations, less if all agents left before
+        seed: seed of the agent positions and desired speeds
+        trajectory_dir: directory of the trajectory file (default: a
+            temporary directory)
+
+    Returns:
+        Result row of the case
+    """
+    row = {"layout": layout, "model": model, "agents": num_agents}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        trajectory_file = pathlib.Path(trajectory_dir or tmp_dir) / (
+            f"{layout}_{model}_{num_agents}.sqlite"
+        )
+        trajectory_file.unlink(missing_ok=True)
+        try:
+            start = time.perf_counter()
+            simulation, writer = setup_benchmark(
+                layout, model, num_agents, trajectory_file, seed
+            )
+            row["setup_time"] = time.perf_counter() - start
+
+            agent_steps = 0
+            start = time.perf_counter()
+            while (
+                simulation.agent_count() > 0
+                and simulation.iteration_count() < iterations
+            ):
+                agent_steps += simulation.agent_count()
+                simulation.iterate()
+            iterate_time = time.perf_counter() - start
+
+            row.update(
+                iterations=simulation.iteration_count(),
+                agent_steps=agent_steps,
+                iterate_time=iterate_time,
+                iterations_per_second=simulation.iteration_count() / iterate_time,
+                agent_steps_per_second=agent_steps / iterate_time,
+                writer_time=writer.write_time,
+                writer_share=writer.write_time / iterate_time,
+                trajectory_file_bytes=trajectory_file.stat().st_size,
+            )
+        except Exception:
+            row["error"] = traceback.format_exc(limit=-1).strip()
+    # kibibytes on Linux
+    row["peak_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return row
+
+
+def run_benchmarks(
+    layouts: List[str],
+    models: List[str],
+    agent_counts: List[int],
+    iterations: int = DEFAULT_ITERATIONS,
+    seed: int = 1,
+    progress: bool = True,
+) -> pd.DataFrame:
+    """Runs all combinations of layouts, models and agent counts.
+
+    The cases run one after another, each in a fresh worker process, so they
+    neither compete for the CPU nor share their peak memory.
+
+    Args:
+        layouts: names of the layouts, see :data:`LAYOUTS`
+        models: names of the models, see :data:`MODELS`
+        agent_counts: numbers of agents
+        iterations: number of iterations of each case
+        seed: seed of the agent positions and desired speeds
+        progress: print a line after each finished case
+
+    Returns:
+        DataFrame with the result row of each case
+    """
+    rows = []
+    cases = [
+        (layout, model, num_agents)
+        for layout in layouts
+        for model in models
+        for num_agents in agent_counts
+    ]
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=1, max_tasks_per_child=1
+    ) as executor:
+        for layout, model, num_agents in cases:
+            row = executor.submit(
+                run_benchmark_case, layout, model, num_agents, iterations, seed
+            ).result()
+            rows.append(row)
+            if progress:
+                status = (
+                    "failed"
+                    if "error" in row
+                    else f"{row['agent_steps_per_second']:.0f} agent-steps/s"
+                )
+                print(
+                    f"[{len(rows)}/{len(cases)}] {layout} {model} "
+                    f"{num_agents} agents: {status}"
+                )
+    return pd.DataFrame(rows)
+
+
+def write_results(results: pd.DataFrame, output_file: pathlib.Path, **settings):
+    """Writes the results with the description of the machine as JSON.
+
+    Args:
+        results: result rows, see :func:`run_benchmarks`
+        output_file: JSON file to write
+        settings: benchmark settings stored alongside the results
+    """
+    output_file = pathlib.Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "jupedsim_version": jps.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "settings": settings,
+        "results": json.loads(results.to_json(orient="records")),
+    }
+    output_file.write_text(json.dumps(document, indent=2) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the throughput of the simulation models."
+    )
+    parser.add_argument(
+        "--layouts", nargs="+", choices=list(LAYOUTS), default=list(LAYOUTS)
+    )
+    parser.add_argument(
+        "--models", nargs="+", choices=list(MODELS), default=list(MODELS)
+    )
+    parser.add_argument("--agents", nargs="+", type=int, default=DEFAULT_AGENT_COUNTS)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--output",
+        type=pathlib.Path,
+        default=pathlib.Path("benchmarks")
+        / f"throughput_{datetime.datetime.now():%Y%m%d_%H%M%S}.json",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        args.layouts, args.models, args.agents, args.iterations, args.seed
+    )
+    write_results(
+        results,
+        args.output,
+        layouts=args.layouts,
+        models=args.models,
+        agents=args.agents,
+        iterations=args.iterations,
+        seed=args.seed,
+    )
+    columns = [
+        column
+        for column in [
+            "layout",
+            "model",
+            "agents",
+            "iterations_per_second",
+            "agent_steps_per_second",
+            "writer_share",
+            "peak_rss_mib",
+        ]
+        if column in results
+    ]
+    print(results[columns].to_string(index=False))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,93 +1,446 @@
-import sqlite3
+"""Compares a JuPedSim sqlite output against a reference output.
+
+The trajectory_data tables are aligned on (frame, id) with a hash join, every
+other column is compared within a tolerance (per column absolute and relative
+tolerance, as ``numpy.isclose`` with the reference as second argument). The
+report lists the schema and metadata differences, the rows only present in
+one of the files and per column the number of mismatches, the maximum errors
+and the first divergent frame.
+
+With ``--first-divergence`` only the humanoid trajectory columns are
+compared, frame by frame in chunks streamed from both files, and the scan
+stops at the first frame and agent exceeding the tolerance. An early
+divergence of a long run is found without reading the rest of the files.
+
+Usage (the exit code is 1 if the files differ)::
+
+    python compare_sqlite.py [ACTUAL] [REFERENCE] [--abs-tol 1e-6]
+        [--rel-tol 0] [--tol pos_x=1e-3,0] [--first-divergence]
+"""
+
+import argparse
+import dataclasses
 import difflib
+import pathlib
+import sqlite3
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from sqlite_loader_moded_pepy_fun import (  # noqa: E402
+    HUMANOID_COLUMNS,
+    load_trajectory_chunks_from_jupedsim_sqlite,
+)
+
+DEFAULT_ABS_TOL = 1e-6
+DEFAULT_REL_TOL = 0.0
+
+KEY_COLUMNS = ["frame", "id"]
+
+_STATS_COLUMNS = [
+    "column",
+    "mismatches",
+    "max_abs_error",
+    "max_rel_error",
+    "first_divergent_frame",
+]
+
+
+@dataclasses.dataclass
+class ComparisonReport:
+    """Differences between an actual and a reference output."""
+
+    schema_diff: List[str]
+    metadata_diff: Dict[str, Tuple[Optional[str], Optional[str]]]
+    rows: int
+    rows_only_in_actual: int
+    rows_only_in_reference: int
+    mismatched_rows: int
+    first_divergent_frame: Optional[int]
+    column_stats: pd.DataFrame
+
+    @property
+    def identical(self) -> bool:
+        """Whether both outputs are equal within the tolerances."""
+        return (
+            not self.schema_diff
+            and not self.metadata_diff
+            and self.first_divergent_frame is None
+        )
 
+    def format(self) -> str:
+        """Human readable summary of the report."""
+        lines = []
+        if self.schema_diff:
+            lines += ["Schema differences:", *self.schema_diff, ""]
+        for key, (actual, reference) in self.metadata_diff.items():
+            lines.append(f"Metadata {key}: {actual!r} (reference {reference!r})")
+        lines += [
+            f"Rows compared:           {self.rows}",
+            f"Rows only in actual:     {self.rows_only_in_actual}",
+            f"Rows only in reference:  {self.rows_only_in_reference}",
+            f"Mismatched rows:         {self.mismatched_rows}",
+            f"First divergent frame:   {self.first_divergent_frame}",
+        ]
+        mismatching = self.column_stats[self.column_stats["mismatches"] > 0]
+        if len(mismatching):
+            lines += ["", mismatching.to_string(index=False)]
+        lines.append("IDENTICAL" if self.identical else "DIFFERENT")
+        return "\n".join(lines)
 
-def get_schema(db_path):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT sql FROM sqlite_master WHERE type='table'")
-    schema = sorted(row[0] for row in cursor.fetchall() if row[0])
-    conn.close()
-    return schema
 
+@dataclasses.dataclass
+class Divergence:
+    """First row of the actual output differing from the reference."""
 
-def get_table_names(db_path):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return tables
+    frame: int
+    id: int
+    columns: List[str]
+    errors: Dict[str, float]
+    missing_in: Optional[str] = None
+
+    def format(self) -> str:
+        """Human readable description of the divergence."""
+        if self.missing_in is not None:
+            return (
+                f"First divergence at frame {self.frame}, agent {self.id}: "
+                f"row missing in {self.missing_in}"
+            )
+        errors = ", ".join(
+            f"{column} (error {self.errors[column]:.3g})" for column in self.columns
+        )
+        return (
+            f"First divergence at frame {self.frame}, agent {self.id}: "
+            f"columns out of tolerance: {errors}"
+        )
+
+
+def get_schema(db_path) -> List[str]:
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT sql FROM sqlite_master WHERE type='table'")
+        return sorted(row[0] for row in rows if row[0])
+
+
+def get_metadata(db_path) -> Dict[str, str]:
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT key, value FROM metadata"))
+
+
+def load_trajectory_table(db_path) -> pd.DataFrame:
+    with sqlite3.connect(db_path) as conn:
+        return pd.read_sql_query("SELECT * FROM trajectory_data", conn)
+
+
+def compare_frames(
+    actual: pd.DataFrame,
+    reference: pd.DataFrame,
+    abs_tol: float = DEFAULT_ABS_TOL,
+    rel_tol: float = DEFAULT_REL_TOL,
+    tolerances: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Aligns two trajectory tables on (frame, id) and compares the values.
+
+    Args:
+        actual: trajectory rows of the actual output
+        reference: trajectory rows of the reference output
+        abs_tol: absolute tolerance of all columns
+        rel_tol: relative tolerance (to the reference) of all columns
+        tolerances: (absolute, relative) tolerance of single columns
+
+    Returns:
+        Per column statistics (mismatches, max_abs_error, max_rel_error,
+        first_divergent_frame), the frame, id and side ("actual" or
+        "reference") of the rows only present in one of the tables and the
+        frame and id of each mismatched row
+    """
+    tolerances = tolerances or {}
+    columns = [
+        column
+        for column in actual.columns
+        if column in reference.columns and column not in KEY_COLUMNS
+    ]
+    merged = actual.merge(
+        reference,
+        on=KEY_COLUMNS,
+        how="outer",
+        suffixes=("", "_reference"),
+        indicator=True,
+        sort=False,
+    )
+    both = (merged["_merge"] == "both").to_numpy()
+    missing = merged.loc[~both, KEY_COLUMNS]
+    missing["side"] = np.where(
+        merged.loc[~both, "_merge"] == "left_only", "actual", "reference"
+    )
+    merged = merged[both]
+    frames = merged["frame"].to_numpy()
+
+    stats = []
+    mismatched = np.zeros(len(merged), dtype=bool)
+    for column in columns:
+        values = merged[column].to_numpy(dtype=float)
+        expected = merged[f"{column}_reference"].to_numpy(dtype=float)
+        error = np.abs(values - expected)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            relative_error = error / np.abs(expected)
+        mismatches = _exceeds_tolerance(
+            values, expected, *tolerances.get(column, (abs_tol, rel_tol))
+        )
+        mismatched |= mismatches
+
+        stats.append(
+            {
+                "column": column,
+                "mismatches": int(mismatches.sum()),
+                "max_abs_error": np.nanmax(error, initial=0.0),
+                "max_rel_error": np.nanmax(
+                    np.where(np.isinf(relative_error), np.nan, relative_error),
+                    initial=0.0,
+                ),
+                "first_divergent_frame": (
+                    int(frames[mismatches].min()) if mismatches.any() else None
+                ),
+            }
+        )
+
+    return (
+        pd.DataFrame(stats, columns=_STATS_COLUMNS).astype(
+            {"first_divergent_frame": "Int64"}
+        ),
+        missing.reset_index(drop=True),
+        merged.loc[mismatched, KEY_COLUMNS].reset_index(drop=True),
+    )
 
 
-def get_table_data(db_path, table):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM {table}")
-    data = sorted(cursor.fetchall())
-    conn.close()
-    return data
+def compare_sqlite(
+    actual_db,
+    reference_db,
+    abs_tol: float = DEFAULT_ABS_TOL,
+    rel_tol: float = DEFAULT_REL_TOL,
+    tolerances: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> ComparisonReport:
+    """Compares two JuPedSim sqlite outputs.
 
+    Args:
+        actual_db: output to check
+        reference_db: reference output
+        abs_tol: absolute tolerance of all columns
+        rel_tol: relative tolerance (to the reference) of all columns
+        tolerances: (absolute, relative) tolerance of single columns
 
-def diff_text(list1, list2, label1="DB1", label2="DB2"):
-    diff = difflib.unified_diff(
-        list1, list2, fromfile=label1, tofile=label2, lineterm=""
+    Returns:
+        The report of the differences
+    """
+    schema_diff = list(
+        difflib.unified_diff(
+            get_schema(actual_db),
+            get_schema(reference_db),
+            fromfile=str(actual_db),
+            tofile=str(reference_db),
+            lineterm="",
+        )
     )
-    return "\n".join(diff)
-
-
-# --- Main logic ---
-db1 = "quick_corridor_sim.sqlite"
-db2 = "ref_quick_compare.sqlite"
-
-# Compare schemas
-schema1 = get_schema(db1)
-schema2 = get_schema(db2)
-print("🔍 Schema differences:")
-print(diff_text(schema1, schema2, "quick_test", "ref_quick_test"))
-
-
-# to round up floats in tuples
-def round_tuple(t, ndigits=6):
-    return tuple(round(x, ndigits) if isinstance(x, float) else x for x in t)
-
-
-# Compare data in tables both DBs share
-common_tables = set(get_table_names(db1)) & set(get_table_names(db2))
-for table in sorted(common_tables):
-    if table == "frame_data" or table == "geometry":
-        continue
-    data1_raw = get_table_data(db1, table)
-    data2_raw = get_table_data(db2, table)
-
-    data1 = [round_tuple(row) for row in data1_raw]
-    data2 = [round_tuple(row) for row in data2_raw]
-    if data1 != data2:
-        print(f"\n Differences in table '{table}':")
-
-        # Use SequenceMatcher to show differences side by side
-        matcher = difflib.SequenceMatcher(None, data1, data2)
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-            if tag == "replace":
-                for line1, line2 in zip(data1[i1:i2], data2[j1:j2]):
-                    print(f"REPLACED:\n  Expected: {line1}\n  Actual:   {line2}")
-                    input()
-                if (i2 - i1) != (j2 - j1):  # In case of unequal lengths
-                    extra_from_1 = data1[i1 + (j2 - j1) : i2]
-                    extra_from_2 = data2[j1 + (i2 - i1) : j2]
-                    for line in extra_from_1:
-                        print(f"REMOVED (extra): {line}")
-                        input()
-                    for line in extra_from_2:
-                        print(f"ADDED (extra):   {line}")
-                        input()
-            elif tag == "delete":
-                for line in data1[i1:i2]:
-                    print(f"REMOVED: {line}")
-                    input()
-            elif tag == "insert":
-                for line in data2[j1:j2]:
-                    print(f"ADDED:   {line}")
-                    input()
-
-print("-- END --")
+
+    actual_metadata = get_metadata(actual_db)
+    reference_metadata = get_metadata(reference_db)
+    metadata_diff = {
+        key: (actual_metadata.get(key), reference_metadata.get(key))
+        for key in sorted(actual_metadata.keys() | reference_metadata.keys())
+        if actual_metadata.get(key) != reference_metadata.get(key)
+    }
+
+    actual = load_trajectory_table(actual_db)
+    reference = load_trajectory_table(reference_db)
+    column_stats, missing, mismatched = compare_frames(
+        actual, reference, abs_tol, rel_tol, tolerances
+    )
+    divergent_frames = np.concatenate(
+        [missing["frame"].to_numpy(), mismatched["frame"].to_numpy()]
+    )
+
+    return ComparisonReport(
+        schema_diff=schema_diff,
+        metadata_diff=metadata_diff,
+        rows=len(actual) - int((missing["side"] == "actual").sum()),
+        rows_only_in_actual=int((missing["side"] == "actual").sum()),
+        rows_only_in_reference=int((missing["side"] == "reference").sum()),
+        mismatched_rows=len(mismatched),
+        first_divergent_frame=(
+            int(divergent_frames.min()) if len(divergent_frames) else None
+        ),
+        column_stats=column_stats,
+    )
+
+
+def find_first_divergence(
+    actual_db,
+    reference_db,
+    abs_tol: float = DEFAULT_ABS_TOL,
+    rel_tol: float = DEFAULT_REL_TOL,
+    tolerances: Optional[Dict[str, Tuple[float, float]]] = None,
+    frames_per_chunk: int = 1000,
+) -> Optional[Divergence]:
+    """Finds the first frame and agent where the outputs differ.
+
+    Both files are streamed in frame order and compared chunk by chunk, the
+    scan stops at the first chunk containing a divergence. Only the humanoid
+    trajectory columns are compared, schema and metadata are not.
+
+    Args:
+        actual_db: output to check
+        reference_db: reference output
+        abs_tol: absolute tolerance of all columns
+        rel_tol: relative tolerance (to the reference) of all columns
+        tolerances: (absolute, relative) tolerance of single columns
+        frames_per_chunk: number of frames read from each file at once
+
+    Returns:
+        The first divergence, ordered by frame and id, None if the outputs
+        are equal within the tolerances
+    """
+    tolerances = tolerances or {}
+    chunks = _aligned_chunks(
+        *(
+            (
+                chunk.rename(columns=HUMANOID_COLUMNS)
+                for chunk in load_trajectory_chunks_from_jupedsim_sqlite(
+                    pathlib.Path(db_path),
+                    columns=list(HUMANOID_COLUMNS),
+                    frames_per_chunk=frames_per_chunk,
+                )
+            )
+            for db_path in (actual_db, reference_db)
+        )
+    )
+    for actual, reference in chunks:
+        _, missing, mismatched = compare_frames(
+            actual, reference, abs_tol, rel_tol, tolerances
+        )
+        if missing.empty and mismatched.empty:
+            continue
+
+        first = (
+            pd.concat([missing, mismatched.assign(side=None)], ignore_index=True)
+            .sort_values(KEY_COLUMNS)
+            .iloc[0]
+        )
+        frame, agent_id = int(first["frame"]), int(first["id"])
+        if not pd.isna(first["side"]):
+            missing_in = "reference" if first["side"] == "actual" else "actual"
+            return Divergence(frame, agent_id, [], {}, missing_in=missing_in)
+
+        row, expected_row = (
+            chunk[(chunk["frame"] == frame) & (chunk["id"] == agent_id)].iloc[0]
+            for chunk in (actual, reference)
+        )
+        columns, errors = [], {}
+        for column in actual.columns:
+            if column in KEY_COLUMNS:
+                continue
+            value, expected = float(row[column]), float(expected_row[column])
+            if _exceeds_tolerance(
+                value, expected, *tolerances.get(column, (abs_tol, rel_tol))
+            ):
+                columns.append(column)
+                errors[column] = abs(value - expected)
+        return Divergence(frame, agent_id, columns, errors)
+    return None
+
+
+def _aligned_chunks(
+    actual_chunks: Iterator[pd.DataFrame], reference_chunks: Iterator[pd.DataFrame]
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    # pairs of chunks covering the same frames, the chunks of both streams
+    # contain whole frames, so all rows up to the smaller of both last frames
+    # have been read
+    actual = next(actual_chunks, None)
+    reference = next(reference_chunks, None)
+    while actual is not None and reference is not None:
+        last = min(actual["frame"].iloc[-1], reference["frame"].iloc[-1])
+        actual_cut = actual["frame"].searchsorted(last, side="right")
+        reference_cut = reference["frame"].searchsorted(last, side="right")
+        yield actual.iloc[:actual_cut], reference.iloc[:reference_cut]
+        actual = _remaining(actual.iloc[actual_cut:], actual_chunks)
+        reference = _remaining(reference.iloc[reference_cut:], reference_chunks)
+
+    # frames only contained in one of the outputs
+    while actual is not None:
+        yield actual, actual.iloc[:0]
+        actual = next(actual_chunks, None)
+    while reference is not None:
+        yield reference.iloc[:0], reference
+        reference = next(reference_chunks, None)
+
+
+def _remaining(rest, chunks):
+    return next(chunks, None) if rest.empty else rest
+
+
+def _exceeds_tolerance(values, expected, abs_tol, rel_tol):
+    within = np.abs(values - expected) <= abs_tol + rel_tol * np.abs(expected)
+    return ~(within | (np.isnan(values) & np.isnan(expected)))
+
+
+def _parse_tolerance(text):
+    # COLUMN=ABS[,REL]
+    column, _, values = text.partition("=")
+    try:
+        tolerance = [float(value) for value in values.split(",")]
+    except ValueError:
+        tolerance = []
+    if not column or len(tolerance) not in (1, 2):
+        raise argparse.ArgumentTypeError(f"Expected COLUMN=ABS[,REL], got {text!r}.")
+    return column, (tolerance[0], tolerance[1] if len(tolerance) > 1 else 0.0)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare a JuPedSim sqlite output against a reference."
+    )
+    parser.add_argument("actual", nargs="?", default="quick_corridor_sim.sqlite")
+    parser.add_argument("reference", nargs="?", default="ref_quick_compare.sqlite")
+    parser.add_argument("--abs-tol", type=float, default=DEFAULT_ABS_TOL)
+    parser.add_argument("--rel-tol", type=float, default=DEFAULT_REL_TOL)
+    parser.add_argument(
+        "--tol",
+        type=_parse_tolerance,
+        action="append",
+        default=[],
+        metavar="COLUMN=ABS[,REL]",
+        help="tolerance of a single column",
+    )
+    parser.add_argument(
+        "--first-divergence",
+        action="store_true",
+        help="only find the first diverging frame and agent, stopping early",
+    )
+    args = parser.parse_args(argv)
+
+    if args.first_divergence:
+        divergence = find_first_divergence(
+            args.actual,
+            args.reference,
+            abs_tol=args.abs_tol,
+            rel_tol=args.rel_tol,
+            tolerances=dict(args.tol),
+        )
+        print("IDENTICAL" if divergence is None else divergence.format())
+        return 0 if divergence is None else 1
+
+    report = compare_sqlite(
+        args.actual,
+        args.reference,
+        abs_tol=args.abs_tol,
+        rel_tol=args.rel_tol,
+        tolerances=dict(args.tol),
+    )
+    print(report.format())
+    return 0 if report.identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
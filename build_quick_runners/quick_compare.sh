@@ -22,7 +22,10 @@ fi
 
 python ../../jupedsim_test_sandbox/build_quick_runners/quick_corridor_sim.py
 
-# Compare the SQLite files
-python ../../jupedsim_test_sandbox/build_quick_runners/compare_sqlite.py
+# Compare the SQLite files, stop at the first divergence and only build the
+# full report if there is one
+if ! python ../../jupedsim_test_sandbox/build_quick_runners/compare_sqlite.py --first-divergence; then
+    python ../../jupedsim_test_sandbox/build_quick_runners/compare_sqlite.py
+fi
 
 
@@ -0,0 +1,330 @@
+"""Regression suite comparing all scenarios against golden summaries.
+
+Every scenario of :data:`batch_runner.SCENARIOS` is run in a reduced,
+seeded configuration (see :data:`REGRESSION_CASES`), all of them in parallel.
+Instead of the full trajectory file only a compact summary of each run is
+stored as reference in ``golden/<scenario>.json``: a hash per frame and a
+checksum per trajectory column, both over the values quantised to
+``quantum``. A run matches its reference if all hashes are equal, otherwise
+the first divergent frame and the changed columns are reported.
+
+Values closer than ``quantum`` to a rounding boundary can flip to the next
+quantisation step, choose ``quantum`` well above the expected numerical
+noise and well below the changes of interest.
+
+Create or update the references after an intended model change with::
+
+    python regression_suite.py --update
+
+and check a model change against them (the exit code is 1 on failures)::
+
+    python regression_suite.py [SCENARIO ...] [--processes 6]
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import pathlib
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from batch_runner import Case, run_case  # noqa: E402
+from sqlite_loader_moded_pepy_fun import (  # noqa: E402
+    HUMANOID_COLUMNS,
+    load_trajectory_arrays_from_jupedsim_sqlite,
+)
+
+GOLDEN_SCHEMA_VERSION = 1
+"""Version of the golden summary layout, increase to invalidate all references."""
+
+DEFAULT_GOLDEN_DIR = pathlib.Path(__file__).resolve().parent / "golden"
+
+DEFAULT_QUANTUM = 1e-6
+
+REGRESSION_CASES: Dict[str, Dict[str, Any]] = {
+    "corridor": {"params": {"num_agents": 3, "seed": 1}, "max_iterations": 1000},
+    "corner": {"params": {"seed": 1}, "max_iterations": 1000},
+    "bottleneck": {"params": {"num_agents": 10, "seed": 1}, "max_iterations": 1000},
+    "four_way_crossing": {"params": {"seed": 1}, "max_iterations": 1000},
+    "zigzag": {"params": {}, "max_iterations": 1000},
+    "arc_circle": {"params": {}, "max_iterations": 1000},
+}
+"""Reduced, deterministic configuration of each scenario of the suite."""
+
+
+def summarize_trajectory(
+    trajectory_file: pathlib.Path, quantum: float = DEFAULT_QUANTUM
+) -> Dict[str, Any]:
+    """Compact, hashable summary of a humanoid trajectory file.
+
+    Args:
+        trajectory_file: trajectory file in JuPedSim sqlite format
+        quantum: quantisation step of the values before hashing
+
+    Returns:
+        Dict with the number of rows, the hash of each frame and the checksum
+        of each trajectory column
+    """
+    data = load_trajectory_arrays_from_jupedsim_sqlite(
+        pathlib.Path(trajectory_file), columns=list(HUMANOID_COLUMNS)
+    )
+    frames, ids = data.pop("frame"), data.pop("id")
+    order = np.lexsort((ids, frames))
+    frames, ids = frames[order], ids[order]
+    columns = {
+        HUMANOID_COLUMNS[column]: np.rint(values[order] / quantum).astype(np.int64)
+        for column, values in data.items()
+    }
+
+    # one row of int64 per trajectory row, hashed frame by frame
+    rows = np.column_stack([ids.astype(np.int64), *columns.values()])
+    unique_frames, starts = np.unique(frames, return_index=True)
+    stops = np.append(starts[1:], len(frames))
+    frame_hashes = {
+        str(frame): _digest(rows[start:stop])
+        for frame, start, stop in zip(unique_frames.tolist(), starts, stops)
+    }
+
+    return {
+        "rows": len(frames),
+        "frame_hashes": frame_hashes,
+        "column_checksums": {
+            column: _digest(values) for column, values in columns.items()
+        },
+    }
+
+
+def compare_summaries(
+    summary: Dict[str, Any], golden: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Compares the summary of a run with its golden summary.
+
+    Args:
+        summary: summary of the run, see :func:`summarize_trajectory`
+        golden: reference summary
+
+    Returns:
+        Dict with the first divergent frame (None if all frames match) and
+        the columns whose checksum changed
+    """
+    frames = sorted({*summary["frame_hashes"], *golden["frame_hashes"]}, key=int)
+    first_divergent_frame = next(
+        (
+            int(frame)
+            for frame in frames
+            if summary["frame_hashes"].get(frame) != golden["frame_hashes"].get(frame)
+        ),
+        None,
+    )
+    changed_columns = [
+        column
+        for column in sorted(
+            {*summary["column_checksums"], *golden["column_checksums"]}
+        )
+        if summary["column_checksums"].get(column)
+        != golden["column_checksums"].get(column)
+    ]
+    return {
+        "first_divergent_frame": first_divergent_frame,
+        "changed_columns": changed_columns,
+    }
+
+
+def run_regression_case(
+    scenario: str, work_dir: pathlib.Path, quantum: float = DEFAULT_QUANTUM
+) -> Dict[str, Any]:
+    """Runs the reduced configuration of a scenario and summarises it.
+
+    Args:
+        scenario: name of the scenario, key of :data:`REGRESSION_CASES`
+        work_dir: directory of the trajectory file
+        quantum: quantisation step of the values before hashing
+
+    Returns:
+        Golden summary of the run, with an error entry if the run failed
+    """
+    config = REGRESSION_CASES[scenario]
+    case = Case(
+        index=0,
+        scenario=scenario,
+        params=config["params"],
+        trajectory_file=pathlib.Path(work_dir) / f"{scenario}.sqlite",
+        max_iterations=config["max_iterations"],
+    )
+    row = run_case(case)
+    result = {
+        "schema_version": GOLDEN_SCHEMA_VERSION,
+        "scenario": scenario,
+        "params": config["params"],
+        "max_iterations": config["max_iterations"],
+        "quantum": quantum,
+        "wall_time": row["wall_time"],
+    }
+    if "error" in row:
+        return {**result, "error": row["error"]}
+
+    result.update(
+        iterations=row["iterations"],
+        agents=row["agents"],
+        remaining_agents=row["remaining_agents"],
+    )
+    try:
+        result.update(summarize_trajectory(case.trajectory_file, quantum))
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    return result
+
+
+def run_suite(
+    scenarios: Optional[List[str]] = None,
+    golden_dir: pathlib.Path = DEFAULT_GOLDEN_DIR,
+    update: bool = False,
+    processes: Optional[int] = None,
+    quantum: float = DEFAULT_QUANTUM,
+    output_dir: Optional[pathlib.Path] = None,
+) -> pd.DataFrame:
+    """Runs the scenarios in parallel and compares them with their references.
+
+    Args:
+        scenarios: scenarios to run (default: all of :data:`REGRESSION_CASES`)
+        golden_dir: directory of the golden summaries
+        update: write the summaries of the runs as new references instead of
+            comparing them
+        processes: number of worker processes (default: one per scenario)
+        quantum: quantisation step of the values before hashing, only used
+            if the reference does not define its own
+        output_dir: directory to keep the trajectory files in (default: a
+            temporary directory removed afterwards)
+
+    Returns:
+        DataFrame with one row per scenario, its status is "passed",
+        "failed", "error", "missing reference" or "updated", the details list
+        the changed columns of a failed or the error of a broken run
+    """
+    scenarios = scenarios or list(REGRESSION_CASES)
+    unknown = [scenario for scenario in scenarios if scenario not in REGRESSION_CASES]
+    if unknown:
+        raise ValueError(
+            f"Unknown scenarios {unknown}, expected some of {list(REGRESSION_CASES)}."
+        )
+    golden_dir = pathlib.Path(golden_dir)
+
+    goldens = {}
+    for scenario in scenarios:
+        golden_file = golden_dir / f"{scenario}.json"
+        if not update and golden_file.is_file():
+            goldens[scenario] = json.loads(golden_file.read_text())
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = pathlib.Path(output_dir or tmp_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes or len(scenarios)
+        ) as executor:
+            futures = {
+                scenario: executor.submit(
+                    run_regression_case,
+                    scenario,
+                    work_dir,
+                    goldens.get(scenario, {}).get("quantum", quantum),
+                )
+                for scenario in scenarios
+            }
+            results = {
+                scenario: future.result() for scenario, future in futures.items()
+            }
+
+    rows = []
+    for scenario, result in results.items():
+        row = {
+            "scenario": scenario,
+            "status": "passed",
+            "first_divergent_frame": None,
+            "details": "",
+            "wall_time": result.pop("wall_time"),
+        }
+        if "error" in result:
+            row.update(status="error", details=result["error"].splitlines()[-1])
+        elif update:
+            golden_dir.mkdir(parents=True, exist_ok=True)
+            (golden_dir / f"{scenario}.json").write_text(
+                json.dumps(result, indent=1) + "\n"
+            )
+            row["status"] = "updated"
+        elif scenario not in goldens:
+            row["status"] = "missing reference"
+        else:
+            golden = goldens[scenario]
+            if golden.get("schema_version") != GOLDEN_SCHEMA_VERSION:
+                row["status"] = "missing reference"
+            else:
+                comparison = compare_summaries(result, golden)
+                if comparison["first_divergent_frame"] is not None:
+                    row.update(
+                        status="failed",
+                        first_divergent_frame=comparison["first_divergent_frame"],
+                        details="changed columns: "
+                        + " ".join(comparison["changed_columns"]),
+                    )
+        rows.append(row)
+    return pd.DataFrame(rows).astype({"first_divergent_frame": "Int64"})
+
+
+def _digest(values: np.ndarray) -> str:
+    return hashlib.blake2b(
+        np.ascontiguousarray(values).tobytes(), digest_size=8
+    ).hexdigest()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare all scenarios against their golden summaries."
+    )
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        metavar="SCENARIO",
+        help=f"one of {', '.join(REGRESSION_CASES)} (default: all)",
+    )
+    parser.add_argument(
+        "--update", action="store_true", help="write new golden summaries"
+    )
+    parser.add_argument("--golden-dir", type=pathlib.Path, default=DEFAULT_GOLDEN_DIR)
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--quantum", type=float, default=DEFAULT_QUANTUM)
+    parser.add_argument(
+        "--output-dir",
+        type=pathlib.Path,
+        help="keep the trajectory files of the runs in this directory",
+    )
+    args = parser.parse_args(argv)
+    unknown = [
+        scenario for scenario in args.scenarios if scenario not in REGRESSION_CASES
+    ]
+    if unknown:
+        parser.error(f"unknown scenarios {unknown}")
+
+    start = time.perf_counter()
+    results = run_suite(
+        args.scenarios,
+        golden_dir=args.golden_dir,
+        update=args.update,
+        processes=args.processes,
+        quantum=args.quantum,
+        output_dir=args.output_dir,
+    )
+    print(results.to_string(index=False))
+    print(f"Finished in {time.perf_counter() - start:.1f} s")
+    return int(not results["status"].isin(["passed", "updated"]).all())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,475 @@
+"""Checkpoints of a running simulation and resuming from them.
+
+:class:`Checkpointer` is called after each ``simulation.iterate()`` and saves
+the state of all agents every ``interval`` iterations: position,
+orientation, journey and stage and all attributes of the model state (for
+the humanoid model, e.g., Xcom and the positions of the heels). The state is
+written as compressed numpy archive, one array per attribute::
+
+    simulation = setup_simulation(trajectory_file)
+    checkpointer = Checkpointer(simulation, "run.checkpoint.npz", interval=500)
+    while simulation.agent_count() > 0:
+        simulation.iterate()
+        checkpointer()
+
+After a crash (or to continue with changed parameters), the simulation is
+created again by the same setup function and the agents are replaced by the
+ones of the checkpoint. The trajectory is appended to the file of the
+original run with continued frame numbers and the original agent ids (see
+:class:`humanoid_writer.HumanoidTrajectoryWriter` and, for files of
+:code:`jps.SqliteHumanoidTrajectoryWriter`,
+:class:`humanoid_writer.AppendingTrajectoryWriter`)::
+
+    checkpointer = resume_simulation(
+        "run.checkpoint.npz", setup_simulation, trajectory_file=trajectory_file
+    )
+    simulation = checkpointer.simulation
+    while simulation.agent_count() > 0:
+        simulation.iterate()
+        checkpointer()
+
+Only the state accessible from Python is saved. The stages are not part of
+the checkpoint, they are created by the setup function, so waiting queues
+and round-robin transitions start in their initial state. Model state
+without a setter can only be restored if it is a parameter of the agent.
+
+JuPedSim numbers agents, stages and journeys per process, not per
+simulation. The stage and journey ids of the checkpoint are therefore
+translated using the initial stage and journey of the first agent created
+by the setup function, which requires a deterministic setup. The agents of
+the setup are removed by an iteration without agents before the saved ones
+are added, so the resumed simulation starts with iteration 1.
+"""
+
+import dataclasses
+import inspect
+import json
+import os
+import pathlib
+import warnings
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import jupedsim as jps
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+
+DEFAULT_INTERVAL = 500
+
+
+class CheckpointError(Exception):
+    """Checkpoint cannot be written or restored."""
+
+
+@dataclasses.dataclass
+class Checkpoint:
+    """State of all agents of a simulation at one iteration."""
+
+    iteration: int
+    """Iteration since the start of the original run."""
+    delta_time: float
+    agent_parameters: str
+    """Name of the agent parameter class of the model, e.g., HumanoidModelV0AgentParameters."""
+    reference_stage_id: Optional[int]
+    """Initial stage of the first agent of the setup, None without agents."""
+    reference_journey_id: Optional[int]
+    agents: Dict[str, np.ndarray]
+    """Arrays of all agents, id (as written to the trajectory file),
+    journey_id, stage_id, position, orientation and model.<attribute>."""
+
+    def model_attributes(self) -> List[str]:
+        return [
+            key.removeprefix("model.")
+            for key in self.agents
+            if key.startswith("model.")
+        ]
+
+    def save(self, checkpoint_file: pathlib.Path) -> None:
+        """Writes the checkpoint, an existing file is replaced when complete.
+
+        Args:
+            checkpoint_file: file to write
+        """
+        meta = {
+            "version": CHECKPOINT_VERSION,
+            "iteration": self.iteration,
+            "delta_time": self.delta_time,
+            "agent_parameters": self.agent_parameters,
+            "reference_stage_id": self.reference_stage_id,
+            "reference_journey_id": self.reference_journey_id,
+        }
+        checkpoint_file = pathlib.Path(checkpoint_file)
+        tmp_file = checkpoint_file.with_name(checkpoint_file.name + ".tmp")
+        with open(tmp_file, "wb") as file:
+            np.savez_compressed(file, meta=np.array(json.dumps(meta)), **self.agents)
+        os.replace(tmp_file, checkpoint_file)
+
+    @classmethod
+    def load(cls, checkpoint_file: pathlib.Path) -> "Checkpoint":
+        """Reads a checkpoint written by :meth:`save`.
+
+        Args:
+            checkpoint_file: file to read
+
+        Returns:
+            The checkpoint
+        """
+        try:
+            with np.load(checkpoint_file) as archive:
+                meta = json.loads(str(archive["meta"]))
+                agents = {key: archive[key] for key in archive.files if key != "meta"}
+        except (OSError, ValueError, KeyError) as exc:
+            raise CheckpointError(
+                f"Cannot read checkpoint {checkpoint_file}: {exc}"
+            ) from exc
+        if meta.get("version") != CHECKPOINT_VERSION:
+            raise CheckpointError(
+                f"Checkpoint {checkpoint_file} has version {meta.get('version')}, "
+                f"expected {CHECKPOINT_VERSION}."
+            )
+        return cls(
+            iteration=meta["iteration"],
+            delta_time=meta["delta_time"],
+            agent_parameters=meta["agent_parameters"],
+            reference_stage_id=meta["reference_stage_id"],
+            reference_journey_id=meta["reference_journey_id"],
+            agents=agents,
+        )
+
+    def restore(
+        self, simulation, reference: Tuple[Optional[int], Optional[int]]
+    ) -> Tuple[Dict[int, int], Set[str]]:
+        """Replaces the agents of a newly created simulation by the saved ones.
+
+        The agents of the simulation are removed by one iteration (agents
+        cannot be added at the positions of existing ones), then the saved
+        agents are added with the translated journey and stage ids.
+
+        Args:
+            simulation: simulation created by the setup of the original run,
+                not iterated yet, its writer must not write the first
+                iteration (see :func:`resume_simulation`)
+            reference: initial stage and journey of the first agent of the
+                setup in this simulation, see :func:`setup_reference`
+
+        Returns:
+            The original id of each added agent and the model attributes that
+            could not be restored
+        """
+        if simulation.iteration_count() != 0:
+            raise CheckpointError("Checkpoints can only be restored before iterating.")
+        if not np.isclose(simulation.delta_time(), self.delta_time):
+            raise CheckpointError(
+                f"The simulation has a time step of {simulation.delta_time()} s, "
+                f"the checkpoint of {self.delta_time} s."
+            )
+        parameter_class = getattr(jps, self.agent_parameters, None)
+        if parameter_class is None and len(self.agents["id"]) > 0:
+            raise CheckpointError(f"Unknown agent parameters {self.agent_parameters}.")
+        stage_offset = _id_offset(reference[0], self.reference_stage_id)
+        journey_offset = _id_offset(reference[1], self.reference_journey_id)
+
+        for agent in list(simulation.agents()):
+            simulation.mark_agent_for_removal(agent.id)
+        simulation.iterate()
+
+        # model attributes with the name of an agent parameter are passed on
+        # creation, the other ones are set afterwards
+        fields = {
+            _normalize(name): name
+            for name in (_parameter_names(parameter_class) if parameter_class else [])
+        }
+        attributes = self.model_attributes()
+        parameters = {
+            attribute: fields[_normalize(attribute)]
+            for attribute in attributes
+            if _normalize(attribute) in fields
+        }
+        agents = {key: values.tolist() for key, values in self.agents.items()}
+
+        original_ids: Dict[int, int] = {}
+        unrestored: Set[str] = set()
+        for index, original_id in enumerate(agents["id"]):
+            kwargs = {
+                parameters[attribute]: _value(agents[f"model.{attribute}"][index])
+                for attribute in parameters
+            }
+            kwargs.update(
+                journey_id=agents["journey_id"][index] + journey_offset,
+                stage_id=agents["stage_id"][index] + stage_offset,
+                position=tuple(agents["position"][index]),
+            )
+            if "orientation" in fields.values():
+                kwargs["orientation"] = tuple(agents["orientation"][index])
+            agent_id = simulation.add_agent(parameter_class(**kwargs))
+            original_ids[agent_id] = original_id
+
+            model = simulation.agent(agent_id).model
+            for attribute in attributes:
+                if attribute in parameters:
+                    continue
+                if not _is_settable(model, attribute):
+                    unrestored.add(attribute)
+                    continue
+                setattr(model, attribute, _value(agents[f"model.{attribute}"][index]))
+        return original_ids, unrestored
+
+
+class Checkpointer:
+    """Saves checkpoints of a simulation at regular intervals."""
+
+    def __init__(
+        self,
+        simulation,
+        checkpoint_file: pathlib.Path,
+        interval: int = DEFAULT_INTERVAL,
+        trajectory_writer=None,
+        iteration_offset: int = 0,
+        original_ids: Optional[Dict[int, int]] = None,
+        reference: Optional[Tuple[Optional[int], Optional[int]]] = None,
+    ):
+        """Creates the checkpointer of a simulation that did not iterate yet.
+
+        Args:
+            simulation: simulation to save
+            checkpoint_file: file of the checkpoint, replaced by each new one
+            interval: number of iterations between two checkpoints
+            trajectory_writer: writer of the simulation, flushed before each
+                checkpoint if it buffers frames (default: the writer passed
+                to the simulation)
+            iteration_offset: iterations before the start of the simulation,
+                set by :func:`resume_simulation`
+            original_ids: original id of each agent, set by
+                :func:`resume_simulation`
+            reference: initial stage and journey of the first agent of the
+                setup, read from the simulation if not given
+        """
+        if interval < 1:
+            raise CheckpointError("'interval' has to be > 0")
+        if reference is None:
+            if simulation.iteration_count() != 0:
+                raise CheckpointError(
+                    "The checkpointer has to be created before the first iteration."
+                )
+            reference = setup_reference(simulation)
+        self.simulation = simulation
+        self.checkpoint_file = pathlib.Path(checkpoint_file)
+        self.interval = interval
+        # jps.Simulation does not expose its writer
+        self.trajectory_writer = trajectory_writer or getattr(
+            simulation, "_writer", None
+        )
+        self.iteration_offset = iteration_offset
+        self.original_ids = original_ids or {}
+        self.reference = reference
+        self.unrestored_attributes: Set[str] = set()
+        """Model attributes not restored by :func:`resume_simulation`."""
+        self._agent_parameters: Optional[str] = None
+        self._attributes: Optional[List[str]] = None
+
+    def __call__(self) -> Optional[Checkpoint]:
+        """Saves a checkpoint if the interval has passed since the last one.
+
+        Returns:
+            The saved checkpoint, None if no checkpoint was due
+        """
+        iteration = self.iteration()
+        if self.simulation.iteration_count() == 0 or iteration % self.interval != 0:
+            return None
+        return self.save()
+
+    def iteration(self) -> int:
+        """Iteration since the start of the original run."""
+        return self.iteration_offset + self.simulation.iteration_count()
+
+    def save(self) -> Checkpoint:
+        """Saves the current state of the simulation.
+
+        Returns:
+            The saved checkpoint
+        """
+        checkpoint = self.checkpoint()
+        flush = getattr(self.trajectory_writer, "flush", None)
+        if flush is not None:
+            # the trajectory file has to contain the frames up to the checkpoint
+            flush()
+        checkpoint.save(self.checkpoint_file)
+        return checkpoint
+
+    def checkpoint(self) -> Checkpoint:
+        """Current state of the simulation.
+
+        Returns:
+            Checkpoint of the current iteration
+        """
+        agents = list(self.simulation.agents())
+        if agents and self._attributes is None:
+            self._agent_parameters, self._attributes = _model_attributes(
+                agents[0].model
+            )
+        attributes = self._attributes or []
+        ids, journey_ids, stage_ids, positions, orientations = [], [], [], [], []
+        values: Dict[str, List[Any]] = {attribute: [] for attribute in attributes}
+        for agent in agents:
+            ids.append(self.original_ids.get(agent.id, agent.id))
+            journey_ids.append(agent.journey_id)
+            stage_ids.append(agent.stage_id)
+            positions.append(agent.position)
+            orientations.append(agent.orientation)
+            model = agent.model
+            for attribute in attributes:
+                values[attribute].append(getattr(model, attribute))
+
+        arrays = {
+            "id": np.array(ids, dtype=np.int64),
+            "journey_id": np.array(journey_ids, dtype=np.int64),
+            "stage_id": np.array(stage_ids, dtype=np.int64),
+            "position": np.array(positions, dtype=np.float64).reshape(-1, 2),
+            "orientation": np.array(orientations, dtype=np.float64).reshape(-1, 2),
+        }
+        for attribute in attributes:
+            arrays[f"model.{attribute}"] = np.array(values[attribute])
+        return Checkpoint(
+            iteration=self.iteration(),
+            delta_time=self.simulation.delta_time(),
+            agent_parameters=self._agent_parameters or "",
+            reference_stage_id=self.reference[0],
+            reference_journey_id=self.reference[1],
+            agents=arrays,
+        )
+
+
+def setup_reference(simulation) -> Tuple[Optional[int], Optional[int]]:
+    """Initial stage and journey of the first agent of a simulation.
+
+    Args:
+        simulation: simulation as created by its setup function
+
+    Returns:
+        Stage and journey id, None if the simulation has no agents
+    """
+    first = min(simulation.agents(), key=lambda agent: agent.id, default=None)
+    if first is None:
+        return None, None
+    return first.stage_id, first.journey_id
+
+
+def resume_simulation(
+    checkpoint_file: pathlib.Path,
+    setup_simulation: Callable,
+    interval: int = DEFAULT_INTERVAL,
+    checkpoint: Optional[Checkpoint] = None,
+    **setup_args,
+) -> Checkpointer:
+    """Creates a simulation continuing from a checkpoint.
+
+    The trajectory is appended to the file of the original run, frames after
+    the checkpoint are replaced.
+
+    Args:
+        checkpoint_file: checkpoint to resume from
+        setup_simulation: setup function of the original run, e.g.,
+            ``sim_bottleneck.setup_simulation``
+        interval: number of iterations between two new checkpoints, written
+            to the same file
+        checkpoint: checkpoint to resume from instead of the one read from
+            checkpoint_file, e.g., a modified one (see :mod:`fork`)
+        setup_args: arguments of the setup function, writer_options are
+            extended to append to the trajectory file (the options of the
+            original run have to be given, without options the file of
+            :code:`jps.SqliteHumanoidTrajectoryWriter` is continued by
+            :class:`humanoid_writer.AppendingTrajectoryWriter`)
+
+    Returns:
+        The checkpointer of the resumed simulation, see
+        :attr:`Checkpointer.simulation`
+    """
+    if checkpoint is None:
+        checkpoint = Checkpoint.load(checkpoint_file)
+    original_ids: Dict[int, int] = {}
+    # iteration 1 of the simulation, after removing the agents of the setup,
+    # continues the checkpoint
+    iteration_offset = checkpoint.iteration - 1
+    writer_options = setup_args.get("writer_options")
+    setup_args["writer_options"] = {
+        # the JuPedSim writer of the original run cannot append itself
+        **({"native": True} if writer_options is None else writer_options),
+        "iteration_offset": iteration_offset,
+        "append_from_iteration": checkpoint.iteration + 1,
+        # filled by restore, read by the writer from the first write on
+        "agent_ids": original_ids,
+    }
+    simulation = setup_simulation(**setup_args)
+    reference = setup_reference(simulation)
+    restored_ids, unrestored = checkpoint.restore(simulation, reference)
+    original_ids.update(restored_ids)
+
+    checkpointer = Checkpointer(
+        simulation,
+        checkpoint_file,
+        interval=interval,
+        iteration_offset=iteration_offset,
+        original_ids=original_ids,
+        reference=reference,
+    )
+    checkpointer.unrestored_attributes = unrestored
+    return checkpointer
+
+
+def _model_attributes(model) -> Tuple[str, List[str]]:
+    # numeric state of the model, without deprecated aliases
+    name = type(model).__name__
+    agent_parameters = (
+        name.removesuffix("State") + "AgentParameters"
+        if name.endswith("State")
+        else name
+    )
+    attributes = []
+    for attribute in dir(type(model)):
+        if attribute.startswith("_") or not isinstance(
+            getattr(type(model), attribute, None), property
+        ):
+            continue
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            value = getattr(model, attribute)
+        if any(issubclass(w.category, DeprecationWarning) for w in caught):
+            continue
+        if _is_numeric(value):
+            attributes.append(attribute)
+    return agent_parameters, attributes
+
+
+def _is_numeric(value) -> bool:
+    if isinstance(value, (tuple, list)):
+        return len(value) > 0 and all(_is_numeric(item) for item in value)
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+def _is_settable(model, attribute: str) -> bool:
+    descriptor = getattr(type(model), attribute, None)
+    return isinstance(descriptor, property) and descriptor.fset is not None
+
+
+def _parameter_names(parameter_class) -> List[str]:
+    if dataclasses.is_dataclass(parameter_class):
+        return [field.name for field in dataclasses.fields(parameter_class)]
+    try:
+        return list(inspect.signature(parameter_class).parameters)
+    except (TypeError, ValueError):
+        return []
+
+
+def _normalize(name: str) -> str:
+    # desiredSpeed and desired_speed name the same value
+    return name.replace("_", "").lower()
+
+
+def _value(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _id_offset(current: Optional[int], saved: Optional[int]) -> int:
+    if current is None or saved is None:
+        return 0
+    return current - saved
@@ -1,78 +1,51 @@
+import pathlib
 import sqlite3
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 
-simulation_file_name = "./corridor_HumanoidModelV0.sqlite"
+from gait_analysis import compute_pelvis_speed, sort_by_agent, summarize_gait
+from trajectory_cache import load_trajectory_arrays_cached
 
-# Connect to the database
-conn = sqlite3.connect(simulation_file_name)
-cursor = conn.cursor()
+simulation_file_name = "./corridor_HumanoidModelV0.sqlite"
 
-# Get all trajectory data ordered by frame
-cursor.execute("SELECT * FROM trajectory_data ORDER BY frame")
-data = cursor.fetchall()
+# Get the trajectory columns (converted once, later runs read the cache)
+trajectory = load_trajectory_arrays_cached(
+    pathlib.Path(simulation_file_name),
+    columns=[
+        "pelvis_pos_x",
+        "pelvis_pos_y",
+        "pelvis_pos_z",
+        "heel_right_pos_x",
+        "heel_right_pos_y",
+        "heel_right_pos_z",
+        "heel_left_pos_x",
+        "heel_left_pos_y",
+        "heel_left_pos_z",
+    ],
+)
 
 # Get fps from metadata
-cursor.execute("SELECT value FROM metadata WHERE key = 'fps'")
-fps = float(cursor.fetchone()[0])
-
-# Column indices based on your existing code:
-# 0: frame, 1: agent_id, 9: pelvis_x, 10: pelvis_y, 11: pelvis_z
-
-# Organize data by agent
-agent_dict = {}
-for row in data:
-    frame = row[0]
-    agent_id = row[1]
-    pelvis_pos = np.array([row[9], row[10], row[11]])
-    heel_right_pos = np.array([row[12], row[13], row[14]])
-    heel_left_pos = np.array([row[15], row[16], row[17]])
-
-    if agent_id not in agent_dict:
-        agent_dict[agent_id] = {
-            "time": [],
-            "pelvis_pos": [],
-            "heel_right_z": [],
-            "heel_left_z": [],
-        }
-    agent_dict[agent_id]["time"].append(frame / fps)
-    agent_dict[agent_id]["pelvis_pos"].append(pelvis_pos)
-    agent_dict[agent_id]["heel_right_z"].append(heel_right_pos[2])
-    agent_dict[agent_id]["heel_left_z"].append(heel_left_pos[2])
-
-# select only data from agent 1
-values = agent_dict[1]
-
-## pre-computation
-time = np.array(values["time"])
-agent_pelvis_pos = np.array(values["pelvis_pos"])
-
-# Remove the first frame to avoid division by zero
-time = time[1:]
-
-# Calculate velocity vectors between frames
-deltas = np.diff(agent_pelvis_pos, axis=0)
-time_deltas = np.diff(time)
-time_deltas = time_deltas[:, np.newaxis]  # To broadcast correctly
+with sqlite3.connect(simulation_file_name) as conn:
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM metadata WHERE key = 'fps'")
+    fps = float(cursor.fetchone()[0])
 
-# Adjust deltas length to match the number of frames
-deltas = deltas[1:]
 
-velocities = deltas / time_deltas
-speed = np.linalg.norm(velocities, axis=1)
+# Gait metrics of all agents (ordered by agent and frame)
+trajectory = sort_by_agent(trajectory)
+speed = compute_pelvis_speed(trajectory, fps)
+print(summarize_gait(trajectory, fps).describe())
 
-# smoothing ising averaging rolling window
-# Choose window size
-window = 10
 
-kernel = np.ones(window) / window
+# select only data from agent 1
+rows = trajectory["id"] == 1
 
-# Apply moving average
-smoothed_speed = np.convolve(speed, kernel, mode="same")
+## pre-computation
+time = trajectory["frame"][rows] / fps
 
-# Align time to center between frames
-time_center = (time[:-1] + time[1:]) / 2
+# smoothing using a centered rolling window of 10 frames
+smoothed_speed = speed["smoothed_pelvis_speed"][rows]
 
 
 # Create figure and primary axis
@@ -89,7 +62,7 @@ plt.rcParams["font.family"] = CustomFontname  # Set Legent font to CustomFont
 
 # Plot pelvis speed on primary y-axis
 ax1.plot(
-    time_center,
+    time,
     smoothed_speed,
     color=palette["speed"],
     lw=3,
@@ -100,9 +73,8 @@ ax2 = ax1.twinx()
 
 # Plot heel Z-coordinates on secondary y-axis
 
-heel_right_z = np.array(values["heel_right_z"])
-heel_left_z = np.array(values["heel_left_z"])
-time = np.array(values["time"])
+heel_right_z = trajectory["heel_right_pos_z"][rows]
+heel_left_z = trajectory["heel_left_pos_z"][rows]
 
 ax2.plot(
     time,
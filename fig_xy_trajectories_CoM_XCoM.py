@@ -1,51 +1,56 @@
+import pathlib
 import sqlite3
-import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 
-simulation_file_name = "./corridor_HumanoidModelV0.sqlite"
+from gait_analysis import compute_xcom, sort_by_agent
+from trajectory_cache import load_trajectory_arrays_cached
 
-# Connect to the database
-conn = sqlite3.connect(simulation_file_name)
-cursor = conn.cursor()
+simulation_file_name = "./corridor_HumanoidModelV0.sqlite"
 
-# Get all trajectory data ordered by frame
-cursor.execute("SELECT * FROM trajectory_data ORDER BY frame")
-data = cursor.fetchall()
+# Get the trajectory columns (converted once, later runs read the cache)
+trajectory = load_trajectory_arrays_cached(
+    pathlib.Path(simulation_file_name),
+    columns=[
+        "pelvis_pos_x",
+        "pelvis_pos_y",
+        "pelvis_pos_z",
+        "heel_right_pos_x",
+        "heel_right_pos_y",
+        "heel_left_pos_x",
+        "heel_left_pos_y",
+    ],
+)
 
 # Get fps from metadata
-cursor.execute("SELECT value FROM metadata WHERE key = 'fps'")
-fps = float(cursor.fetchone()[0])
-
-# Column indices based on your existing code:
-# 0: frame, 1: agent_id, 9: pelvis_x, 10: pelvis_y, 11: pelvis_z
-
-# Initialize an empty list to collect rows
-data_rows = []
-
-for row in data:
-    frame = row[0]
-    agent_id = row[1]
-    pelvis_pos = np.array([row[9], row[10], row[11]])
-    heel_right_pos = np.array([row[12], row[13], row[14]])
-    heel_left_pos = np.array([row[15], row[16], row[17]])
-
-    data_rows.append(
-        {
-            "frame": frame,
-            "agent_id": agent_id,
-            "time": frame / fps,
-            "pelvis_x": pelvis_pos[0],
-            "pelvis_y": pelvis_pos[1],
-            "pelvis_z": pelvis_pos[2],
-            "heel_right_x": heel_right_pos[0],
-            "heel_right_y": heel_right_pos[1],
-            "heel_left_x": heel_left_pos[0],
-            "heel_left_y": heel_left_pos[1],
-        }
-    )
-
-df = pd.DataFrame(data_rows)
+with sqlite3.connect(simulation_file_name) as conn:
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM metadata WHERE key = 'fps'")
+    fps = float(cursor.fetchone()[0])
+
+# Pelvis velocity and Xcom = pelvis_pos + pelvis speed / sqrt(9.81 / pelvis_z),
+# computed per agent
+trajectory = sort_by_agent(trajectory)
+xcom = compute_xcom(trajectory, fps)
+
+df = pd.DataFrame(
+    {
+        "frame": trajectory["frame"],
+        "agent_id": trajectory["id"],
+        "time": trajectory["frame"] / fps,
+        "pelvis_x": trajectory["pelvis_pos_x"],
+        "pelvis_y": trajectory["pelvis_pos_y"],
+        "pelvis_z": trajectory["pelvis_pos_z"],
+        "pelvis_vx": xcom["pelvis_vx"],
+        "pelvis_vy": xcom["pelvis_vy"],
+        "Xcom_x": xcom["xcom_x"],
+        "Xcom_y": xcom["xcom_y"],
+        "heel_right_x": trajectory["heel_right_pos_x"],
+        "heel_right_y": trajectory["heel_right_pos_y"],
+        "heel_left_x": trajectory["heel_left_pos_x"],
+        "heel_left_y": trajectory["heel_left_pos_y"],
+    }
+)
 
 
 # Truncate the df to have a fraction of the frames
@@ -53,19 +58,6 @@ threshold_frame = df["frame"].quantile(0.31)
 # Truncate the DataFrame
 df = df[df["frame"] <= threshold_frame].copy()
 
-
-# post-oc computation of the Xcom = pelvis_pos + pelvis speed / sqrt(9.81 / pelvis_z[0] )
-omega = np.sqrt((9.81 / df[df["agent_id"] == 1]["pelvis_z"].iloc[1]))
-
-# Assuming time column exists (e.g., 'time') to compute actual velocity
-dt = df["time"].diff()  # time differences
-df["pelvis_vx"] = df["pelvis_x"].diff() / dt
-df["pelvis_vy"] = df["pelvis_y"].diff() / dt
-
-# # Compute Xcom
-df["Xcom_x"] = df["pelvis_x"] + df["pelvis_vx"] / omega
-df["Xcom_y"] = df["pelvis_y"] + df["pelvis_vy"] / omega
-
 # Create figure and primary axis
 SizeFactor = 1
 fig, ax1 = plt.subplots(figsize=(SizeFactor * 8.1962 * 3, SizeFactor * 6.396))
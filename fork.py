@@ -0,0 +1,385 @@
+"""What-if studies branching from a common simulation prefix.
+
+The scenario is simulated once up to the branch iteration and its state is
+saved as :class:`checkpoint.Checkpoint`. Each branch perturbs a copy of this
+state (e.g., the Xcom of an agent, see :func:`perturb_state`) and continues
+it in a pool of worker processes, so the shared prefix is not simulated
+again for every branch::
+
+    python fork.py bottleneck runs/bottleneck_fork --branch-iteration 250 \\
+        --branch "push=model.Xcom+0.1,0@1" --branch "sidestep=position+0,0.2@3"
+
+runs the prefix of 250 iterations and three branches (the unperturbed
+baseline and the two perturbations). Each branch writes the full trajectory,
+prefix included, to its own file, a summary of all branches is written to
+``summary.csv`` in the output directory.
+"""
+
+import argparse
+import ast
+import concurrent.futures
+import dataclasses
+import functools
+import os
+import pathlib
+import re
+import shutil
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from batch_runner import SCENARIOS, scenario_setup
+from checkpoint import Checkpoint, CheckpointError, Checkpointer, resume_simulation
+from gait_observer import GaitStatisticsObserver
+
+
+@dataclasses.dataclass
+class Branch:
+    """One perturbed continuation of the prefix."""
+
+    name: str
+    perturbation: Optional[Callable[[Checkpoint], None]] = None
+    """Modifies the state of the checkpoint in place, has to be picklable
+    (a module level function or a functools.partial of one)."""
+    params: Dict[str, Any] = dataclasses.field(default_factory=dict)
+    """Parameters of the setup function overriding the ones of the prefix."""
+
+
+_IDENTIFIERS = ("id", "journey_id", "stage_id")
+
+
+def perturb_state(
+    checkpoint: Checkpoint,
+    key: str,
+    offset: Any = 0.0,
+    scale: Any = 1.0,
+    agent_ids: Optional[Sequence[int]] = None,
+) -> None:
+    """Scales and shifts a saved attribute of some or all agents.
+
+    Args:
+        checkpoint: checkpoint to modify
+        key: array of the checkpoint, e.g., "position" or "model.Xcom", not
+            one of the ids (id, journey_id, stage_id)
+        offset: added to the scaled value, a scalar or one value per
+            component
+        scale: factor of the value, a scalar or one value per component
+        agent_ids: original ids of the perturbed agents (default: all)
+    """
+    if key not in checkpoint.agents:
+        raise CheckpointError(
+            f"Unknown state {key!r}, expected one of {list(checkpoint.agents)}."
+        )
+    if key in _IDENTIFIERS:
+        raise CheckpointError(f"Cannot perturb the identifier {key!r}.")
+    selected = (
+        np.ones(len(checkpoint.agents["id"]), dtype=bool)
+        if agent_ids is None
+        else np.isin(checkpoint.agents["id"], agent_ids)
+    )
+    values = checkpoint.agents[key].astype(np.float64)
+    values[selected] = values[selected] * np.asarray(scale) + np.asarray(offset)
+    checkpoint.agents[key] = values
+
+
+def run_prefix(
+    scenario: str,
+    branch_iteration: int,
+    trajectory_file: pathlib.Path,
+    snapshot_file: pathlib.Path,
+    params: Optional[Dict[str, Any]] = None,
+    writer_options: Optional[dict] = None,
+) -> Checkpoint:
+    """Simulates the common prefix and saves its final state.
+
+    Args:
+        scenario: name of the scenario, see :data:`batch_runner.SCENARIOS`,
+            or path of a scenario file
+        branch_iteration: iteration of the branch point
+        trajectory_file: trajectory file of the prefix
+        snapshot_file: file of the saved state
+        params: parameters of the setup function
+        writer_options: output options, see
+            :func:`humanoid_writer.create_trajectory_writer`
+
+    Returns:
+        The state at the branch point
+    """
+    setup_simulation, _ = scenario_setup(scenario)
+    pathlib.Path(trajectory_file).unlink(missing_ok=True)
+    simulation = setup_simulation(
+        trajectory_file=trajectory_file,
+        writer_options=writer_options,
+        **(params or {}),
+    )
+    checkpointer = Checkpointer(simulation, snapshot_file, interval=branch_iteration)
+    while simulation.iteration_count() < branch_iteration:
+        if simulation.agent_count() == 0:
+            raise CheckpointError(
+                f"All agents left before the branch iteration {branch_iteration}, "
+                f"after {simulation.iteration_count()} iterations."
+            )
+        simulation.iterate()
+    return checkpointer.save()
+
+
+def run_branch(
+    branch: Branch,
+    index: int,
+    scenario: str,
+    snapshot_file: pathlib.Path,
+    prefix_file: pathlib.Path,
+    trajectory_file: pathlib.Path,
+    params: Optional[Dict[str, Any]] = None,
+    max_iterations: Optional[int] = None,
+    writer_options: Optional[dict] = None,
+) -> Dict[str, Any]:
+    """Continues the prefix with the perturbation of a branch.
+
+    Errors are not raised but reported in the error column, like in
+    :func:`batch_runner.run_case`.
+
+    Args:
+        branch: branch to run
+        index: number of the branch
+        scenario: scenario of the prefix
+        snapshot_file: state at the branch point, see :func:`run_prefix`
+        prefix_file: trajectory file of the prefix, copied to the branch
+        trajectory_file: trajectory file of the branch
+        params: parameters of the setup function of the prefix
+        max_iterations: iteration limit, counted from the start of the prefix
+            (default: the one of the scenario)
+        writer_options: output options of the prefix
+
+    Returns:
+        Summary row of the branch
+    """
+    row = {"branch": index, "name": branch.name, **branch.params}
+    row["trajectory_file"] = str(trajectory_file)
+    start = time.perf_counter()
+    try:
+        setup_simulation, scenario_max_iterations = scenario_setup(scenario)
+        max_iterations = max_iterations or scenario_max_iterations
+
+        checkpoint = Checkpoint.load(snapshot_file)
+        if branch.perturbation is not None:
+            branch.perturbation(checkpoint)
+        shutil.copyfile(prefix_file, trajectory_file)
+        checkpointer = resume_simulation(
+            pathlib.Path(trajectory_file).with_suffix(".checkpoint.npz"),
+            setup_simulation,
+            checkpoint=checkpoint,
+            trajectory_file=trajectory_file,
+            writer_options=writer_options,
+            **{**(params or {}), **branch.params},
+        )
+        simulation = checkpointer.simulation
+
+        observer = GaitStatisticsObserver(simulation)
+        while (
+            simulation.agent_count() > 0 and checkpointer.iteration() <= max_iterations
+        ):
+            simulation.iterate()
+            observer()
+
+        summary = observer.summary()
+        row.update(
+            iterations=checkpointer.iteration(),
+            remaining_agents=simulation.agent_count(),
+            mean_speed=observer.mean_speed,
+            speed_std=observer.speed_std,
+            mean_steps=summary["steps"].mean(),
+        )
+    except Exception:
+        row["error"] = traceback.format_exc(limit=-1).strip()
+    row["wall_time"] = time.perf_counter() - start
+    return row
+
+
+def run_fork(
+    scenario: str,
+    branches: List[Branch],
+    branch_iteration: int,
+    output_dir: pathlib.Path,
+    params: Optional[Dict[str, Any]] = None,
+    max_iterations: Optional[int] = None,
+    processes: Optional[int] = None,
+    writer_options: Optional[dict] = None,
+    progress: bool = True,
+) -> pd.DataFrame:
+    """Simulates the prefix once and all branches in parallel.
+
+    The summary is written to summary.csv in the output directory.
+
+    Args:
+        scenario: name of the scenario, see :data:`batch_runner.SCENARIOS`,
+            or path of a scenario file
+        branches: continuations of the prefix
+        branch_iteration: iteration of the branch point
+        output_dir: directory of the trajectory files
+        params: parameters of the setup function
+        max_iterations: iteration limit of the branches, counted from the
+            start of the prefix and inclusive like in the scenario scripts
+            (default: the one of the scenario)
+        processes: number of worker processes (default: number of CPUs)
+        writer_options: output options, see
+            :func:`humanoid_writer.create_trajectory_writer`
+        progress: print a line after the prefix and each finished branch
+
+    Returns:
+        DataFrame with the summary row of each branch, ordered by branch
+    """
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    name = scenario if scenario in SCENARIOS else pathlib.Path(scenario).stem
+    prefix_file = output_dir / f"{name}_prefix.sqlite"
+    snapshot_file = output_dir / f"{name}_prefix.checkpoint.npz"
+
+    start = time.perf_counter()
+    run_prefix(
+        scenario,
+        branch_iteration,
+        prefix_file,
+        snapshot_file,
+        params=params,
+        writer_options=writer_options,
+    )
+    if progress:
+        print(
+            f"prefix of {branch_iteration} iterations done in "
+            f"{time.perf_counter() - start:.1f} s"
+        )
+
+    rows = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes or os.cpu_count()
+    ) as executor:
+        futures = [
+            executor.submit(
+                run_branch,
+                branch,
+                index,
+                scenario,
+                snapshot_file,
+                prefix_file,
+                output_dir / f"{name}_branch_{index:04d}.sqlite",
+                params=params,
+                max_iterations=max_iterations,
+                writer_options=writer_options,
+            )
+            for index, branch in enumerate(branches)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            if progress:
+                status = "failed" if "error" in row else "done"
+                print(
+                    f"[{len(rows)}/{len(branches)}] branch {row['name']} {status} "
+                    f"in {row['wall_time']:.1f} s"
+                )
+
+    summary = pd.DataFrame(rows).sort_values("branch", ignore_index=True)
+    summary.to_csv(output_dir / "summary.csv", index=False)
+    return summary
+
+
+_BRANCH_PATTERN = re.compile(
+    r"(?P<name>[^=]+)=(?P<key>[^+*@]+)(?P<operator>[+*])(?P<values>[^@]+)"
+    r"(?:@(?P<agent_ids>.+))?"
+)
+
+
+def _parse_param(text):
+    # NAME=VALUE, the value as Python literal or string
+    name, _, value = text.partition("=")
+    if not name or not value:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got {text!r}.")
+    try:
+        return name, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return name, value
+
+
+def _parse_branch(text):
+    # NAME=KEY+OFFSET[,OFFSET...][@ID,...] or NAME=KEY*SCALE[,SCALE...][@ID,...]
+    match = _BRANCH_PATTERN.fullmatch(text)
+    if match is None:
+        raise argparse.ArgumentTypeError(
+            f"Expected NAME=KEY+OFFSET or NAME=KEY*SCALE, got {text!r}."
+        )
+    try:
+        values = [float(value) for value in match["values"].split(",")]
+        agent_ids = (
+            [int(agent_id) for agent_id in match["agent_ids"].split(",")]
+            if match["agent_ids"]
+            else None
+        )
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"Invalid branch {text!r}: {exc}") from exc
+    values = values[0] if len(values) == 1 else values
+    perturbation = functools.partial(
+        perturb_state,
+        key=match["key"],
+        agent_ids=agent_ids,
+        **({"offset": values} if match["operator"] == "+" else {"scale": values}),
+    )
+    return Branch(match["name"], perturbation)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Branch perturbed continuations from a common prefix."
+    )
+    parser.add_argument(
+        "scenario", help=f"one of {', '.join(SCENARIOS)} or a scenario file"
+    )
+    parser.add_argument("output_dir", type=pathlib.Path)
+    parser.add_argument("--branch-iteration", type=int, required=True)
+    parser.add_argument(
+        "--branch",
+        type=_parse_branch,
+        action="append",
+        default=[],
+        metavar="NAME=KEY+OFFSET[@IDS]",
+        help="perturbation of the saved state, e.g., push=model.Xcom+0.1,0@1 "
+        "or sidestep=position+0,0.2@3",
+    )
+    parser.add_argument(
+        "--param",
+        type=_parse_param,
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="parameter of the setup function, e.g., seed=2",
+    )
+    parser.add_argument(
+        "--no-baseline",
+        action="store_true",
+        help="do not run the unperturbed continuation",
+    )
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--max-iterations", type=int)
+    args = parser.parse_args(argv)
+
+    branches = ([] if args.no_baseline else [Branch("baseline")]) + args.branch
+    if not branches:
+        parser.error("no branches to run")
+
+    summary = run_fork(
+        args.scenario,
+        branches,
+        args.branch_iteration,
+        args.output_dir,
+        params=dict(args.param),
+        max_iterations=args.max_iterations,
+        processes=args.processes,
+    )
+    print(summary.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Frame based access to trajectory arrays sorted by frame.
+
+:class:`FrameIndex` finds the rows of a frame, :class:`SpatialFrameIndex`
+additionally finds the agents of a frame near a point, inside a polygon or
+close to each other, e.g.::
+
+    data = load_trajectory_arrays_from_jupedsim_sqlite(trajectory_file)
+    index = SpatialFrameIndex(data)
+    rows = index.query_radius(frame=250, point=(27.0, 0.0), radius=2.0)
+    print(index.data["id"][rows])
+"""
+
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from pedpy.column_identifier import FRAME_COL, X_COL, Y_COL
+
+
+def sort_by_frame(data: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Orders the trajectory arrays by frame, keeping the order within a frame.
+
+    JuPedSim writes the frames in order, in this case the arrays are returned
+    unchanged (and memory maps stay memory maps).
+
+    Args:
+        data: trajectory arrays, containing at least the frame column
+
+    Returns:
+        Trajectory arrays ordered by frame
+    """
+    frames = data[FRAME_COL]
+    if np.all(frames[:-1] <= frames[1:]):
+        return data
+
+    order = np.argsort(frames, kind="stable")
+    return {column: values[order] for column, values in data.items()}
+
+
+class FrameIndex:
+    """Row range of each frame in trajectory arrays sorted by frame.
+
+    The index is built in one pass over the frame column, afterwards the rows
+    of a frame are found by a binary search over the distinct frames instead
+    of a scan over all rows.
+    """
+
+    def __init__(self, frames: np.ndarray):
+        """Create the index of the given (sorted) frame column.
+
+        Args:
+            frames: frame of each row, sorted ascending
+        """
+        starts = np.flatnonzero(np.diff(frames)) + 1
+        self.starts = np.concatenate(([0], starts)) if len(frames) else starts
+        self.stops = np.append(self.starts[1:], len(frames)).astype(np.intp)
+        self.frames = np.asarray(frames[self.starts])
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __contains__(self, frame: int) -> bool:
+        position = np.searchsorted(self.frames, frame)
+        return position < len(self.frames) and self.frames[position] == frame
+
+    @property
+    def min_frame(self) -> int:
+        return int(self.frames[0])
+
+    @property
+    def max_frame(self) -> int:
+        return int(self.frames[-1])
+
+    def rows(self, frame: int) -> slice:
+        """Rows of the given frame, an empty slice if the frame has no rows.
+
+        Args:
+            frame: frame to look up
+
+        Returns:
+            Slice of the rows belonging to the frame
+        """
+        position = np.searchsorted(self.frames, frame)
+        if position == len(self.frames) or self.frames[position] != frame:
+            return slice(0, 0)
+        return slice(int(self.starts[position]), int(self.stops[position]))
+
+
+class SpatialFrameIndex:
+    """Uniform grid over the positions of each frame, built on first use.
+
+    The positions of a frame are sorted by grid cell once, a query then only
+    looks at the cells overlapping the queried region instead of all rows of
+    the frame. The grids of the most recently queried frames are cached.
+    """
+
+    def __init__(
+        self,
+        data: Dict[str, np.ndarray],
+        cell_size: float = 1.0,
+        max_cached_frames: int = 1024,
+    ):
+        """Create the index of the given trajectory arrays.
+
+        Args:
+            data: trajectory arrays, containing at least the frame, x and y
+                columns, ordered by frame if needed (see :func:`sort_by_frame`).
+                Rows without position (NaN) are not found by any query.
+            cell_size: edge length of the grid cells in m, about the
+                typical query radius
+            max_cached_frames: number of frames whose grid is kept
+        """
+        if cell_size <= 0:
+            raise ValueError("'cell_size' has to be > 0")
+        self.data = sort_by_frame(data)
+        self.frame_index = FrameIndex(self.data[FRAME_COL])
+        self.cell_size = cell_size
+        self.max_cached_frames = max_cached_frames
+
+        # rows without position (NaN) are in no cell
+        x, y = self.data[X_COL], self.data[Y_COL]
+        valid = ~(np.isnan(x) | np.isnan(y))
+        if valid.any():
+            x, y = x[valid], y[valid]
+            self._origin = (float(x.min()), float(y.min()))
+            self._shape = (
+                int((x.max() - self._origin[0]) // cell_size) + 1,
+                int((y.max() - self._origin[1]) // cell_size) + 1,
+            )
+        else:
+            self._origin, self._shape = (0.0, 0.0), (1, 1)
+        self._grids: "OrderedDict[int, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+
+    @classmethod
+    def from_dataframe(
+        cls, data: pd.DataFrame, cell_size: float = 1.0, max_cached_frames: int = 1024
+    ) -> "SpatialFrameIndex":
+        """Create the index of trajectory data, e.g., :code:`TrajectoryData.data`.
+
+        Args:
+            data: DataFrame with at least the frame, x and y columns
+            cell_size: edge length of the grid cells in m
+            max_cached_frames: number of frames whose grid is kept
+
+        Returns:
+            The index, its rows refer to :attr:`data`, not to the DataFrame
+        """
+        return cls(
+            {column: data[column].to_numpy() for column in data.columns},
+            cell_size=cell_size,
+            max_cached_frames=max_cached_frames,
+        )
+
+    def query_radius(
+        self, frame: int, point: Tuple[float, float], radius: float
+    ) -> np.ndarray:
+        """Rows of the agents within the distance of a point.
+
+        Args:
+            frame: frame to query
+            point: center of the circle
+            radius: maximal distance (inclusive)
+
+        Returns:
+            Rows of :attr:`data`, ascending
+        """
+        px, py = point
+        rows = self._candidates(
+            frame, (px - radius, py - radius, px + radius, py + radius)
+        )
+        close = (self.data[X_COL][rows] - px) ** 2 + (
+            self.data[Y_COL][rows] - py
+        ) ** 2 <= radius**2
+        return np.sort(rows[close])
+
+    def query_polygon(self, frame: int, polygon: shapely.Geometry) -> np.ndarray:
+        """Rows of the agents inside a polygon (or on its boundary).
+
+        Args:
+            frame: frame to query
+            polygon: region to query
+
+        Returns:
+            Rows of :attr:`data`, ascending
+        """
+        rows = self._candidates(frame, polygon.bounds)
+        inside = shapely.intersects_xy(
+            polygon, self.data[X_COL][rows], self.data[Y_COL][rows]
+        )
+        return np.sort(rows[inside])
+
+    def neighbor_pairs(
+        self, frame: int, radius: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """All pairs of agents within the distance of each other.
+
+        Args:
+            frame: frame to query
+            radius: maximal distance (inclusive)
+
+        Returns:
+            Rows of :attr:`data` of the first and second agent of each pair,
+            each pair once
+        """
+        order, keys = self._grid(frame)
+        x, y = self.data[X_COL][order], self.data[Y_COL][order]
+        nx, ny = self._shape
+        cells_x, cells_y = np.divmod(keys, ny)
+        reach = int(np.ceil(radius / self.cell_size))
+
+        first, second = [], []
+        # each pair of cells once: the cell itself and the cells "after" it
+        for dx in range(0, reach + 1):
+            for dy in range(-reach if dx > 0 else 0, reach + 1):
+                valid = (cells_x + dx < nx) & (cells_y + dy >= 0) & (cells_y + dy < ny)
+                points = np.flatnonzero(valid)
+                neighbor_keys = keys[points] + dx * ny + dy
+                starts = np.searchsorted(keys, neighbor_keys, side="left")
+                stops = np.searchsorted(keys, neighbor_keys, side="right")
+                i = np.repeat(points, stops - starts)
+                j = _concatenate_ranges(starts, stops)
+                keep = (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 <= radius**2
+                if dx == 0 and dy == 0:
+                    keep &= i < j
+                first.append(order[i[keep]])
+                second.append(order[j[keep]])
+        return np.concatenate(first), np.concatenate(second)
+
+    def _candidates(
+        self, frame: int, bounds: Tuple[float, float, float, float]
+    ) -> np.ndarray:
+        # rows of all cells overlapping the bounds
+        order, keys = self._grid(frame)
+        xmin, ymin, xmax, ymax = bounds
+        nx, ny = self._shape
+        cell_x0, cell_y0 = self._cell(xmin, ymin)
+        cell_x1, cell_y1 = self._cell(xmax, ymax)
+        cell_x0, cell_x1 = max(cell_x0, 0), min(cell_x1, nx - 1)
+        cell_y0, cell_y1 = max(cell_y0, 0), min(cell_y1, ny - 1)
+        if cell_x0 > cell_x1 or cell_y0 > cell_y1:
+            return np.empty(0, dtype=np.intp)
+
+        # cells of one column are consecutive keys
+        column_keys = np.arange(cell_x0, cell_x1 + 1) * ny
+        starts = np.searchsorted(keys, column_keys + cell_y0, side="left")
+        stops = np.searchsorted(keys, column_keys + cell_y1, side="right")
+        return order[_concatenate_ranges(starts, stops)]
+
+    def _grid(self, frame: int) -> Tuple[np.ndarray, np.ndarray]:
+        # rows of the frame sorted by cell, and the cell of each
+        grid = self._grids.get(frame)
+        if grid is not None:
+            self._grids.move_to_end(frame)
+            return grid
+
+        rows = self.frame_index.rows(frame)
+        x, y = self.data[X_COL][rows], self.data[Y_COL][rows]
+        valid = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+        cell_x, cell_y = self._cell(x[valid], y[valid])
+        keys = cell_x * self._shape[1] + cell_y
+        order = np.argsort(keys, kind="stable")
+        grid = (valid[order] + rows.start, keys[order])
+        self._grids[frame] = grid
+        if len(self._grids) > self.max_cached_frames:
+            self._grids.popitem(last=False)
+        return grid
+
+    def _cell(self, x, y):
+        return (
+            np.floor((np.asarray(x) - self._origin[0]) / self.cell_size).astype(
+                np.int64
+            ),
+            np.floor((np.asarray(y) - self._origin[1]) / self.cell_size).astype(
+                np.int64
+            ),
+        )
+
+
+def _concatenate_ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    # np.concatenate([np.arange(start, stop) ...]) without a Python loop
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.intp)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return (np.arange(total) + offsets).astype(np.intp)
@@ -0,0 +1,370 @@
+"""Gait analysis of humanoid trajectories, computed for all agents at once.
+
+The functions work on the trajectory arrays returned by
+:func:`~sqlite_loader_moded_pepy_fun.load_trajectory_arrays_from_jupedsim_sqlite`
+(or its cached variant) after ordering them with :func:`sort_by_agent`, so the
+rows of each agent are contiguous and ordered by frame.
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from pedpy.column_identifier import FRAME_COL, ID_COL
+
+GRAVITY = 9.81
+
+FEET = ("right", "left")
+
+DEFAULT_SMOOTHING_WINDOW = 10
+"""Number of frames averaged by :func:`compute_pelvis_speed`."""
+
+DEFAULT_CONTACT_TOLERANCE = 0.01
+"""Height above its lowest position up to which a heel is on the ground [m]."""
+
+
+def sort_by_agent(data: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Orders the trajectory arrays by agent and frame.
+
+    Args:
+        data: trajectory arrays, containing at least the frame and id column
+
+    Returns:
+        Trajectory arrays ordered by agent and, per agent, by frame
+    """
+    order = np.lexsort((data[FRAME_COL], data[ID_COL]))
+    if np.array_equal(order, np.arange(len(order))):
+        return data
+    return {column: values[order] for column, values in data.items()}
+
+
+def agent_starts(ids: np.ndarray) -> np.ndarray:
+    """First row of each agent in arrays ordered by agent.
+
+    Args:
+        ids: agent id of each row, see :func:`sort_by_agent`
+
+    Returns:
+        Index of the first row of each agent
+    """
+    if len(ids) == 0:
+        return np.empty(0, dtype=np.intp)
+    return np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+
+
+def compute_pelvis_velocity(
+    data: Dict[str, np.ndarray], fps: float
+) -> Dict[str, np.ndarray]:
+    """Computes the horizontal pelvis velocity of all agents.
+
+    The velocity is the backward difference to the previous row of the same
+    agent, divided by the time between both frames, so gaps in the trajectory
+    are handled. The first row of each agent has no velocity (NaN).
+
+    Args:
+        data: trajectory arrays ordered by agent, see :func:`sort_by_agent`,
+            containing the pelvis_pos_x and pelvis_pos_y columns
+        fps: frames per second of the trajectory
+
+    Returns:
+        Dict with the pelvis_vx and pelvis_vy of each row
+    """
+    first_rows = agent_starts(data[ID_COL])
+    dt = np.diff(data[FRAME_COL]) / fps
+
+    velocity = {}
+    for axis in "xy":
+        v = np.empty(len(data[ID_COL]))
+        v[1:] = np.diff(data[f"pelvis_pos_{axis}"]) / np.where(dt == 0, np.nan, dt)
+        v[first_rows] = np.nan
+        velocity[f"pelvis_v{axis}"] = v
+    return velocity
+
+
+def compute_xcom(
+    data: Dict[str, np.ndarray], fps: float, gravity: float = GRAVITY
+) -> Dict[str, np.ndarray]:
+    """Computes the extrapolated centre of mass (XCoM) of all agents.
+
+    XCoM = pelvis position + pelvis velocity / omega, with the eigenfrequency
+    omega = sqrt(gravity / l) of the inverted pendulum. The pendulum length l
+    is the mean pelvis height of each agent.
+
+    Args:
+        data: trajectory arrays ordered by agent, see :func:`sort_by_agent`,
+            containing the pelvis_pos_x, pelvis_pos_y and pelvis_pos_z columns
+        fps: frames per second of the trajectory
+        gravity: gravitational acceleration
+
+    Returns:
+        Dict with the pelvis_vx, pelvis_vy, omega, xcom_x and xcom_y of each
+        row
+    """
+    result = compute_pelvis_velocity(data, fps)
+
+    first_rows = agent_starts(data[ID_COL])
+    rows_per_agent = np.diff(np.append(first_rows, len(data[ID_COL])))
+    if len(first_rows):
+        pelvis_height = (
+            np.add.reduceat(data["pelvis_pos_z"], first_rows) / rows_per_agent
+        )
+    else:
+        pelvis_height = np.empty(0)
+    omega = np.repeat(np.sqrt(gravity / pelvis_height), rows_per_agent)
+
+    result["omega"] = omega
+    result["xcom_x"] = data["pelvis_pos_x"] + result["pelvis_vx"] / omega
+    result["xcom_y"] = data["pelvis_pos_y"] + result["pelvis_vy"] / omega
+    return result
+
+
+def compute_pelvis_speed(
+    data: Dict[str, np.ndarray],
+    fps: float,
+    window: int = DEFAULT_SMOOTHING_WINDOW,
+) -> Dict[str, np.ndarray]:
+    """Computes the (smoothed) pelvis speed of all agents.
+
+    The speed is the norm of the 3D backward difference of the pelvis
+    position, smoothed by a moving average over window frames which never
+    crosses to another agent (at the ends of a trajectory fewer frames are
+    averaged).
+
+    Args:
+        data: trajectory arrays ordered by agent, see :func:`sort_by_agent`,
+            containing the pelvis_pos_x, pelvis_pos_y and pelvis_pos_z columns
+        fps: frames per second of the trajectory
+        window: number of frames of the moving average
+
+    Returns:
+        Dict with the pelvis_speed and smoothed_pelvis_speed of each row, the
+        first row of each agent has no speed (NaN)
+    """
+    first_rows = agent_starts(data[ID_COL])
+    dt = np.diff(data[FRAME_COL]) / fps
+
+    squared = np.zeros(len(dt))
+    for axis in "xyz":
+        squared += np.diff(data[f"pelvis_pos_{axis}"]) ** 2
+    speed = np.empty(len(data[ID_COL]))
+    speed[1:] = np.sqrt(squared) / np.where(dt == 0, np.nan, dt)
+    speed[first_rows] = np.nan
+
+    return {
+        "pelvis_speed": speed,
+        "smoothed_pelvis_speed": _moving_average(speed, first_rows, window),
+    }
+
+
+def detect_heel_strikes(
+    data: Dict[str, np.ndarray],
+    contact_tolerance: float = DEFAULT_CONTACT_TOLERANCE,
+) -> Dict[str, np.ndarray]:
+    """Detects the heel strikes of both feet of all agents.
+
+    A heel is on the ground while it is at most contact_tolerance above its
+    lowest position in the trajectory of the agent, a heel strike is the first
+    frame on the ground after a swing.
+
+    Args:
+        data: trajectory arrays ordered by agent, see :func:`sort_by_agent`,
+            containing the heel_right_pos_x/y/z and heel_left_pos_x/y/z
+            columns
+        contact_tolerance: see :data:`DEFAULT_CONTACT_TOLERANCE`
+
+    Returns:
+        Dict with the id, frame, foot ("right" or "left") and heel position
+        (x, y) of each heel strike, ordered by agent and frame
+    """
+    first_rows = agent_starts(data[ID_COL])
+
+    rows, feet = [], []
+    for foot in FEET:
+        contact = _heel_contact(data, foot, first_rows, contact_tolerance)
+        strikes = np.flatnonzero(contact[1:] & ~contact[:-1]) + 1
+        strikes = strikes[~np.isin(strikes, first_rows)]
+        rows.append(strikes)
+        feet.append(np.full(len(strikes), foot))
+
+    rows = np.concatenate(rows)
+    feet = np.concatenate(feet)
+    order = np.argsort(rows, kind="stable")
+    rows, feet = rows[order], feet[order]
+
+    return {
+        ID_COL: data[ID_COL][rows],
+        FRAME_COL: data[FRAME_COL][rows],
+        "foot": feet,
+        "x": np.where(
+            feet == "right",
+            data["heel_right_pos_x"][rows],
+            data["heel_left_pos_x"][rows],
+        ),
+        "y": np.where(
+            feet == "right",
+            data["heel_right_pos_y"][rows],
+            data["heel_left_pos_y"][rows],
+        ),
+    }
+
+
+def compute_steps(
+    heel_strikes: Dict[str, np.ndarray], fps: float
+) -> Dict[str, np.ndarray]:
+    """Computes the steps between consecutive heel strikes of each agent.
+
+    Args:
+        heel_strikes: heel strikes ordered by agent and frame, see
+            :func:`detect_heel_strikes`
+        fps: frames per second of the trajectory
+
+    Returns:
+        Dict with the id, frame (of the ending heel strike), length (distance
+        between both heel positions) and duration of each step
+    """
+    ids = heel_strikes[ID_COL]
+    same_agent = ids[1:] == ids[:-1]
+
+    length = np.hypot(np.diff(heel_strikes["x"]), np.diff(heel_strikes["y"]))
+    duration = np.diff(heel_strikes[FRAME_COL]) / fps
+
+    return {
+        ID_COL: ids[1:][same_agent],
+        FRAME_COL: heel_strikes[FRAME_COL][1:][same_agent],
+        "length": length[same_agent],
+        "duration": duration[same_agent],
+    }
+
+
+def compute_gait_phases(
+    data: Dict[str, np.ndarray],
+    fps: float,
+    contact_tolerance: float = DEFAULT_CONTACT_TOLERANCE,
+) -> Dict[str, np.ndarray]:
+    """Computes the stance and swing phases of both feet of all agents.
+
+    Only complete phases are returned, i.e., phases which start and end
+    within the trajectory of the agent.
+
+    Args:
+        data: trajectory arrays ordered by agent, see :func:`sort_by_agent`,
+            containing the heel_right_pos_z and heel_left_pos_z columns
+        fps: frames per second of the trajectory
+        contact_tolerance: see :data:`DEFAULT_CONTACT_TOLERANCE`
+
+    Returns:
+        Dict with the id, foot, phase ("stance" or "swing"), start frame and
+        duration of each phase, ordered by foot, agent and start frame
+    """
+    ids = data[ID_COL]
+    frames = data[FRAME_COL]
+    first_rows = agent_starts(ids)
+
+    phases = {ID_COL: [], "foot": [], "phase": [], "start_frame": [], "duration": []}
+    for foot in FEET:
+        contact = _heel_contact(data, foot, first_rows, contact_tolerance)
+        changes = np.flatnonzero(contact[1:] != contact[:-1]) + 1
+        changes = changes[~np.isin(changes, first_rows)]
+
+        # a phase lasts from one change of the contact to the next one
+        start, stop = changes[:-1], changes[1:]
+        complete = ids[start] == ids[stop]
+        start, stop = start[complete], stop[complete]
+
+        phases[ID_COL].append(ids[start])
+        phases["foot"].append(np.full(len(start), foot))
+        phases["phase"].append(np.where(contact[start], "stance", "swing"))
+        phases["start_frame"].append(frames[start])
+        phases["duration"].append((frames[stop] - frames[start]) / fps)
+
+    return {key: np.concatenate(values) for key, values in phases.items()}
+
+
+def summarize_gait(
+    data: Dict[str, np.ndarray],
+    fps: float,
+    window: int = DEFAULT_SMOOTHING_WINDOW,
+    contact_tolerance: float = DEFAULT_CONTACT_TOLERANCE,
+) -> pd.DataFrame:
+    """Summarizes the gait of each agent.
+
+    Args:
+        data: trajectory arrays ordered by agent, see :func:`sort_by_agent`,
+            containing the pelvis and heel positions
+        fps: frames per second of the trajectory
+        window: see :func:`compute_pelvis_speed`
+        contact_tolerance: see :data:`DEFAULT_CONTACT_TOLERANCE`
+
+    Returns:
+        DataFrame with one row per agent: id, mean_speed (smoothed pelvis
+        speed), steps, mean_step_length, cadence (steps per minute),
+        mean_stance_duration and mean_swing_duration. Metrics without any
+        event are NaN.
+    """
+    ids = data[ID_COL]
+    agents = ids[agent_starts(ids)]
+
+    def mean_per_agent(agent_ids, values):
+        agent = np.searchsorted(agents, agent_ids)
+        valid = ~np.isnan(values)
+        sums = np.bincount(agent[valid], values[valid], minlength=len(agents))
+        counts = np.bincount(agent[valid], minlength=len(agents))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums / counts, counts
+
+    speed = compute_pelvis_speed(data, fps, window)["smoothed_pelvis_speed"]
+    mean_speed, _ = mean_per_agent(ids, speed)
+
+    steps = compute_steps(detect_heel_strikes(data, contact_tolerance), fps)
+    mean_step_length, step_count = mean_per_agent(steps[ID_COL], steps["length"])
+    mean_step_duration, _ = mean_per_agent(steps[ID_COL], steps["duration"])
+
+    phases = compute_gait_phases(data, fps, contact_tolerance)
+    phase_means = {}
+    for phase in ["stance", "swing"]:
+        selected = phases["phase"] == phase
+        phase_means[phase], _ = mean_per_agent(
+            phases[ID_COL][selected], phases["duration"][selected]
+        )
+
+    return pd.DataFrame(
+        {
+            ID_COL: agents,
+            "mean_speed": mean_speed,
+            "steps": step_count,
+            "mean_step_length": mean_step_length,
+            "cadence": 60 / mean_step_duration,
+            "mean_stance_duration": phase_means["stance"],
+            "mean_swing_duration": phase_means["swing"],
+        }
+    )
+
+
+def _heel_contact(data, foot, first_rows, contact_tolerance):
+    # heel on the ground, relative to its lowest position per agent
+    heel_z = data[f"heel_{foot}_pos_z"]
+    if len(first_rows) == 0:
+        return np.zeros(0, dtype=bool)
+    rows_per_agent = np.diff(np.append(first_rows, len(heel_z)))
+    ground = np.repeat(np.minimum.reduceat(heel_z, first_rows), rows_per_agent)
+    return heel_z <= ground + contact_tolerance
+
+
+def _moving_average(values, first_rows, window):
+    # centered moving average (as np.convolve(..., mode="same")) over the
+    # valid values of the same agent
+    n = len(values)
+    rows_per_agent = np.diff(np.append(first_rows, n))
+    agent_start = np.repeat(first_rows, rows_per_agent)
+    agent_stop = np.repeat(first_rows + rows_per_agent, rows_per_agent)
+
+    lo = np.arange(n) - window // 2
+    hi = np.clip(lo + window, agent_start, agent_stop)
+    lo = np.clip(lo, agent_start, agent_stop)
+
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums[hi] - sums[lo]) / (counts[hi] - counts[lo])
@@ -0,0 +1,256 @@
+"""Gait statistics updated while a simulation is running.
+
+:class:`GaitStatisticsObserver` is called after each ``simulation.iterate()``
+and updates running aggregates from the current agent states, so long runs can
+be summarised without writing and re-reading the whole trajectory::
+
+    observer = GaitStatisticsObserver(simulation, bounds=area.bounds)
+    while simulation.agent_count() > 0:
+        simulation.iterate()
+        observer()
+    print(observer.summary())
+
+The memory is proportional to the number of agents (and density cells), not
+to the number of iterations.
+"""
+
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from pedpy.column_identifier import ID_COL
+
+from gait_analysis import DEFAULT_CONTACT_TOLERANCE, FEET
+from humanoid_writer import resolve_model_attribute
+
+
+def humanoid_heel_heights(agent) -> Tuple[float, float]:
+    """Height of the right and left heel of a humanoid agent.
+
+    Args:
+        agent: agent of a simulation with the humanoid model, its state
+            provides the (3D) heel positions written to the heel_*_pos_*
+            trajectory columns, see :func:`humanoid_writer.resolve_model_attribute`
+
+    Returns:
+        Height of the right and the left heel
+
+    Raises:
+        AttributeError: if the model state has no 3D heel positions
+    """
+    model = agent.model
+    right, left = _heel_attributes(model)
+    return getattr(model, right)[2], getattr(model, left)[2]
+
+
+def _heel_attributes(model) -> Tuple[str, str]:
+    # properties of the heel positions, looked up once per model
+    model_type = type(model)
+    if model_type not in _HEEL_ATTRIBUTES:
+        _HEEL_ATTRIBUTES[model_type] = tuple(
+            resolve_model_attribute(model, f"heel_{foot}_position", 3) for foot in FEET
+        )
+    return _HEEL_ATTRIBUTES[model_type]
+
+
+_HEEL_ATTRIBUTES: Dict[type, Tuple[str, str]] = {}
+
+
+class GaitStatisticsObserver:
+    """Running gait statistics of the agents of a simulation.
+
+    Per agent the walked distance, observed time and number of steps (heel
+    strikes of both feet, see :func:`gait_analysis.detect_heel_strikes`) are
+    accumulated, over all agents the mean and variance of the speed (Welford)
+    and a histogram of the agent positions.
+    """
+
+    def __init__(
+        self,
+        simulation,
+        bounds: Optional[Tuple[float, float, float, float]] = None,
+        cell_size: float = 0.5,
+        every: int = 1,
+        contact_tolerance: float = DEFAULT_CONTACT_TOLERANCE,
+        heel_heights: Union[Callable, str, None] = "auto",
+    ):
+        """Create an observer of the given simulation.
+
+        Args:
+            simulation: the observed simulation
+            bounds: area (minx, miny, maxx, maxy) of the density histogram,
+                e.g., ``area.bounds`` of the geometry; without bounds no
+                density is computed
+            cell_size: edge length of the density cells [m]
+            every: only observe every n-th call
+            contact_tolerance: see :data:`gait_analysis.DEFAULT_CONTACT_TOLERANCE`
+            heel_heights: returns the right and left heel height of an agent;
+                "auto" uses :func:`humanoid_heel_heights` if the model state
+                provides heel positions (the humanoid model) and counts no
+                steps otherwise, None counts no steps
+        """
+        self.simulation = simulation
+        self.every = every
+        self.contact_tolerance = contact_tolerance
+        self.heel_heights = heel_heights
+        self.observations = 0
+        self._calls = 0
+
+        # per agent state, row of each agent id
+        self._rows = {}
+        self._ids = np.empty(0, dtype=np.int64)
+        self._position = np.empty((0, 2))
+        self._last_time = np.empty(0)
+        self._distance = np.empty(0)
+        self._observed_time = np.empty(0)
+        self._steps = np.empty(0, dtype=np.int64)
+        self._ground = np.empty((0, 2))
+        self._contact = np.empty((0, 2), dtype=bool)
+
+        # speed over all agents and observations
+        self._speed_count = 0
+        self._speed_mean = 0.0
+        self._speed_m2 = 0.0
+
+        if bounds is not None:
+            minx, miny, maxx, maxy = bounds
+            self.xedges = np.arange(minx, maxx + cell_size, cell_size)
+            self.yedges = np.arange(miny, maxy + cell_size, cell_size)
+            self._occupancy = np.zeros((len(self.xedges) - 1, len(self.yedges) - 1))
+        else:
+            self.xedges = self.yedges = self._occupancy = None
+
+    def __call__(self):
+        """Updates the statistics with the current state of the simulation."""
+        self._calls += 1
+        if (self._calls - 1) % self.every:
+            return
+
+        agents = list(self.simulation.agents())
+        now = self.simulation.elapsed_time()
+        self.observations += 1
+        if not agents:
+            return
+
+        ids = np.fromiter((agent.id for agent in agents), np.int64, len(agents))
+        position = np.array([agent.position for agent in agents], dtype=float)
+        rows = self._agent_rows(ids, position, now)
+
+        # speed since the last observation of each agent
+        dt = now - self._last_time[rows]
+        moved = dt > 0
+        distance = np.hypot(*(position - self._position[rows]).T)
+        self._distance[rows] += distance
+        self._observed_time[rows] += dt
+        self._update_speed(distance[moved] / dt[moved])
+        self._position[rows] = position
+        self._last_time[rows] = now
+
+        if self.heel_heights == "auto":
+            self.heel_heights = _detect_heel_heights(agents[0])
+        if self.heel_heights is not None:
+            heights = np.array([self.heel_heights(agent) for agent in agents])
+            self._update_steps(rows, heights)
+
+        if self._occupancy is not None:
+            self._occupancy += np.histogram2d(
+                position[:, 0], position[:, 1], bins=(self.xedges, self.yedges)
+            )[0]
+
+    @property
+    def mean_speed(self) -> float:
+        """Mean speed over all agents and observations [m/s]."""
+        return self._speed_mean if self._speed_count else np.nan
+
+    @property
+    def speed_std(self) -> float:
+        """Standard deviation of the speed over all agents and observations."""
+        if self._speed_count < 2:
+            return np.nan
+        return np.sqrt(self._speed_m2 / (self._speed_count - 1))
+
+    def summary(self) -> pd.DataFrame:
+        """Statistics of each agent observed so far.
+
+        Returns:
+            DataFrame with one row per agent: id, mean_speed (walked distance
+            by observed time), distance, observed_time and steps (NaN if the
+            model has no heel heights)
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_speed = self._distance / self._observed_time
+        return pd.DataFrame(
+            {
+                ID_COL: self._ids,
+                "mean_speed": mean_speed,
+                "distance": self._distance,
+                "observed_time": self._observed_time,
+                "steps": (
+                    np.nan if self.heel_heights in (None, "auto") else self._steps
+                ),
+            }
+        )
+
+    def density(self) -> np.ndarray:
+        """Mean density of each cell over all observations [1/m^2].
+
+        Returns:
+            Array of shape (len(xedges) - 1, len(yedges) - 1)
+        """
+        if self._occupancy is None:
+            raise ValueError("The observer has been created without bounds.")
+        cell_area = np.outer(np.diff(self.xedges), np.diff(self.yedges))
+        return self._occupancy / (cell_area * max(self.observations, 1))
+
+    def _agent_rows(self, ids, position, now):
+        # rows of the agents, appending agents observed for the first time
+        new = [agent_id for agent_id in ids.tolist() if agent_id not in self._rows]
+        if new:
+            first = len(self._ids)
+            self._rows.update((agent_id, first + i) for i, agent_id in enumerate(new))
+            new_positions = position[np.isin(ids, new)]
+            count = len(new)
+            self._ids = np.append(self._ids, new)
+            self._position = np.concatenate([self._position, new_positions])
+            self._last_time = np.append(self._last_time, np.full(count, now))
+            self._distance = np.append(self._distance, np.zeros(count))
+            self._observed_time = np.append(self._observed_time, np.zeros(count))
+            self._steps = np.append(self._steps, np.zeros(count, dtype=np.int64))
+            self._ground = np.concatenate([self._ground, np.full((count, 2), np.inf)])
+            self._contact = np.concatenate(
+                [self._contact, np.ones((count, 2), dtype=bool)]
+            )
+        return np.fromiter((self._rows[i] for i in ids.tolist()), np.intp, len(ids))
+
+    def _update_speed(self, speed):
+        # merges the samples into the running mean and variance (Chan et al.)
+        count = len(speed)
+        if count == 0:
+            return
+        mean = speed.mean()
+        m2 = ((speed - mean) ** 2).sum()
+        total = self._speed_count + count
+        delta = mean - self._speed_mean
+        self._speed_mean += delta * count / total
+        self._speed_m2 += m2 + delta**2 * self._speed_count * count / total
+        self._speed_count = total
+
+    def _update_steps(self, rows, heights):
+        # a heel strike is a heel back on the ground (close to the lowest
+        # height seen so far) after a swing
+        ground = np.minimum(self._ground[rows], heights)
+        contact = heights <= ground + self.contact_tolerance
+        strikes = contact & ~self._contact[rows]
+        self._steps[rows] += strikes.sum(axis=1)
+        self._ground[rows] = ground
+        self._contact[rows] = contact
+
+
+def _detect_heel_heights(agent) -> Optional[Callable]:
+    # the heel heights of the humanoid model, None for other models
+    try:
+        _heel_attributes(agent.model)
+    except AttributeError:
+        return None
+    return humanoid_heel_heights
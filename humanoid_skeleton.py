@@ -0,0 +1,120 @@
+"""Skeleton of the humanoid agents of one frame, computed for all agents at once."""
+
+from typing import Dict
+
+import numpy as np
+
+## general Humanoid parameters ###
+NECK_SCALING_FACTOR = 0.1396
+SHOULDER_WIDTH_SCALING_FACTOR = 0.45 / 1.7
+TRUNK_HEIGHT_SCALING_FACTOR = 0.3495
+
+COLLISION_RADIUS = 0.3
+COLLISION_CIRCLE_POINTS = 100
+
+SKELETON_COLORS = {
+    "right_foot": "g",
+    "left_foot": "r",
+    "body": "b",
+    "collision_circle": "k",
+    "head": "b",
+}
+"""Color of each part returned by :func:`compute_skeleton_segments`."""
+
+_CIRCLE_ANGLES = np.linspace(0, 2 * np.pi, COLLISION_CIRCLE_POINTS)
+
+
+def _position(agent_data: Dict[str, np.ndarray], segment: str) -> np.ndarray:
+    return np.column_stack([agent_data[f"{segment}_{axis}"] for axis in "xyz"])
+
+
+def compute_skeleton_segments(
+    agent_data: Dict[str, np.ndarray], height: float = 1.75
+) -> Dict[str, np.ndarray]:
+    """Computes the line segments drawing the agents of one frame.
+
+    All agents are handled in one pass over the columns, the segments of each
+    part can be passed directly to a
+    :class:`~mpl_toolkits.mplot3d.art3d.Line3DCollection`.
+
+    Args:
+        agent_data: trajectory columns of the agents of one frame, see
+            :data:`visualisator_HPP.VISUALISATOR_COLUMNS`
+        height: height of the agents
+
+    Returns:
+        Dict mapping each part to its points, "right_foot" and "left_foot"
+        have shape (n, 2, 3), "body" (legs, trunk and shoulders) (4n, 2, 3),
+        "collision_circle" (n, COLLISION_CIRCLE_POINTS, 3) and "head" (n, 3)
+    """
+    trunk_length = height * TRUNK_HEIGHT_SCALING_FACTOR
+    shoulder_width = height * SHOULDER_WIDTH_SCALING_FACTOR
+    neck_length = height * NECK_SCALING_FACTOR
+
+    pelvis_pos = _position(agent_data, "pelvis_pos")
+    heel_right_pos = _position(agent_data, "heel_right_pos")
+    heel_left_pos = _position(agent_data, "heel_left_pos")
+    toe_right_pos = _position(agent_data, "toe_right_pos")
+    toe_left_pos = _position(agent_data, "toe_left_pos")
+
+    # the legs and the trunk start at the agent position at pelvis height
+    hip_pos = np.column_stack([agent_data["x"], agent_data["y"], pelvis_pos[:, 2]])
+
+    # Feet (drawn at heel height)
+    toe_right_pos[:, 2] = heel_right_pos[:, 2]
+    toe_left_pos[:, 2] = heel_left_pos[:, 2]
+
+    # C7 position
+    trunk_rotation_angle_x = agent_data["trunk_rotation_angle_x"]
+    trunk_rotation_angle_y = agent_data["trunk_rotation_angle_y"]
+    c7_pos = np.column_stack(
+        [
+            hip_pos[:, 0]
+            + agent_data["ori_x"] * np.sin(trunk_rotation_angle_y) * trunk_length,
+            hip_pos[:, 1]
+            + agent_data["ori_y"] * np.sin(trunk_rotation_angle_x) * trunk_length,
+            hip_pos[:, 2]
+            + trunk_length
+            * np.cos(trunk_rotation_angle_x)
+            * np.cos(trunk_rotation_angle_y),
+        ]
+    )
+
+    # Head
+    head_pos = c7_pos + [0.0, 0.0, neck_length]
+
+    # Shoulders
+    shoulder_rotation_angle_z = agent_data["shoulder_rotation_angle_z"]
+    half_shoulder = np.column_stack(
+        [
+            np.cos(shoulder_rotation_angle_z) * shoulder_width * 0.5,
+            np.sin(shoulder_rotation_angle_z) * shoulder_width * 0.5,
+            np.zeros_like(shoulder_rotation_angle_z),
+        ]
+    )
+    shoulder_center = c7_pos.copy()
+    shoulder_center[:, 2] = pelvis_pos[:, 2] + trunk_length
+
+    # Collision circle in the XY plane centered at the pelvis position
+    circle = np.empty((len(pelvis_pos), COLLISION_CIRCLE_POINTS, 3))
+    circle[:, :, 0] = pelvis_pos[:, [0]] + COLLISION_RADIUS * np.cos(_CIRCLE_ANGLES)
+    circle[:, :, 1] = pelvis_pos[:, [1]] + COLLISION_RADIUS * np.sin(_CIRCLE_ANGLES)
+    circle[:, :, 2] = pelvis_pos[:, [2]]
+
+    return {
+        "right_foot": np.stack([heel_right_pos, toe_right_pos], axis=1),
+        "left_foot": np.stack([heel_left_pos, toe_left_pos], axis=1),
+        "body": np.concatenate(
+            [
+                np.stack([hip_pos, heel_right_pos], axis=1),
+                np.stack([hip_pos, heel_left_pos], axis=1),
+                np.stack([hip_pos, c7_pos], axis=1),
+                np.stack(
+                    [shoulder_center + half_shoulder, shoulder_center - half_shoulder],
+                    axis=1,
+                ),
+            ]
+        ),
+        "collision_circle": circle,
+        "head": head_pos,
+    }
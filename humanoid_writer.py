@@ -0,0 +1,861 @@
+"""Humanoid trajectory writer with configurable output.
+
+:class:`HumanoidTrajectoryWriter` writes the same sqlite format as
+:code:`jps.SqliteHumanoidTrajectoryWriter` (tables trajectory_data, metadata,
+geometry and frame_data), but
+
+- only every nth iteration is written as frame (the fps in the metadata is
+  reduced accordingly),
+- trajectory_data only gets the selected columns (frame and id are always
+  written), e.g., ``["pos_x", "pos_y"]`` for a density analysis,
+- the rows of several frames are written in a single transaction,
+- a resumed simulation (see :mod:`checkpoint`) can be appended to the file of
+  the original run, with continued frame numbers and agent ids.
+
+:class:`AppendingTrajectoryWriter` appends a resumed simulation to a file of
+:code:`jps.SqliteHumanoidTrajectoryWriter` instead.
+
+The writer also measures the time spent writing and the time spent between
+two writes (the iteration itself and everything the simulation loop does
+between two iterations), see :meth:`HumanoidTrajectoryWriter.timing_report`.
+
+Buffered frames are written when the writer is closed, garbage collected or
+at the latest when the interpreter exits.
+"""
+
+import pathlib
+import sqlite3
+import time
+import warnings
+import weakref
+from contextlib import closing
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import jupedsim as jps
+import numpy as np
+import pandas as pd
+import shapely
+
+DATABASE_VERSION = 2
+
+
+HUMANOID_STATE_COLUMNS: Dict[str, Tuple[str, Optional[int]]] = {
+    "pos_x": ("position", 0),
+    "pos_y": ("position", 1),
+    "ori_x": ("orientation", 0),
+    "ori_y": ("orientation", 1),
+    **{
+        f"{segment}_pos_{axis}": (f"model.{segment}_position", index)
+        for segment in (
+            "head",
+            "pelvis",
+            "heel_right",
+            "heel_left",
+            "toe_right",
+            "toe_left",
+        )
+        for index, axis in enumerate("xyz")
+    },
+    "pelvis_rotation_angle_z": ("model.pelvis_rotation_angle_z", None),
+    "shoulder_rotation_angle_z": ("model.shoulder_rotation_angle_z", None),
+    "trunk_rotation_angle_x": ("model.trunk_rotation_angle_x", None),
+    "trunk_rotation_angle_y": ("model.trunk_rotation_angle_y", None),
+}
+"""Agent attribute (and index of the component) of each column of 'trajectory_data'.
+
+The model attributes are named after the columns, the property of the model
+state providing them is looked up by :func:`resolve_model_attribute`.
+"""
+
+
+def resolve_model_attribute(
+    model, attribute: str, components: Optional[int] = None
+) -> str:
+    """Name of the property of a model state providing an attribute.
+
+    The property is looked up by the exact name, then ignoring case and
+    underscores and last by the words of the name without "position" (e.g.,
+    heel_right_position is found as right_heel_pos), preferring names
+    containing "pos". Only properties with a value of the given shape are
+    considered.
+
+    Args:
+        model: model state of an agent, e.g., :code:`agent.model`
+        attribute: attribute without the "model." prefix, e.g.,
+            "heel_right_position"
+        components: number of components of the value, e.g., 3 for a
+            position, None for a scalar
+
+    Returns:
+        Name of the property
+
+    Raises:
+        AttributeError: if no or more than one property matches
+    """
+    names = [
+        name
+        for name in dir(type(model))
+        if not name.startswith("_")
+        and isinstance(getattr(type(model), name, None), property)
+    ]
+    shape = () if components is None else (components,)
+
+    def has_shape(name):
+        # deprecated aliases are matched, but do not warn
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return np.shape(getattr(model, name)) == shape
+
+    words = [
+        word for word in attribute.lower().split("_") if word not in ("position", "pos")
+    ]
+    containing_words = [
+        name for name in names if all(word in name.lower() for word in words)
+    ]
+    candidates = (
+        [name for name in names if name == attribute],
+        [name for name in names if _normalize(name) == _normalize(attribute)],
+        [name for name in containing_words if "pos" in name.lower()],
+        containing_words,
+    )
+    for matches in candidates:
+        matches = [name for name in matches if has_shape(name)]
+        if len(matches) == 1:
+            return matches[0]
+        if matches:
+            raise AttributeError(
+                f"{type(model).__name__} has several attributes matching "
+                f"{attribute!r}: {', '.join(matches)}."
+            )
+    raise AttributeError(
+        f"{type(model).__name__} has no attribute matching {attribute!r} with "
+        f"shape {shape}, its attributes are {', '.join(names)}."
+    )
+
+
+def _normalize(name: str) -> str:
+    return name.replace("_", "").lower()
+
+
+class HumanoidTrajectoryWriter(jps.TrajectoryWriter):
+    """Writes humanoid trajectories into a JuPedSim sqlite file."""
+
+    def __init__(
+        self,
+        *,
+        output_file: pathlib.Path,
+        every_nth_frame: int = 1,
+        columns: Optional[Sequence[str]] = None,
+        frames_per_transaction: int = 50,
+        iteration_offset: int = 0,
+        append_from_iteration: Optional[int] = None,
+        agent_ids: Optional[Dict[int, int]] = None,
+    ) -> None:
+        """Creates the writer, the file is created by :meth:`begin_writing`.
+
+        Args:
+            output_file: trajectory file to write
+            every_nth_frame: interval between written iterations, 1 writes
+                every iteration
+            columns: columns of 'trajectory_data' to write (default: all of
+                :data:`HUMANOID_STATE_COLUMNS`)
+            frames_per_transaction: number of frames written at once
+            iteration_offset: number added to the iterations of the
+                simulation, the frames are numbered by the sum
+            append_from_iteration: append to the existing file instead of
+                creating it, its frames from this iteration (including the
+                offset) on are replaced, earlier iterations are not written
+            agent_ids: id written for an agent of the simulation, agents not
+                in it are written with their own id. The dict is read when
+                writing, it may be filled after creating the writer.
+        """
+        if every_nth_frame < 1:
+            raise jps.TrajectoryWriter.Exception("'every_nth_frame' has to be > 0")
+        if iteration_offset < 0:
+            raise jps.TrajectoryWriter.Exception("'iteration_offset' has to be >= 0")
+        if append_from_iteration is not None and append_from_iteration < 1:
+            raise jps.TrajectoryWriter.Exception(
+                "'append_from_iteration' has to be > 0"
+            )
+        if frames_per_transaction < 1:
+            raise jps.TrajectoryWriter.Exception(
+                "'frames_per_transaction' has to be > 0"
+            )
+        columns = list(HUMANOID_STATE_COLUMNS if columns is None else columns)
+        unknown = [column for column in columns if column not in HUMANOID_STATE_COLUMNS]
+        if unknown:
+            raise jps.TrajectoryWriter.Exception(
+                f"Unknown columns {unknown}, supported are "
+                f"{', '.join(HUMANOID_STATE_COLUMNS)}."
+            )
+
+        self._output_file = pathlib.Path(output_file)
+        self._every_nth_frame = every_nth_frame
+        self._frames_per_transaction = frames_per_transaction
+        self._iteration_offset = iteration_offset
+        self._append_from_iteration = append_from_iteration
+        self._agent_ids = agent_ids
+        # keep the order of the table, independent of the given order
+        self._columns = [
+            column for column in HUMANOID_STATE_COLUMNS if column in columns
+        ]
+        # each attribute is read once per agent, the model state only if needed
+        self._attributes = list(
+            dict.fromkeys(HUMANOID_STATE_COLUMNS[column][0] for column in self._columns)
+        )
+        self._picks = [
+            (self._attributes.index(attribute), index)
+            for attribute, index in map(HUMANOID_STATE_COLUMNS.get, self._columns)
+        ]
+        self._agent_attributes = [
+            (attribute.startswith("model."), attribute.removeprefix("model."))
+            for attribute in self._attributes
+        ]
+        self._uses_model = any(is_model for is_model, _ in self._agent_attributes)
+        # number of components of each model attribute, None for scalars
+        self._components = {
+            attribute: max(indices) + 1 if None not in indices else None
+            for attribute, indices in _attribute_indices().items()
+        }
+        self._resolved = not self._uses_model
+        self._buffer = None
+        self._geometry_hashes: Dict[str, int] = {}
+
+        self._last_write_end = None
+        self._iterations: List[int] = []
+        self._compute_times: List[float] = []
+        self._write_times: List[float] = []
+        # total time spent writing in seconds, read by loop_profiler
+        self.write_time = 0.0
+
+    def begin_writing(self, simulation) -> None:
+        """Creates the tables (or opens the file to append) and writes the metadata.
+
+        Args:
+            simulation: simulation to write
+        """
+        agent = next(iter(simulation.agents()), None)
+        if agent is not None:
+            self._resolve_attributes(agent)
+
+        fps = 1 / simulation.delta_time() / self._every_nth_frame
+        append = self._append_from_iteration is not None
+        if append and not self._output_file.is_file():
+            raise jps.TrajectoryWriter.Exception(
+                f"Cannot append to {self._output_file}, the file does not exist."
+            )
+        connection = sqlite3.connect(self._output_file, isolation_level=None)
+        try:
+            if append:
+                self._truncate_tables(connection, fps)
+            else:
+                self._create_tables(connection, fps)
+        except sqlite3.Error as exc:
+            connection.close()
+            raise jps.TrajectoryWriter.Exception(
+                f"Error creating database: {exc}"
+            ) from exc
+        except jps.TrajectoryWriter.Exception:
+            connection.close()
+            raise
+
+        self._buffer = _FrameBuffer(connection, len(self._columns))
+        if append:
+            self._buffer.load_geometries()
+            # identical geometries keep the hash of the original run
+            self._geometry_hashes = {
+                wkt: geometry_hash
+                for geometry_hash, wkt in self._buffer.geometries.items()
+            }
+        # write the buffered frames even if the writer is never closed
+        self._finalizer = weakref.finalize(self, self._buffer.close)
+
+    def _create_tables(self, connection: sqlite3.Connection, fps: float) -> None:
+        columns = ", ".join(f"{column} REAL NOT NULL" for column in self._columns)
+        connection.executescript(f"""
+            BEGIN;
+            DROP TABLE IF EXISTS trajectory_data;
+            CREATE TABLE trajectory_data (
+                frame INTEGER NOT NULL, id INTEGER NOT NULL, {columns});
+            DROP TABLE IF EXISTS metadata;
+            CREATE TABLE metadata(
+                key TEXT NOT NULL UNIQUE PRIMARY KEY, value TEXT NOT NULL);
+            DROP TABLE IF EXISTS geometry;
+            CREATE TABLE geometry(hash INTEGER NOT NULL, wkt TEXT NOT NULL);
+            CREATE UNIQUE INDEX geometry_hash ON geometry(hash);
+            DROP TABLE IF EXISTS frame_data;
+            CREATE TABLE frame_data(
+                frame INTEGER NOT NULL, geometry_hash INTEGER NOT NULL);
+            CREATE INDEX frame_id_idx ON trajectory_data(frame, id);
+            COMMIT;
+            """)
+        connection.executemany(
+            "INSERT INTO metadata VALUES(?, ?)",
+            (("version", DATABASE_VERSION), ("fps", fps)),
+        )
+
+    def _truncate_tables(self, connection: sqlite3.Connection, fps: float) -> None:
+        # the file has to match the output of this writer
+        columns = [
+            row[1] for row in connection.execute("PRAGMA table_info(trajectory_data)")
+        ]
+        if columns != ["frame", "id", *self._columns]:
+            raise jps.TrajectoryWriter.Exception(
+                f"Cannot append to {self._output_file}, its columns {columns[2:]} "
+                f"differ from the written columns {self._columns}."
+            )
+        stored_fps = connection.execute(
+            "SELECT value FROM metadata WHERE key = 'fps'"
+        ).fetchone()
+        if stored_fps is None or not np.isclose(float(stored_fps[0]), fps):
+            raise jps.TrajectoryWriter.Exception(
+                f"Cannot append to {self._output_file}, its fps "
+                f"{stored_fps and stored_fps[0]} differ from {fps}."
+            )
+        # the frames from append_from_iteration on are written again
+        last_frame = (self._append_from_iteration - 1) // self._every_nth_frame
+        cursor = connection.cursor()
+        cursor.execute("BEGIN")
+        cursor.execute("DELETE FROM trajectory_data WHERE frame > ?", (last_frame,))
+        cursor.execute("DELETE FROM frame_data WHERE frame > ?", (last_frame,))
+        cursor.execute("COMMIT")
+
+    def write_iteration_state(self, simulation) -> None:
+        """Buffers the state of the agents if the iteration is written.
+
+        Args:
+            simulation: simulation to write
+        """
+        if self._buffer is None:
+            raise jps.TrajectoryWriter.Exception("Database not opened.")
+
+        iteration = simulation.iteration_count() + self._iteration_offset
+        if (
+            self._append_from_iteration is not None
+            and iteration < self._append_from_iteration
+        ):
+            # already written by the original run
+            return
+
+        start = time.perf_counter()
+        if iteration % self._every_nth_frame == 0:
+            frame = iteration // self._every_nth_frame
+            agents = list(simulation.agents())
+            if agents and not self._resolved:
+                self._resolve_attributes(agents[0])
+            self._buffer.rows.extend(self._row(frame, agent) for agent in agents)
+            geometry = simulation.get_geometry().as_wkt()
+            geometry_hash = self._geometry_hashes.setdefault(geometry, hash(geometry))
+            self._buffer.frames.append((frame, geometry_hash))
+            self._buffer.geometries.setdefault(geometry_hash, geometry)
+            if len(self._buffer.frames) >= self._frames_per_transaction:
+                self._buffer.flush()
+        end = time.perf_counter()
+
+        self._iterations.append(iteration)
+        self._compute_times.append(
+            np.nan if self._last_write_end is None else start - self._last_write_end
+        )
+        self._write_times.append(end - start)
+        self.write_time += end - start
+        self._last_write_end = end
+
+    def every_nth_frame(self) -> int:
+        """Interval of the iterations the simulation passes to the writer.
+
+        With an iteration offset the written iterations are not multiples of
+        the interval in the numbering of the simulation, so every iteration
+        is passed and the writer selects the written ones itself.
+        """
+        return 1 if self._iteration_offset else self._every_nth_frame
+
+    def iteration_offset(self) -> int:
+        return self._iteration_offset
+
+    def _resolve_attributes(self, agent) -> None:
+        # names of the model properties, looked up once
+        if self._resolved:
+            return
+        try:
+            self._agent_attributes = [
+                (
+                    is_model,
+                    (
+                        resolve_model_attribute(
+                            agent.model,
+                            attribute,
+                            self._components[f"model.{attribute}"],
+                        )
+                        if is_model
+                        else attribute
+                    ),
+                )
+                for is_model, attribute in self._agent_attributes
+            ]
+        except AttributeError as exc:
+            raise jps.TrajectoryWriter.Exception(
+                f"Cannot write the selected columns: {exc} Select the columns "
+                "provided by the model with 'columns'."
+            ) from exc
+        self._resolved = True
+
+    def _row(self, frame, agent):
+        model = agent.model if self._uses_model else None
+        values = [
+            getattr(model if is_model else agent, attribute)
+            for is_model, attribute in self._agent_attributes
+        ]
+        agent_id = agent.id
+        if self._agent_ids:
+            agent_id = self._agent_ids.get(agent_id, agent_id)
+        return (
+            frame,
+            agent_id,
+            *(
+                values[attribute] if index is None else values[attribute][index]
+                for attribute, index in self._picks
+            ),
+        )
+
+    def columns(self) -> List[str]:
+        """Columns of 'trajectory_data' besides frame and id."""
+        return list(self._columns)
+
+    def flush(self) -> None:
+        """Writes all buffered frames."""
+        if self._buffer is not None:
+            self._buffer.flush()
+
+    def close(self) -> None:
+        """Writes all buffered frames and closes the file."""
+        if self._buffer is not None:
+            self._finalizer()
+
+    def timing_report(self) -> pd.DataFrame:
+        """Time spent writing and computing of each iteration.
+
+        The compute time of an iteration is the time between the end of the
+        previous and the start of the current write, i.e., it includes
+        everything the simulation loop does between two iterations. It is
+        not known for the first write.
+
+        Returns:
+            DataFrame with the columns iteration, compute_time and write_time
+            in seconds
+        """
+        return pd.DataFrame(
+            {
+                "iteration": self._iterations,
+                "compute_time": self._compute_times,
+                "write_time": self._write_times,
+            }
+        )
+
+    def timing_summary(self) -> Dict[str, float]:
+        """Total compute and write time and the share of the write time.
+
+        Returns:
+            Dict with compute_time, write_time (both in seconds) and
+            write_share
+        """
+        report = self.timing_report()
+        compute_time = float(report["compute_time"].sum())
+        write_time = float(report["write_time"].sum())
+        total = compute_time + write_time
+        return {
+            "compute_time": compute_time,
+            "write_time": write_time,
+            "write_share": write_time / total if total > 0 else np.nan,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AppendingTrajectoryWriter(jps.TrajectoryWriter):
+    """Appends the output of a JuPedSim writer to the file of an original run.
+
+    Continues a file written by :code:`jps.SqliteHumanoidTrajectoryWriter`
+    without looking up any model attribute: the wrapped writer writes every
+    iteration into a continuation file next to the trajectory file, whose
+    rows are copied to the trajectory file with the frame numbers, the
+    interval and the agent ids of the original run. The rows are copied
+    every frames_per_transaction iterations, on :meth:`flush` and when the
+    writer is closed (or garbage collected), then the continuation file is
+    removed.
+    """
+
+    def __init__(
+        self,
+        *,
+        output_file: pathlib.Path,
+        append_from_iteration: int,
+        iteration_offset: int = 0,
+        agent_ids: Optional[Dict[int, int]] = None,
+        writer_class=None,
+        frames_per_transaction: int = 50,
+    ) -> None:
+        """Creates the writer, the file is opened by :meth:`begin_writing`.
+
+        Args:
+            output_file: trajectory file of the original run
+            append_from_iteration: its frames from this iteration (including
+                the offset) on are replaced, earlier iterations are not
+                written
+            iteration_offset: number added to the iterations of the
+                simulation
+            agent_ids: id written for an agent of the simulation, see
+                :class:`HumanoidTrajectoryWriter`
+            writer_class: writer of the original run, created with
+                output_file and every_nth_frame (default:
+                :code:`jps.SqliteHumanoidTrajectoryWriter`)
+            frames_per_transaction: number of iterations copied at once
+        """
+        if iteration_offset < 0:
+            raise jps.TrajectoryWriter.Exception("'iteration_offset' has to be >= 0")
+        if append_from_iteration < 1:
+            raise jps.TrajectoryWriter.Exception(
+                "'append_from_iteration' has to be > 0"
+            )
+        if frames_per_transaction < 1:
+            raise jps.TrajectoryWriter.Exception(
+                "'frames_per_transaction' has to be > 0"
+            )
+        self._output_file = pathlib.Path(output_file)
+        self._continuation_file = self._output_file.with_name(
+            f"{self._output_file.stem}.continuation{self._output_file.suffix}"
+        )
+        self._append_from_iteration = append_from_iteration
+        self._iteration_offset = iteration_offset
+        self._agent_ids = {} if agent_ids is None else agent_ids
+        self._writer_class = writer_class or jps.SqliteHumanoidTrajectoryWriter
+        self._frames_per_transaction = frames_per_transaction
+        self._continuation = None
+        self._pending = 0
+
+    def begin_writing(self, simulation) -> None:
+        """Removes the replaced frames of the trajectory file and starts writing.
+
+        Args:
+            simulation: simulation to write
+        """
+        if not self._output_file.is_file():
+            raise jps.TrajectoryWriter.Exception(
+                f"Cannot append to {self._output_file}, the file does not exist."
+            )
+        self._continuation_file.unlink(missing_ok=True)
+        # every iteration, the ones of the original interval are copied
+        writer = self._writer_class(
+            output_file=self._continuation_file, every_nth_frame=1
+        )
+        writer.begin_writing(simulation)
+        self._continuation = _Continuation(
+            writer,
+            self._output_file,
+            self._continuation_file,
+            self._iteration_offset,
+            self._append_from_iteration,
+            self._agent_ids,
+        )
+        try:
+            self._continuation.truncate(simulation.delta_time())
+        except sqlite3.Error as exc:
+            self._continuation.close()
+            raise jps.TrajectoryWriter.Exception(
+                f"Error opening database: {exc}"
+            ) from exc
+        except jps.TrajectoryWriter.Exception:
+            self._continuation.close()
+            raise
+        self._finalizer = weakref.finalize(self, self._continuation.close)
+
+    def write_iteration_state(self, simulation) -> None:
+        """Writes the iteration into the continuation file.
+
+        Args:
+            simulation: simulation to write
+        """
+        if self._continuation is None:
+            raise jps.TrajectoryWriter.Exception("Database not opened.")
+        self._continuation.writer.write_iteration_state(simulation)
+        self._pending += 1
+        if self._pending >= self._frames_per_transaction:
+            self.flush()
+
+    def every_nth_frame(self) -> int:
+        # the iterations of the original interval are selected when copying
+        return 1
+
+    def iteration_offset(self) -> int:
+        return self._iteration_offset
+
+    def flush(self) -> None:
+        """Copies the written iterations to the trajectory file."""
+        if self._continuation is not None:
+            self._continuation.copy()
+            self._pending = 0
+
+    def close(self) -> None:
+        """Copies the written iterations and removes the continuation file."""
+        if self._continuation is not None:
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _FrameBuffer:
+    # the state shared with the finalizer, it must not reference the writer
+
+    def __init__(self, connection: sqlite3.Connection, num_columns: int):
+        self.connection = connection
+        self.insert = (
+            f"INSERT INTO trajectory_data VALUES({', '.join('?' * (num_columns + 2))})"
+        )
+        self.rows = []
+        self.frames = []
+        self.geometries = {}
+        self.written_geometries = set()
+        self.bounds = [np.inf, np.inf, -np.inf, -np.inf]
+
+    def load_geometries(self):
+        # continue an existing file with its geometries and bounds
+        self.geometries.update(
+            self.connection.execute("SELECT hash, wkt FROM geometry").fetchall()
+        )
+        self.written_geometries.update(self.geometries)
+        bounds = dict(
+            self.connection.execute(
+                "SELECT key, value FROM metadata"
+                " WHERE key IN ('xmin', 'ymin', 'xmax', 'ymax')"
+            ).fetchall()
+        )
+        if len(bounds) == 4:
+            self.bounds = [
+                float(bounds[key]) for key in ("xmin", "ymin", "xmax", "ymax")
+            ]
+
+    def flush(self):
+        if not self.frames:
+            return
+        new_geometries = [
+            (geometry_hash, wkt)
+            for geometry_hash, wkt in self.geometries.items()
+            if geometry_hash not in self.written_geometries
+        ]
+        for _, wkt in new_geometries:
+            xmin, ymin, xmax, ymax = shapely.from_wkt(wkt).bounds
+            self.bounds = [
+                min(self.bounds[0], xmin),
+                min(self.bounds[1], ymin),
+                max(self.bounds[2], xmax),
+                max(self.bounds[3], ymax),
+            ]
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("BEGIN")
+            cursor.executemany(self.insert, self.rows)
+            cursor.executemany("INSERT INTO frame_data VALUES(?, ?)", self.frames)
+            if new_geometries:
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO geometry(hash, wkt) VALUES(?, ?)",
+                    new_geometries,
+                )
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO metadata(key, value) VALUES(?, ?)",
+                    zip(("xmin", "ymin", "xmax", "ymax"), map(str, self.bounds)),
+                )
+            cursor.execute("COMMIT")
+        except sqlite3.Error as exc:
+            cursor.execute("ROLLBACK")
+            raise jps.TrajectoryWriter.Exception(
+                f"Error writing to database: {exc}"
+            ) from exc
+
+        self.written_geometries.update(
+            geometry_hash for geometry_hash, _ in new_geometries
+        )
+        self.rows.clear()
+        self.frames.clear()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+
+
+class _Continuation:
+    # the state shared with the finalizer, it must not reference the writer
+
+    def __init__(
+        self,
+        writer,
+        output_file,
+        continuation_file,
+        iteration_offset,
+        append_from_iteration,
+        agent_ids,
+    ):
+        self.writer = writer
+        self.output_file = output_file
+        self.continuation_file = continuation_file
+        self.iteration_offset = iteration_offset
+        self.append_from_iteration = append_from_iteration
+        self.agent_ids = agent_ids
+        self.every_nth_frame = 1
+        self.columns: List[str] = []
+        # last iteration of the continuation file copied to the output file
+        self.copied = -1
+
+    def truncate(self, delta_time):
+        # the continuation has to match the output file, whose frames after
+        # the appended ones are removed
+        with closing(sqlite3.connect(self.output_file)) as connection:
+            self.columns = _table_columns(connection)
+            stored_fps = connection.execute(
+                "SELECT value FROM metadata WHERE key = 'fps'"
+            ).fetchone()
+            with closing(sqlite3.connect(self.continuation_file)) as continuation:
+                continuation_columns = _table_columns(continuation)
+            if continuation_columns != self.columns:
+                raise jps.TrajectoryWriter.Exception(
+                    f"Cannot append to {self.output_file}, its columns "
+                    f"{self.columns[2:]} differ from the written columns "
+                    f"{continuation_columns[2:]}."
+                )
+            every_nth_frame = (
+                1 / delta_time / float(stored_fps[0]) if stored_fps else np.nan
+            )
+            if not np.isclose(every_nth_frame, round(every_nth_frame)):
+                raise jps.TrajectoryWriter.Exception(
+                    f"Cannot append to {self.output_file}, its fps "
+                    f"{stored_fps and stored_fps[0]} is no fraction of "
+                    f"{1 / delta_time}."
+                )
+            self.every_nth_frame = round(every_nth_frame)
+            last_frame = (self.append_from_iteration - 1) // self.every_nth_frame
+            with connection:
+                connection.execute(
+                    "DELETE FROM trajectory_data WHERE frame > ?", (last_frame,)
+                )
+                connection.execute(
+                    "DELETE FROM frame_data WHERE frame > ?", (last_frame,)
+                )
+
+    def copy(self):
+        # rows of the iterations of the original interval, renumbered
+        values = ", ".join(f"t.{column}" for column in self.columns[2:])
+        selection = (
+            "iteration > :copied AND iteration <= :last"
+            " AND iteration + :offset >= :append_from"
+            " AND (iteration + :offset) % :every_nth_frame = 0"
+        )
+        with closing(sqlite3.connect(self.output_file)) as connection:
+            connection.execute(
+                "ATTACH DATABASE ? AS continuation", (str(self.continuation_file),)
+            )
+            last = connection.execute(
+                "SELECT MAX(frame) FROM continuation.frame_data"
+            ).fetchone()[0]
+            if last is None or last <= self.copied:
+                return
+            params = {
+                "copied": self.copied,
+                "last": last,
+                "offset": self.iteration_offset,
+                "append_from": self.append_from_iteration,
+                "every_nth_frame": self.every_nth_frame,
+            }
+            with connection:
+                connection.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS agent_ids("
+                    "id INTEGER PRIMARY KEY, original INTEGER NOT NULL)"
+                )
+                connection.execute("DELETE FROM agent_ids")
+                connection.executemany(
+                    "INSERT INTO agent_ids VALUES(?, ?)", self.agent_ids.items()
+                )
+                connection.execute(
+                    "INSERT INTO trajectory_data"
+                    " SELECT (iteration + :offset) / :every_nth_frame,"
+                    f" COALESCE(a.original, t.id), {values}"
+                    " FROM (SELECT CAST(frame AS INTEGER) AS iteration, *"
+                    "  FROM continuation.trajectory_data) AS t"
+                    " LEFT JOIN agent_ids AS a ON a.id = t.id"
+                    f" WHERE {selection} ORDER BY iteration, t.id",
+                    params,
+                )
+                connection.execute(
+                    "INSERT INTO frame_data"
+                    " SELECT (iteration + :offset) / :every_nth_frame, geometry_hash"
+                    " FROM (SELECT CAST(frame AS INTEGER) AS iteration, *"
+                    "  FROM continuation.frame_data)"
+                    f" WHERE {selection} ORDER BY iteration",
+                    params,
+                )
+                connection.execute(
+                    "INSERT OR IGNORE INTO geometry"
+                    " SELECT * FROM continuation.geometry"
+                )
+            connection.execute("DETACH DATABASE continuation")
+        self.copied = last
+
+    def close(self):
+        try:
+            self.copy()
+        finally:
+            connection = getattr(self.writer, "connection", None)
+            if connection is not None:
+                connection().close()
+            self.continuation_file.unlink(missing_ok=True)
+
+
+def _table_columns(connection: sqlite3.Connection) -> List[str]:
+    return [row[1] for row in connection.execute("PRAGMA table_info(trajectory_data)")]
+
+
+def _attribute_indices() -> Dict[str, List[Optional[int]]]:
+    # component indices of each attribute over all columns
+    indices: Dict[str, List[Optional[int]]] = {}
+    for attribute, index in HUMANOID_STATE_COLUMNS.values():
+        indices.setdefault(attribute, []).append(index)
+    return indices
+
+
+def create_trajectory_writer(
+    trajectory_file: pathlib.Path, writer_options: Optional[dict] = None
+):
+    """Trajectory writer of the sim_* scripts.
+
+    Args:
+        trajectory_file: output file
+        writer_options: arguments of :class:`HumanoidTrajectoryWriter`, None
+            uses :code:`jps.SqliteHumanoidTrajectoryWriter`, writing all
+            columns of every frame. With "native" set, the remaining options
+            are the arguments of :class:`AppendingTrajectoryWriter`, which
+            continues a file of :code:`jps.SqliteHumanoidTrajectoryWriter`
+            (see :func:`checkpoint.resume_simulation`).
+
+    Returns:
+        The trajectory writer
+    """
+    if writer_options is None:
+        return jps.SqliteHumanoidTrajectoryWriter(
+            output_file=pathlib.Path(trajectory_file)
+        )
+    writer_options = dict(writer_options)
+    if writer_options.pop("native", False):
+        return AppendingTrajectoryWriter(
+            output_file=pathlib.Path(trajectory_file), **writer_options
+        )
+    return HumanoidTrajectoryWriter(
+        output_file=pathlib.Path(trajectory_file), **writer_options
+    )
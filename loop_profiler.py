@@ -0,0 +1,180 @@
+"""Profiling of the simulation loop, iteration by iteration.
+
+:class:`LoopProfiler` replaces the call of :code:`simulation.iterate()` in a
+simulation loop and records for each iteration
+
+- the time of the core step (:code:`simulation.iterate()`),
+- the part of it spent in the trajectory writer, if the writer measures it
+  (see :class:`humanoid_writer.HumanoidTrajectoryWriter`),
+- the time spent in Python between two iterations (observers, lookups of
+  agents, printing, ...),
+- the number of agents after the iteration,
+
+e.g.::
+
+    profiler = LoopProfiler(simulation)
+    while simulation.agent_count() > 0:
+        profiler.iterate()
+        ...  # bookkeeping
+    profiler.write("bottleneck")
+
+writes the time series to ``bottleneck_profile.csv`` and the times in folded
+stack format to ``bottleneck_profile.folded``, which can be rendered as flame
+graph (e.g., with flamegraph.pl or speedscope). The stacks are grouped by the
+number of agents, so the flame graph shows at which density the time is
+spent.
+"""
+
+import pathlib
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class LoopProfiler:
+    """Instrumented driver of a simulation loop."""
+
+    def __init__(self, simulation, trajectory_writer=None):
+        """Creates the profiler, the first iteration starts the measurement.
+
+        Args:
+            simulation: simulation to iterate
+            trajectory_writer: writer of the simulation (default: the one
+                the simulation was created with), its time is reported
+                separately if it provides the total time spent writing as
+                write_time
+        """
+        self.simulation = simulation
+        self.trajectory_writer = trajectory_writer or getattr(
+            simulation, "_writer", None
+        )
+        self._last_end: Optional[float] = None
+        self._iterations: List[int] = []
+        self._agents: List[int] = []
+        self._step_times: List[float] = []
+        self._write_times: List[float] = []
+        self._bookkeeping_times: List[float] = []
+
+    def iterate(self, count: int = 1) -> None:
+        """Advances the simulation and records the times of the iteration.
+
+        Args:
+            count: number of iterations to advance, they are recorded as one
+        """
+        write_time = self._writer_time()
+        start = time.perf_counter()
+        self.simulation.iterate(count)
+        end = time.perf_counter()
+        write_time = self._writer_time() - write_time
+
+        self._iterations.append(self.simulation.iteration_count())
+        self._agents.append(self.simulation.agent_count())
+        self._step_times.append(end - start - write_time)
+        self._write_times.append(write_time)
+        self._bookkeeping_times.append(
+            0.0 if self._last_end is None else start - self._last_end
+        )
+        self._last_end = end
+
+    def time_series(self) -> pd.DataFrame:
+        """Times of all recorded iterations.
+
+        Returns:
+            DataFrame with the columns iteration, agents, step_time (core
+            step without writing), write_time, bookkeeping_time (Python time
+            before the iteration) and wall_time (sum of the three), all times
+            in seconds
+        """
+        series = pd.DataFrame(
+            {
+                "iteration": np.array(self._iterations, dtype=np.int64),
+                "agents": np.array(self._agents, dtype=np.int64),
+                "step_time": self._step_times,
+                "write_time": self._write_times,
+                "bookkeeping_time": self._bookkeeping_times,
+            }
+        )
+        series["wall_time"] = series[
+            ["step_time", "write_time", "bookkeeping_time"]
+        ].sum(axis=1)
+        return series
+
+    def summary(self) -> Dict[str, float]:
+        """Totals of the recorded iterations.
+
+        Returns:
+            Dict with the number of iterations, the total times, the share of
+            each phase and the mean agent-steps per second of the core step
+        """
+        series = self.time_series()
+        wall_time = float(series["wall_time"].sum())
+        summary = {"iterations": len(series), "wall_time": wall_time}
+        for phase in ("step", "write", "bookkeeping"):
+            total = float(series[f"{phase}_time"].sum())
+            summary[f"{phase}_time"] = total
+            summary[f"{phase}_share"] = total / wall_time if wall_time > 0 else np.nan
+        step_time = summary["step_time"]
+        summary["agent_steps_per_second"] = (
+            float(series["agents"].sum()) / step_time if step_time > 0 else np.nan
+        )
+        return summary
+
+    def folded_stacks(self, name: str = "simulation") -> List[str]:
+        """Times of the phases in folded stack format.
+
+        Each line is ``<name>;agents <lo>-<hi>;<phase> <microseconds>``, the
+        iterations are grouped by the number of agents in powers of two.
+
+        Args:
+            name: name of the root frame
+
+        Returns:
+            The lines, sorted
+        """
+        series = self.time_series()
+        # 0, 1, 2-3, 4-7, ...
+        bins = np.where(
+            series["agents"] > 0,
+            np.floor(np.log2(series["agents"].clip(lower=1))).astype(int) + 1,
+            0,
+        )
+        samples = Counter()
+        for phase, stack in (
+            ("step", "iterate;step"),
+            ("write", "iterate;trajectory_writer"),
+            ("bookkeeping", "bookkeeping"),
+        ):
+            microseconds = np.rint(series[f"{phase}_time"].to_numpy() * 1e6)
+            for agent_bin, value in zip(bins, microseconds):
+                samples[f"{name};agents {_bin_label(agent_bin)};{stack}"] += int(value)
+        return sorted(f"{stack} {count}" for stack, count in samples.items() if count)
+
+    def write(self, output_prefix, folded: bool = True) -> None:
+        """Writes the time series as csv and the folded stacks.
+
+        Args:
+            output_prefix: prefix of the files, ``<prefix>_profile.csv`` and
+                ``<prefix>_profile.folded``
+            folded: write the folded stacks as well
+        """
+        output_prefix = pathlib.Path(output_prefix)
+        self.time_series().to_csv(
+            f"{output_prefix}_profile.csv", index=False, float_format="%.6g"
+        )
+        if folded:
+            pathlib.Path(f"{output_prefix}_profile.folded").write_text(
+                "\n".join(self.folded_stacks(output_prefix.name)) + "\n"
+            )
+
+    def _writer_time(self) -> float:
+        return getattr(self.trajectory_writer, "write_time", 0.0)
+
+
+def _bin_label(agent_bin: int) -> str:
+    if agent_bin == 0:
+        return "0"
+    lo, hi = 2 ** (agent_bin - 1), 2**agent_bin - 1
+    return str(lo) if lo == hi else f"{lo}-{hi}"
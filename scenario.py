@@ -0,0 +1,387 @@
+"""Scenarios described as data instead of code.
+
+A scenario file is a JSON document with the geometry as WKT, the stages, the
+journeys through them and the agent groups, e.g.::
+
+    {
+      "name": "corridor",
+      "max_iterations": 3000,
+      "geometry": ["POLYGON ((0 0, 20 0, 20 5, 0 5, 0 0))"],
+      "stages": {
+        "exit": {"type": "exit", "polygon": "POLYGON ((18 0, 20 0, 20 5, 18 5, 18 0))"},
+        "wp": {"type": "waypoint", "position": [10, 2.5], "distance": 0.5}
+      },
+      "journeys": {"to_exit": ["wp", "exit"]},
+      "agent_groups": [
+        {
+          "journey": "to_exit",
+          "spawn_area": "POLYGON ((0.5 0.5, 4.5 0.5, 4.5 4.5, 0 4.5, 0.5 0.5))",
+          "number_of_agents": 10,
+          "distance_to_agents": 0.6,
+          "distance_to_polygon": 0.15,
+          "desired_speed": {"mean": 1.5, "std": 0.2},
+          "height": 1.75
+        }
+      ]
+    }
+
+The walkable area is the union of the geometry polygons. A journey visits its
+stages in the given order (fixed transitions). Instead of a spawn area, an
+agent group may list explicit "positions"; without "number_of_agents" the
+spawn area is filled. Optional keys are "seed" (scenario wide default of the
+agent groups) and "max_iterations" (default: :data:`DEFAULT_MAX_ITERATIONS`).
+
+The processed geometry (union, walkable area, stage and spawn polygons) is
+cached by the hash of the geometric content of the scenario, in memory and on
+disk, so repeated runs of the same layout skip the preprocessing.
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+from typing import Any, Dict, List, Optional
+
+import jupedsim as jps
+import numpy as np
+import pedpy
+import shapely
+from shapely import Polygon, wkt
+
+from humanoid_writer import create_trajectory_writer
+from spawn_cache import (
+    distribute_by_number_cached,
+    distribute_until_filled_cached,
+)
+
+SCENARIO_SCHEMA_VERSION = 1
+"""Version of the processed geometry, increase to invalidate cached geometry."""
+
+DEFAULT_GEOMETRY_CACHE_DIR = pathlib.Path(
+    os.environ.get(
+        "GEOMETRY_CACHE_DIR",
+        pathlib.Path.home() / ".cache" / "jupedsim_test_sandbox" / "geometry",
+    )
+)
+
+DEFAULT_MAX_ITERATIONS = 5000
+
+STAGE_TYPES = ("exit", "waypoint")
+
+# processed geometry of this process, by cache key
+_geometry_memo: Dict[str, "ScenarioGeometry"] = {}
+
+
+class ScenarioError(Exception):
+    """Class reflecting errors in scenario definitions."""
+
+    def __init__(self, message):
+        """Create ScenarioError with the given message.
+
+        Args:
+            message: Error message
+        """
+        super().__init__(message)
+        self.message = message
+
+
+@dataclasses.dataclass
+class ScenarioGeometry:
+    """Preprocessed geometry of a scenario."""
+
+    area: Polygon
+    walkable_area: pedpy.WalkableArea
+    exits: Dict[str, Polygon]
+    spawn_areas: List[Optional[Polygon]]
+
+
+@dataclasses.dataclass
+class Scenario:
+    """Validated scenario definition with its preprocessed geometry."""
+
+    name: str
+    definition: Dict[str, Any]
+    geometry: ScenarioGeometry
+
+    @property
+    def max_iterations(self) -> int:
+        return self.definition.get("max_iterations", DEFAULT_MAX_ITERATIONS)
+
+    def create_simulation(
+        self, trajectory_file: pathlib.Path, seed=None, writer_options=None
+    ):
+        """Creates the simulation of the scenario with all its agents.
+
+        Args:
+            trajectory_file: output file
+            seed: seed of the agent positions and desired speeds of all
+                groups (default: the seed of each group or of the scenario)
+            writer_options: output options, see
+                :func:`humanoid_writer.create_trajectory_writer`
+
+        Returns:
+            The simulation, ready to iterate
+        """
+        simulation = jps.Simulation(
+            model=jps.HumanoidModelV0(),
+            geometry=self.geometry.area,
+            trajectory_writer=create_trajectory_writer(trajectory_file, writer_options),
+        )
+
+        stage_ids = {}
+        for name, stage in self.definition["stages"].items():
+            if stage["type"] == "exit":
+                stage_ids[name] = simulation.add_exit_stage(
+                    self.geometry.exits[name].exterior.coords[:-1]
+                )
+            else:
+                stage_ids[name] = simulation.add_waypoint_stage(
+                    position=tuple(stage["position"]), distance=stage["distance"]
+                )
+
+        journey_ids = {}
+        for name, stages in self.definition["journeys"].items():
+            journey = jps.JourneyDescription([stage_ids[stage] for stage in stages])
+            for current, following in zip(stages, stages[1:]):
+                journey.set_transition_for_stage(
+                    stage_ids[current],
+                    jps.Transition.create_fixed_transition(stage_ids[following]),
+                )
+            journey_ids[name] = simulation.add_journey(journey)
+
+        for group, spawn_area in zip(
+            self.definition["agent_groups"], self.geometry.spawn_areas
+        ):
+            group_seed = seed
+            if group_seed is None:
+                group_seed = group.get("seed", self.definition.get("seed"))
+            positions = _group_positions(group, spawn_area, group_seed)
+
+            speed = group["desired_speed"]
+            if isinstance(speed, dict):
+                desired_speeds = np.random.default_rng(group_seed).normal(
+                    speed["mean"], speed.get("std", 0.0), len(positions)
+                )
+            else:
+                desired_speeds = np.full(len(positions), float(speed))
+
+            journey_name = group["journey"]
+            first_stage = stage_ids[self.definition["journeys"][journey_name][0]]
+            for position, desired_speed in zip(positions, desired_speeds):
+                simulation.add_agent(
+                    jps.HumanoidModelV0AgentParameters(
+                        journey_id=journey_ids[journey_name],
+                        stage_id=first_stage,
+                        position=tuple(position),
+                        desiredSpeed=desired_speed,
+                        height=group.get("height", 1.75),
+                    )
+                )
+        return simulation
+
+
+def load_scenario(
+    scenario_file: pathlib.Path, cache_dir: Optional[pathlib.Path] = None
+) -> Scenario:
+    """Loads and validates a scenario file.
+
+    Args:
+        scenario_file: scenario in the JSON format described in the module
+        cache_dir: directory of the processed geometry (default:
+            :data:`DEFAULT_GEOMETRY_CACHE_DIR`)
+
+    Returns:
+        The scenario with its (possibly cached) processed geometry
+    """
+    scenario_file = pathlib.Path(scenario_file)
+    try:
+        definition = json.loads(scenario_file.read_text())
+    except (OSError, ValueError) as error:
+        raise ScenarioError(f"Could not read {scenario_file}: {error}") from error
+
+    _validate_definition(definition, scenario_file)
+    return Scenario(
+        name=definition.get("name", scenario_file.stem),
+        definition=definition,
+        geometry=load_scenario_geometry(definition, cache_dir),
+    )
+
+
+def load_scenario_geometry(
+    definition: Dict[str, Any], cache_dir: Optional[pathlib.Path] = None
+) -> ScenarioGeometry:
+    """Processes the geometry of a scenario, reusing cached results.
+
+    Args:
+        definition: validated scenario definition
+        cache_dir: directory of the processed geometry (default:
+            :data:`DEFAULT_GEOMETRY_CACHE_DIR`)
+
+    Returns:
+        The processed geometry
+    """
+    content = _geometric_content(definition)
+    key = hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+    if key in _geometry_memo:
+        return _geometry_memo[key]
+
+    cache_file = pathlib.Path(cache_dir or DEFAULT_GEOMETRY_CACHE_DIR) / f"{key}.json"
+    try:
+        geometry = _read_geometry(cache_file)
+    except (OSError, ValueError, KeyError, shapely.errors.ShapelyError):
+        geometry = _process_geometry(content)
+        _write_geometry(cache_file, geometry)
+
+    _geometry_memo[key] = geometry
+    return geometry
+
+
+def _validate_definition(definition, scenario_file):
+    def fail(message):
+        raise ScenarioError(f"{scenario_file}: {message}")
+
+    for key in ["geometry", "stages", "journeys", "agent_groups"]:
+        if key not in definition:
+            fail(f"missing key {key!r}.")
+    if not definition["geometry"]:
+        fail("the geometry is empty.")
+
+    for name, stage in definition["stages"].items():
+        if stage.get("type") not in STAGE_TYPES:
+            fail(f"stage {name!r} has no type out of {STAGE_TYPES}.")
+        if stage["type"] == "exit" and "polygon" not in stage:
+            fail(f"exit {name!r} has no polygon.")
+        if stage["type"] == "waypoint" and not {"position", "distance"} <= set(stage):
+            fail(f"waypoint {name!r} needs a position and a distance.")
+
+    for name, stages in definition["journeys"].items():
+        if not stages:
+            fail(f"journey {name!r} has no stages.")
+        for stage in stages:
+            if stage not in definition["stages"]:
+                fail(f"journey {name!r} references unknown stage {stage!r}.")
+
+    for index, group in enumerate(definition["agent_groups"]):
+        if group.get("journey") not in definition["journeys"]:
+            fail(f"agent group {index} has no known journey.")
+        if ("positions" in group) == ("spawn_area" in group):
+            fail(f"agent group {index} needs either positions or a spawn_area.")
+        if "desired_speed" not in group:
+            fail(f"agent group {index} has no desired_speed.")
+
+
+def _geometric_content(definition):
+    # everything the processed geometry depends on, hashed as cache key
+    return {
+        "schema_version": SCENARIO_SCHEMA_VERSION,
+        "geometry": list(definition["geometry"]),
+        "exits": {
+            name: stage["polygon"]
+            for name, stage in definition["stages"].items()
+            if stage["type"] == "exit"
+        },
+        "waypoints": {
+            name: stage["position"]
+            for name, stage in definition["stages"].items()
+            if stage["type"] == "waypoint"
+        },
+        "spawn_areas": [
+            group.get("spawn_area") for group in definition["agent_groups"]
+        ],
+        "positions": [group.get("positions") for group in definition["agent_groups"]],
+    }
+
+
+def _process_geometry(content):
+    try:
+        area = shapely.union_all([wkt.loads(text) for text in content["geometry"]])
+        exits = {name: wkt.loads(text) for name, text in content["exits"].items()}
+        spawn_areas = [
+            wkt.loads(text) if text is not None else None
+            for text in content["spawn_areas"]
+        ]
+    except shapely.errors.ShapelyError as error:
+        raise ScenarioError(f"Invalid WKT: {error}") from error
+
+    if area.geom_type != "Polygon":
+        raise ScenarioError(
+            f"The geometry has to form a single polygon, not a {area.geom_type}."
+        )
+    for name, polygon in exits.items():
+        if not polygon.intersects(area):
+            raise ScenarioError(f"Exit {name!r} is outside of the geometry.")
+    for name, position in content["waypoints"].items():
+        if not area.covers(shapely.Point(position)):
+            raise ScenarioError(f"Waypoint {name!r} is outside of the geometry.")
+    for index, spawn_area in enumerate(spawn_areas):
+        if spawn_area is not None and not spawn_area.intersects(area):
+            raise ScenarioError(f"Spawn area {index} is outside of the geometry.")
+    for index, positions in enumerate(content["positions"]):
+        if positions is not None and not all(
+            area.covers(shapely.Point(position)) for position in positions
+        ):
+            raise ScenarioError(f"Agent group {index} has positions outside.")
+
+    return ScenarioGeometry(
+        area=area,
+        walkable_area=pedpy.WalkableArea(area),
+        exits=exits,
+        spawn_areas=spawn_areas,
+    )
+
+
+def _read_geometry(cache_file):
+    cached = json.loads(cache_file.read_text())
+    area = shapely.from_wkb(bytes.fromhex(cached["area"]))
+    return ScenarioGeometry(
+        area=area,
+        walkable_area=pedpy.WalkableArea(area),
+        exits={
+            name: shapely.from_wkb(bytes.fromhex(polygon))
+            for name, polygon in cached["exits"].items()
+        },
+        spawn_areas=[
+            shapely.from_wkb(bytes.fromhex(polygon)) if polygon is not None else None
+            for polygon in cached["spawn_areas"]
+        ],
+    )
+
+
+def _write_geometry(cache_file, geometry):
+    def to_hex(polygon):
+        return shapely.to_wkb(polygon, hex=True) if polygon is not None else None
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    # write into a temporary file first, so concurrent readers never see a
+    # partially written file
+    tmp = cache_file.with_name(f"{cache_file.name}.tmp-{os.getpid()}")
+    tmp.write_text(
+        json.dumps(
+            {
+                "area": to_hex(geometry.area),
+                "exits": {name: to_hex(p) for name, p in geometry.exits.items()},
+                "spawn_areas": [to_hex(p) for p in geometry.spawn_areas],
+            }
+        )
+    )
+    tmp.replace(cache_file)
+
+
+def _group_positions(group, spawn_area, seed):
+    if "positions" in group:
+        return [tuple(position) for position in group["positions"]]
+    if "number_of_agents" in group:
+        return distribute_by_number_cached(
+            polygon=spawn_area,
+            number_of_agents=group["number_of_agents"],
+            distance_to_agents=group.get("distance_to_agents", 0.6),
+            distance_to_polygon=group.get("distance_to_polygon", 0.15),
+            seed=seed,
+        )
+    return distribute_until_filled_cached(
+        polygon=spawn_area,
+        distance_to_agents=group.get("distance_to_agents", 0.6),
+        distance_to_polygon=group.get("distance_to_polygon", 0.15),
+        seed=seed,
+    )
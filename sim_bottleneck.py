@@ -1,71 +1,144 @@
 import pathlib
+import sys
 import jupedsim as jps
 import pedpy
 import numpy as np
-from numpy.random import normal  # normal distribution of free movement speed
 from shapely import Polygon, GeometryCollection
 
+from checkpoint import Checkpointer, resume_simulation
+from gait_observer import GaitStatisticsObserver
+from humanoid_writer import create_trajectory_writer
+from loop_profiler import LoopProfiler
+from spawn_cache import distribute_by_number_cached
+
 ## Setup geometries
 room1 = Polygon([(-10, -10), (10, -10), (10, 10), (-10, 10)])
 room2 = Polygon([(15, -5), (25, -5), (25, 5), (15, 5)])
-corridor = Polygon([(10, -2), (28, -1), (28, 1), (10, 2)])
 
-area = GeometryCollection(corridor.union(room1.union(room2)))
+
+def create_area(bottleneck_width=2.0):
+    """Rooms connected by a corridor narrowing down to bottleneck_width."""
+    corridor = Polygon(
+        [(10, -2), (28, -bottleneck_width / 2), (28, bottleneck_width / 2), (10, 2)]
+    )
+    return GeometryCollection(corridor.union(room1.union(room2)))
+
+
+area = create_area()
 walkable_area = pedpy.WalkableArea(area.geoms[0])
 # pedpy.plot_walkable_area(walkable_area=walkable_area).set_aspect("equal")
 
 ## Setup spawning area
 spawning_area = Polygon([(-8, -8), (8, -8), (8, 8), (-8, 8)])
-num_agents = 55
-pos_in_spawning_area = jps.distributions.distribute_by_number(
-    polygon=spawning_area,
-    number_of_agents=num_agents,
-    distance_to_agents=0.6,
-    distance_to_polygon=0.15,
-    seed=1,
-)
 exit_area = Polygon([(27, -2), (28, -2), (28, 2), (27, 2)])
 
+MAX_ITERATIONS = 5000
+CHECKPOINT_INTERVAL = 500
 
-## Setup Simulation
-trajectory_file = "bottleneck_HumanoidModelV0.sqlite"  # output file
-simulation = jps.Simulation(
-    model=jps.HumanoidModelV0(),
-    geometry=area,
-    trajectory_writer=jps.SqliteHumanoidTrajectoryWriter(
-        output_file=pathlib.Path(trajectory_file)
-    ),
-)
-
-exit_id = simulation.add_exit_stage(exit_area.exterior.coords[:-1])
-journey = jps.JourneyDescription([exit_id])
-journey_id = simulation.add_journey(journey)
-
-## Spawn agents
-# v_distribution = normal(1.34, 0.5, num_agents)
-v_distribution = normal(1.5, 0.2, num_agents)
-
-for pos, v0 in zip(pos_in_spawning_area, v_distribution):
-    agent_id = simulation.add_agent(
-        jps.HumanoidModelV0AgentParameters(
-            journey_id=journey_id,
-            stage_id=exit_id,
-            position=pos,
-            desiredSpeed=v0,
-            height=1.75,
-        )
+
+def setup_simulation(
+    trajectory_file="bottleneck_HumanoidModelV0.sqlite",
+    num_agents=55,
+    seed=1,
+    desired_speed_mean=1.5,
+    desired_speed_std=0.2,
+    bottleneck_width=2.0,
+    writer_options=None,
+):
+    """Creates the bottleneck simulation with its agents.
+
+    Args:
+        trajectory_file: output file
+        num_agents: number of agents placed in the spawning area
+        seed: seed of the agent positions and desired speeds
+        desired_speed_mean: mean of the normally distributed desired speeds
+        desired_speed_std: standard deviation of the desired speeds
+        bottleneck_width: width of the corridor at the exit
+        writer_options: output options, see
+            :func:`humanoid_writer.create_trajectory_writer`
+
+    Returns:
+        The simulation, ready to iterate
+    """
+    pos_in_spawning_area = distribute_by_number_cached(
+        polygon=spawning_area,
+        number_of_agents=num_agents,
+        distance_to_agents=0.6,
+        distance_to_polygon=0.15,
+        seed=seed,
+    )
+
+    ## Setup Simulation
+    simulation = jps.Simulation(
+        model=jps.HumanoidModelV0(),
+        geometry=create_area(bottleneck_width),
+        trajectory_writer=create_trajectory_writer(trajectory_file, writer_options),
+    )
+
+    exit_id = simulation.add_exit_stage(exit_area.exterior.coords[:-1])
+    journey = jps.JourneyDescription([exit_id])
+    journey_id = simulation.add_journey(journey)
+
+    ## Spawn agents
+    # v_distribution = normal(1.34, 0.5, num_agents)
+    v_distribution = np.random.default_rng(seed).normal(
+        desired_speed_mean, desired_speed_std, len(pos_in_spawning_area)
     )
 
-## run simulation
-while simulation.agent_count() > 0 and simulation.iteration_count() <= 5000:
+    for pos, v0 in zip(pos_in_spawning_area, v_distribution):
+        simulation.add_agent(
+            jps.HumanoidModelV0AgentParameters(
+                journey_id=journey_id,
+                stage_id=exit_id,
+                position=pos,
+                desiredSpeed=v0,
+                height=1.75,
+            )
+        )
+    return simulation
+
+
+if __name__ == "__main__":
+    trajectory_file = "bottleneck_HumanoidModelV0.sqlite"  # output file
+    checkpoint_file = pathlib.Path(trajectory_file).with_suffix(".checkpoint.npz")
+    # continue from the last checkpoint with: python sim_bottleneck.py --resume
+    if "--resume" in sys.argv[1:]:
+        checkpointer = resume_simulation(
+            checkpoint_file,
+            setup_simulation,
+            interval=CHECKPOINT_INTERVAL,
+            trajectory_file=trajectory_file,
+        )
+        simulation = checkpointer.simulation
+        print(f"Resumed from iteration {checkpointer.iteration()}.")
+    else:
+        simulation = setup_simulation(trajectory_file)
+        checkpointer = Checkpointer(
+            simulation, checkpoint_file, interval=CHECKPOINT_INTERVAL
+        )
+
+    ## run simulation
+    # running gait statistics, updated after each iteration
+    observer = GaitStatisticsObserver(simulation, bounds=area.bounds)
+    # wall time per iteration, split into the core step and the bookkeeping
+    profiler = LoopProfiler(simulation)
+
+    while simulation.agent_count() > 0 and checkpointer.iteration() <= MAX_ITERATIONS:
+
+        profiler.iterate()
+        observer()
+        checkpointer()
+        if checkpointer.iteration() == MAX_ITERATIONS:
+            print(f"Simulation stopped after {MAX_ITERATIONS} iterations.")
 
-    simulation.iterate()
-    if simulation.iteration_count() == 5000:
-        print("Simulation stopped after 5000 iterations.")
+    print(observer.summary().describe())
+    print(f"Mean speed: {observer.mean_speed:.2f} m/s (std {observer.speed_std:.2f})")
 
+    profiler.write(pathlib.Path(trajectory_file).stem)
+    print(profiler.summary())
 
-## Import Sqlite with PedPy
-# from sqlite_loader_moded_pepy_fun import *
+    ## Import Sqlite with PedPy
+    # from sqlite_loader_moded_pepy_fun import *
 
-# TrajectoryData = load_trajectory_from_jupedsim_sqlite(pathlib.Path(trajectory_file))
-# traj = TrajectoryData.data
+    # TrajectoryData = load_trajectory_from_jupedsim_sqlite(pathlib.Path(trajectory_file))
+    # traj = TrajectoryData.data
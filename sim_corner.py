@@ -1,10 +1,12 @@
-import pathlib
 import matplotlib.pyplot as plt
 import jupedsim as jps
 import pedpy
-from numpy.random import normal  # normal distribution of free movement speed
+import numpy as np
 from shapely import Polygon
 
+from humanoid_writer import create_trajectory_writer
+from spawn_cache import distribute_until_filled_cached
+
 ## Setup geometries
 area = Polygon([(0, 0), (15, 0), (15, 15), (10, 15), (10, 5), (0, 5)])
 walkable_area = pedpy.WalkableArea(area)
@@ -13,51 +15,83 @@ walkable_area = pedpy.WalkableArea(area)
 
 ## Setup spawning area
 spawning_area = Polygon([(0, 0), (6, 0), (6, 5), (0, 5)])
-pos_in_spawning_area = jps.distribute_until_filled(
-    polygon=spawning_area,
-    distance_to_agents=5,
-    distance_to_polygon=0.4,
-    seed=1,
-)
-num_agents = len(pos_in_spawning_area)
 exit_area = Polygon([(10, 14), (15, 14), (15, 15), (10, 15)])
 
+MAX_ITERATIONS = 3000
 
-## Setup Simulation
-trajectory_file = "corner_HumanoidModelV0.sqlite"  # output file
-simulation = jps.Simulation(
-    model=jps.HumanoidModelV0(),
-    geometry=area,
-    trajectory_writer=jps.SqliteHumanoidTrajectoryWriter(
-        output_file=pathlib.Path(trajectory_file)
-    ),
-)
-
-exit_id = simulation.add_exit_stage(exit_area.exterior.coords[:-1])
-journey = jps.JourneyDescription([exit_id])
-journey_id = simulation.add_journey(journey)
-
-## Spawn agents
-v_distribution = normal(1.5, 0.2, num_agents)
-# v_distribution = normal(5, 0.5, num_agents)
-
-for pos, v0 in zip(pos_in_spawning_area, v_distribution):
-    simulation.add_agent(
-        jps.HumanoidModelV0AgentParameters(
-            journey_id=journey_id,
-            stage_id=exit_id,
-            position=pos,
-            desiredSpeed=v0,
-            height=1.75,
-        )
+
+def setup_simulation(
+    trajectory_file="corner_HumanoidModelV0.sqlite",
+    seed=1,
+    distance_to_agents=5,
+    desired_speed_mean=1.5,
+    desired_speed_std=0.2,
+    writer_options=None,
+):
+    """Creates the corner simulation with its agents.
+
+    Args:
+        trajectory_file: output file
+        seed: seed of the agent positions and desired speeds
+        distance_to_agents: distance between the agents filling the spawning
+            area
+        desired_speed_mean: mean of the normally distributed desired speeds
+        desired_speed_std: standard deviation of the desired speeds
+        writer_options: output options, see
+            :func:`humanoid_writer.create_trajectory_writer`
+
+    Returns:
+        The simulation, ready to iterate
+    """
+    pos_in_spawning_area = distribute_until_filled_cached(
+        polygon=spawning_area,
+        distance_to_agents=distance_to_agents,
+        distance_to_polygon=0.4,
+        seed=seed,
     )
+    num_agents = len(pos_in_spawning_area)
+
+    ## Setup Simulation
+    simulation = jps.Simulation(
+        model=jps.HumanoidModelV0(),
+        geometry=area,
+        trajectory_writer=create_trajectory_writer(trajectory_file, writer_options),
+    )
+
+    exit_id = simulation.add_exit_stage(exit_area.exterior.coords[:-1])
+    journey = jps.JourneyDescription([exit_id])
+    journey_id = simulation.add_journey(journey)
+
+    ## Spawn agents
+    v_distribution = np.random.default_rng(seed).normal(
+        desired_speed_mean, desired_speed_std, num_agents
+    )
+    # v_distribution = normal(5, 0.5, num_agents)
+
+    for pos, v0 in zip(pos_in_spawning_area, v_distribution):
+        simulation.add_agent(
+            jps.HumanoidModelV0AgentParameters(
+                journey_id=journey_id,
+                stage_id=exit_id,
+                position=pos,
+                desiredSpeed=v0,
+                height=1.75,
+            )
+        )
+    return simulation
+
+
+if __name__ == "__main__":
+    simulation = setup_simulation("corner_HumanoidModelV0.sqlite")
 
-# figure, ax = plt.subplots(figsize=(10, 6))
-# pedpy.plot_walkable_area(walkable_area=walkable_area, axes=ax).set_aspect("equal")
-# # plt.show()
+    # figure, ax = plt.subplots(figsize=(10, 6))
+    # pedpy.plot_walkable_area(walkable_area=walkable_area, axes=ax).set_aspect("equal")
+    # # plt.show()
 
-## run simulation
-while simulation.agent_count() > 0 and simulation.iteration_count() <= 3000:
-    if simulation.iteration_count() == 3000:
-        print("Simulation stopped after 3000 iterations.")
-    simulation.iterate()
+    ## run simulation
+    while (
+        simulation.agent_count() > 0 and simulation.iteration_count() <= MAX_ITERATIONS
+    ):
+        if simulation.iteration_count() == MAX_ITERATIONS:
+            print(f"Simulation stopped after {MAX_ITERATIONS} iterations.")
+        simulation.iterate()
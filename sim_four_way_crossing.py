@@ -1,8 +1,10 @@
-import pathlib
 import jupedsim as jps
 import pedpy
+import numpy as np
 from shapely import Polygon
-from numpy.random import normal
+
+from humanoid_writer import create_trajectory_writer
+from loop_profiler import LoopProfiler
 
 ## Setup geometries
 area = Polygon([(-5, -5), (5, -5), (5, 5), (-5, 5)])
@@ -36,45 +38,76 @@ for i, pos in enumerate(starting_positions):
     )
     exit_area_list.append(exit_polygon)
 
+MAX_ITERATIONS = 3000
 
-## Setup Simulation
-trajectory_file = "four_way_crossing_HumanoidModelV0.sqlite"  # output file
-simulation = jps.Simulation(
-    model=jps.HumanoidModelV0(),
-    geometry=area,
-    trajectory_writer=jps.SqliteHumanoidTrajectoryWriter(
-        output_file=pathlib.Path(trajectory_file)
-    ),
-)
 
-journey_id_list = []
-exit_id_list = []
-for exit_area in exit_area_list:
-    exit_id = simulation.add_exit_stage(exit_area.exterior.coords[:-1])
-    journey = jps.JourneyDescription([exit_id])
-    exit_id_list.append(exit_id)
-    journey_id_list.append(simulation.add_journey(journey))
+def setup_simulation(
+    trajectory_file="four_way_crossing_HumanoidModelV0.sqlite",
+    seed=None,
+    desired_speed_mean=1.34,
+    desired_speed_std=0.5,
+    writer_options=None,
+):
+    """Creates the four way crossing simulation with one agent per corner.
 
+    Args:
+        trajectory_file: output file
+        seed: seed of the desired speeds
+        desired_speed_mean: mean of the normally distributed desired speeds
+        desired_speed_std: standard deviation of the desired speeds
+        writer_options: output options, see
+            :func:`humanoid_writer.create_trajectory_writer`
 
-## Spawn agents
-v_distribution = normal(1.34, 0.5, num_agents)
+    Returns:
+        The simulation, ready to iterate
+    """
+    ## Setup Simulation
+    simulation = jps.Simulation(
+        model=jps.HumanoidModelV0(),
+        geometry=area,
+        trajectory_writer=create_trajectory_writer(trajectory_file, writer_options),
+    )
 
+    journey_id_list = []
+    exit_id_list = []
+    for exit_area in exit_area_list:
+        exit_id = simulation.add_exit_stage(exit_area.exterior.coords[:-1])
+        journey = jps.JourneyDescription([exit_id])
+        exit_id_list.append(exit_id)
+        journey_id_list.append(simulation.add_journey(journey))
 
-for pos, v0, journey_id, exit_id in zip(
-    starting_positions, v_distribution, journey_id_list, exit_id_list
-):
-    simulation.add_agent(
-        jps.HumanoidModelV0AgentParameters(
-            journey_id=journey_id,
-            stage_id=exit_id,
-            position=pos,
-            desiredSpeed=v0,
-            height=1.75,
-        )
+    ## Spawn agents
+    v_distribution = np.random.default_rng(seed).normal(
+        desired_speed_mean, desired_speed_std, num_agents
     )
 
-while simulation.agent_count() > 0 and simulation.iteration_count() <= 3000:
-    if simulation.iteration_count() == 3000:
-        print("Simulation stopped after 3000 iterations.")
+    for pos, v0, journey_id, exit_id in zip(
+        starting_positions, v_distribution, journey_id_list, exit_id_list
+    ):
+        simulation.add_agent(
+            jps.HumanoidModelV0AgentParameters(
+                journey_id=journey_id,
+                stage_id=exit_id,
+                position=pos,
+                desiredSpeed=v0,
+                height=1.75,
+            )
+        )
+    return simulation
+
+
+if __name__ == "__main__":
+    simulation = setup_simulation("four_way_crossing_HumanoidModelV0.sqlite")
+    # wall time per iteration, split into the core step and the bookkeeping
+    profiler = LoopProfiler(simulation)
+
+    while (
+        simulation.agent_count() > 0 and simulation.iteration_count() <= MAX_ITERATIONS
+    ):
+        if simulation.iteration_count() == MAX_ITERATIONS:
+            print(f"Simulation stopped after {MAX_ITERATIONS} iterations.")
+
+        profiler.iterate()
 
-    simulation.iterate()
+    profiler.write("four_way_crossing_HumanoidModelV0")
+    print(profiler.summary())
@@ -0,0 +1,226 @@
+"""Persistent cache of the agent positions sampled by JuPedSim.
+
+:func:`distribute_by_number_cached` and :func:`distribute_until_filled_cached`
+take the same arguments as their JuPedSim counterparts. With a seed, the
+sampled positions are stored in the cache directory, keyed by the polygon,
+the arguments and the JuPedSim version, and repeated calls read them from
+disk instead of sampling again. Without a seed the sampling is random and
+nothing is cached.
+
+JuPedSim seeds the global NumPy random generator with the given seed, the
+state after the sampling is cached as well and restored on a hit, so random
+numbers drawn afterwards (e.g., desired speeds with ``numpy.random.normal``)
+are the same as without the cache. The least recently used entries are
+evicted once the cache exceeds its size limit.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import zipfile
+from typing import List, Optional, Tuple
+
+import jupedsim as jps
+import numpy as np
+import shapely
+
+SPAWN_CACHE_SCHEMA_VERSION = 1
+"""Version of the cache layout, increase to invalidate all existing entries."""
+
+DEFAULT_CACHE_DIR = pathlib.Path(
+    os.environ.get(
+        "SPAWN_CACHE_DIR",
+        pathlib.Path.home() / ".cache" / "jupedsim_test_sandbox" / "spawn_positions",
+    )
+)
+
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024**2
+
+
+def distribute_by_number_cached(
+    *,
+    polygon: shapely.Polygon,
+    number_of_agents: int,
+    distance_to_agents: float,
+    distance_to_polygon: float,
+    seed: Optional[int] = None,
+    max_iterations: int = 10000,
+    cache_dir: Optional[pathlib.Path] = None,
+    max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+) -> List[Tuple[float, float]]:
+    """Cached :func:`jupedsim.distributions.distribute_by_number`.
+
+    Args:
+        polygon: area of the positions
+        number_of_agents: number of positions
+        distance_to_agents: minimal distance between the positions
+        distance_to_polygon: minimal distance to the polygon boundary
+        seed: seed of the sampling, only seeded calls are cached
+        max_iterations: see JuPedSim
+        cache_dir: directory of the cache (default: :data:`DEFAULT_CACHE_DIR`)
+        max_cache_bytes: upper bound of the total size of the cache
+
+    Returns:
+        The sampled positions
+    """
+    return _cached(
+        jps.distributions.distribute_by_number,
+        cache_dir,
+        max_cache_bytes,
+        polygon=polygon,
+        number_of_agents=number_of_agents,
+        distance_to_agents=distance_to_agents,
+        distance_to_polygon=distance_to_polygon,
+        seed=seed,
+        max_iterations=max_iterations,
+    )
+
+
+def distribute_until_filled_cached(
+    *,
+    polygon: shapely.Polygon,
+    distance_to_agents: float,
+    distance_to_polygon: float,
+    seed: Optional[int] = None,
+    max_iterations: int = 10000,
+    k: int = 30,
+    cache_dir: Optional[pathlib.Path] = None,
+    max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+) -> List[Tuple[float, float]]:
+    """Cached :func:`jupedsim.distribute_until_filled`.
+
+    Args:
+        polygon: area of the positions
+        distance_to_agents: minimal distance between the positions
+        distance_to_polygon: minimal distance to the polygon boundary
+        seed: seed of the sampling, only seeded calls are cached
+        max_iterations: see JuPedSim
+        k: see JuPedSim
+        cache_dir: directory of the cache (default: :data:`DEFAULT_CACHE_DIR`)
+        max_cache_bytes: upper bound of the total size of the cache
+
+    Returns:
+        The sampled positions
+    """
+    return _cached(
+        jps.distribute_until_filled,
+        cache_dir,
+        max_cache_bytes,
+        polygon=polygon,
+        distance_to_agents=distance_to_agents,
+        distance_to_polygon=distance_to_polygon,
+        seed=seed,
+        max_iterations=max_iterations,
+        k=k,
+    )
+
+
+def evict_spawn_cache(
+    cache_dir: Optional[pathlib.Path] = None,
+    max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+    keep: Optional[pathlib.Path] = None,
+) -> List[pathlib.Path]:
+    """Removes the least recently used entries until the cache is small enough.
+
+    Args:
+        cache_dir: directory of the cache (default: :data:`DEFAULT_CACHE_DIR`)
+        max_cache_bytes: upper bound of the total size of the cache
+        keep: entry which is never evicted, e.g., the one just written
+
+    Returns:
+        The removed entries
+    """
+    entries = sorted(
+        _entries(pathlib.Path(cache_dir or DEFAULT_CACHE_DIR)),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    total = sum(entry.stat().st_size for entry in entries)
+
+    removed = []
+    for entry in entries:
+        if total <= max_cache_bytes:
+            break
+        if keep is not None and entry == keep:
+            continue
+        total -= entry.stat().st_size
+        entry.unlink(missing_ok=True)
+        removed.append(entry)
+    return removed
+
+
+def clear_spawn_cache(cache_dir: Optional[pathlib.Path] = None) -> None:
+    """Removes all entries from the cache.
+
+    Args:
+        cache_dir: directory of the cache (default: :data:`DEFAULT_CACHE_DIR`)
+    """
+    for entry in _entries(pathlib.Path(cache_dir or DEFAULT_CACHE_DIR)):
+        entry.unlink(missing_ok=True)
+
+
+def _cached(distribute, cache_dir, max_cache_bytes, polygon, seed, **kwargs):
+    if seed is None:
+        return distribute(polygon=polygon, seed=seed, **kwargs)
+
+    cache_dir = pathlib.Path(cache_dir or DEFAULT_CACHE_DIR)
+    entry = cache_dir / f"{_cache_key(distribute, polygon, seed, kwargs)}.npz"
+    try:
+        with np.load(entry) as cached:
+            positions = cached["positions"]
+            np.random.set_state(
+                (
+                    str(cached["rng_algorithm"]),
+                    cached["rng_keys"],
+                    int(cached["rng_pos"]),
+                    int(cached["rng_has_gauss"]),
+                    float(cached["rng_cached_gaussian"]),
+                )
+            )
+        # the modification time is the last access of the entry
+        os.utime(entry)
+        return [tuple(position) for position in positions.tolist()]
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        # missing, unreadable or corrupt entries are rewritten
+        pass
+
+    positions = distribute(polygon=polygon, seed=seed, **kwargs)
+    algorithm, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # write into a temporary file first, so concurrent readers never see a
+    # partially written entry
+    tmp = entry.with_name(f"{entry.stem}.tmp-{os.getpid()}.npz")
+    np.savez(
+        tmp,
+        positions=np.asarray(positions, dtype=float).reshape(-1, 2),
+        rng_algorithm=algorithm,
+        rng_keys=keys,
+        rng_pos=pos,
+        rng_has_gauss=has_gauss,
+        rng_cached_gaussian=cached_gaussian,
+    )
+    tmp.replace(entry)
+    evict_spawn_cache(cache_dir, max_cache_bytes, keep=entry)
+    return positions
+
+
+def _cache_key(distribute, polygon, seed, kwargs) -> str:
+    # the polygon is keyed by its WKB, WKT would be rounded
+    content = {
+        "schema_version": SPAWN_CACHE_SCHEMA_VERSION,
+        "jupedsim_version": jps.__version__,
+        "function": distribute.__name__,
+        "polygon": shapely.to_wkb(polygon, hex=True),
+        "seed": seed,
+        **kwargs,
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=float).encode()
+    ).hexdigest()[:32]
+
+
+def _entries(cache_dir: pathlib.Path) -> List[pathlib.Path]:
+    if not cache_dir.is_dir():
+        return []
+    return [entry for entry in cache_dir.glob("*.npz") if ".tmp-" not in entry.name]
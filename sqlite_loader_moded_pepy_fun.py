@@ -4,9 +4,11 @@ import math
 import pathlib
 import sqlite3
 from enum import Enum
-from typing import Any, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import h5py  # type: ignore
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
 import shapely
 
@@ -14,6 +16,65 @@ from pedpy.column_identifier import FRAME_COL, ID_COL, X_COL, Y_COL
 from pedpy.data.geometry import WalkableArea
 from pedpy.data.trajectory_data import TrajectoryData
 
+HUMANOID_COLUMNS = {
+    FRAME_COL: "frame",
+    ID_COL: "id",
+    X_COL: "pos_x",
+    Y_COL: "pos_y",
+    "head_pos_x": "head_pos_x",
+    "head_pos_y": "head_pos_y",
+    "head_pos_z": "head_pos_z",
+    "pelvis_pos_x": "pelvis_pos_x",
+    "pelvis_pos_y": "pelvis_pos_y",
+    "pelvis_pos_z": "pelvis_pos_z",
+    "shoulder_rotation_angle_z": "shoulder_rotation_angle_z",
+    "trunk_rotation_angle_x": "trunk_rotation_angle_x",
+    "trunk_rotation_angle_y": "trunk_rotation_angle_y",
+    "heel_right_pos_x": "heel_right_pos_x",
+    "heel_right_pos_y": "heel_right_pos_y",
+    "heel_right_pos_z": "heel_right_pos_z",
+    "heel_left_pos_x": "heel_left_pos_x",
+    "heel_left_pos_y": "heel_left_pos_y",
+    "heel_left_pos_z": "heel_left_pos_z",
+    "ori_x": "ori_x",
+    "ori_y": "ori_y",
+    "toe_right_pos_x": "toe_right_pos_x",
+    "toe_right_pos_y": "toe_right_pos_y",
+    "toe_right_pos_z": "toe_right_pos_z",
+    "toe_left_pos_x": "toe_left_pos_x",
+    "toe_left_pos_y": "toe_left_pos_y",
+    "toe_left_pos_z": "toe_left_pos_z",
+    "pelvis_rotation_angle_z": "pelvis_rotation_angle_z",
+}
+"""Columns of the humanoid trajectory data, mapped to their name in 'trajectory_data'."""
+
+DEFAULT_HUMANOID_COLUMNS = [
+    FRAME_COL,
+    ID_COL,
+    X_COL,
+    Y_COL,
+    "head_pos_x",
+    "head_pos_y",
+    "head_pos_z",
+    "pelvis_pos_x",
+    "pelvis_pos_y",
+    "pelvis_pos_z",
+    "shoulder_rotation_angle_z",
+    "trunk_rotation_angle_x",
+    "trunk_rotation_angle_y",
+    "heel_right_pos_x",
+    "heel_right_pos_y",
+    "heel_right_pos_z",
+    "heel_left_pos_x",
+    "heel_left_pos_y",
+    "heel_left_pos_z",
+]
+"""Columns loaded if no explicit selection is given."""
+
+_INTEGER_COLUMNS = (FRAME_COL, ID_COL)
+
+_FETCH_ROWS = 65536
+
 
 class LoadTrajectoryError(Exception):
     """Class reflecting errors when loading trajectories with PedPy."""
@@ -62,12 +123,8 @@ def load_trajectory_from_jupedsim_sqlite(
 
     with sqlite3.connect(trajectory_file) as con:
         try:
-            data = pd.read_sql_query(
-                "SELECT frame, id, pos_x as x, pos_y as y, head_pos_x, head_pos_y, head_pos_z, pelvis_pos_x, pelvis_pos_y, pelvis_pos_z, "
-                "shoulder_rotation_angle_z, trunk_rotation_angle_x, trunk_rotation_angle_y, heel_right_pos_x, heel_right_pos_y, "
-                "heel_right_pos_z, heel_left_pos_x, heel_left_pos_y, heel_left_pos_z FROM trajectory_data",
-                con,
-            )
+            query, params = _build_trajectory_query(DEFAULT_HUMANOID_COLUMNS)
+            data = pd.read_sql_query(query, con, params=params)
         except Exception as exc:
             raise LoadTrajectoryError(
                 "The given sqlite trajectory is not a valid JuPedSim format, it does not not "
@@ -101,6 +158,228 @@ def load_trajectory_from_jupedsim_sqlite(
     return TrajectoryData(data=data, frame_rate=fps)
 
 
+def load_trajectory_chunks_from_jupedsim_sqlite(
+    trajectory_file: pathlib.Path,
+    columns: Optional[Sequence[str]] = None,
+    frames_per_chunk: int = 1000,
+    frame_range: Optional[Tuple[int, int]] = None,
+    agent_ids: Optional[Iterable[int]] = None,
+) -> Iterator[pd.DataFrame]:
+    """Streams the trajectory data from the sqlite file in chunks of whole frames.
+
+    In contrast to :func:`load_trajectory_from_jupedsim_sqlite` the table is
+    never loaded at once, the memory used is bounded by the chunk size. The
+    column projection and the filters are evaluated by SQLite, rows which are
+    not requested are never transferred to Python.
+
+    Args:
+        trajectory_file: trajectory file in JuPedSim sqlite format
+        columns: columns to load, named as in :data:`HUMANOID_COLUMNS`
+            (default: :data:`DEFAULT_HUMANOID_COLUMNS`). The frame and id
+            columns are always included.
+        frames_per_chunk: number of consecutive frames per chunk
+        frame_range: first and last frame (both inclusive) to load
+        agent_ids: only load the rows of these agents
+
+    Returns:
+        Iterator over DataFrames, each containing all requested rows of the
+        frames [start, start + frames_per_chunk), ordered by frame
+    """
+    _validate_is_file(trajectory_file)
+    if frames_per_chunk < 1:
+        raise LoadTrajectoryError(
+            f"frames_per_chunk needs to be positive, got {frames_per_chunk}."
+        )
+
+    columns = _with_frame_and_id(columns)
+    query, params = _build_trajectory_query(
+        columns, frame_range=frame_range, agent_ids=agent_ids, order_by_frame=True
+    )
+
+    with sqlite3.connect(trajectory_file) as con:
+        try:
+            batches = pd.read_sql_query(
+                query, con, params=params, chunksize=_FETCH_ROWS
+            )
+        except Exception as exc:
+            raise LoadTrajectoryError(
+                "The given sqlite trajectory is not a valid JuPedSim format, it does not not "
+                "contain a 'trajectory_data' table. Please check your file."
+            ) from exc
+
+        pending = None
+        for batch in batches:
+            if pending is not None:
+                batch = pd.concat([pending, batch], ignore_index=True)
+            frames = batch[FRAME_COL].to_numpy()
+
+            # only emit chunks that are known to be complete, i.e., the
+            # first frame of the next chunk has already been read
+            while len(frames) > 0:
+                cut = frames.searchsorted(frames[0] + frames_per_chunk)
+                if cut == len(frames):
+                    break
+                yield batch.iloc[:cut].reset_index(drop=True)
+                batch = batch.iloc[cut:]
+                frames = frames[cut:]
+            pending = batch
+
+        if pending is not None and not pending.empty:
+            yield pending.reset_index(drop=True)
+
+
+def load_trajectory_arrays_from_jupedsim_sqlite(
+    trajectory_file: pathlib.Path,
+    columns: Optional[Sequence[str]] = None,
+    float_dtype: npt.DTypeLike = np.float64,
+    frame_range: Optional[Tuple[int, int]] = None,
+    agent_ids: Optional[Iterable[int]] = None,
+    int_dtype: npt.DTypeLike = np.int64,
+) -> Dict[str, np.ndarray]:
+    """Loads the trajectory data from the sqlite file as typed NumPy arrays.
+
+    The arrays are allocated once with the number of matching rows and filled
+    block-wise from the query, so no Python object per cell is kept alive and
+    the peak memory is the size of the resulting arrays plus one block.
+
+    Args:
+        trajectory_file: trajectory file in JuPedSim sqlite format
+        columns: columns to load, named as in :data:`HUMANOID_COLUMNS`
+            (default: :data:`DEFAULT_HUMANOID_COLUMNS`). The frame and id
+            columns are always included.
+        float_dtype: dtype of the position and angle columns, e.g.,
+            :code:`np.float32` to halve the memory
+        frame_range: first and last frame (both inclusive) to load
+        agent_ids: only load the rows of these agents
+        int_dtype: dtype of the frame and id columns, int64 like in the
+            DataFrames of the pandas loaders, e.g., :code:`np.int32` to halve
+            their memory
+
+    Returns:
+        Dict mapping each column to a one dimensional array, frame and id are
+        stored as int_dtype, all other columns as float_dtype (NULL cells as
+        NaN)
+    """
+    _validate_is_file(trajectory_file)
+
+    columns = _with_frame_and_id(columns)
+    if agent_ids is not None:
+        agent_ids = list(agent_ids)
+    query, params = _build_trajectory_query(
+        columns, frame_range=frame_range, agent_ids=agent_ids
+    )
+    where, count_params = _build_trajectory_filter(frame_range, agent_ids)
+
+    with sqlite3.connect(trajectory_file) as con:
+        try:
+            num_rows = con.execute(
+                f"SELECT COUNT(*) FROM trajectory_data{where}", count_params
+            ).fetchone()[0]
+        except Exception as exc:
+            raise LoadTrajectoryError(
+                "The given sqlite trajectory is not a valid JuPedSim format, it does not not "
+                "contain a 'trajectory_data' table. Please check your file."
+            ) from exc
+
+        row_dtype = np.dtype(
+            [
+                (column, int_dtype if column in _INTEGER_COLUMNS else float_dtype)
+                for column in columns
+            ]
+        )
+        data = {
+            column: np.empty(num_rows, dtype=row_dtype[column]) for column in columns
+        }
+
+        cursor = con.execute(query, params)
+        start = 0
+        while rows := cursor.fetchmany(_FETCH_ROWS):
+            stop = min(start + len(rows), num_rows)
+            block = _rows_to_block(rows[: stop - start], row_dtype)
+            for column in columns:
+                data[column][start:stop] = block[column]
+            start = stop
+
+    if start < num_rows:
+        data = {column: values[:start] for column, values in data.items()}
+
+    return data
+
+
+def _with_frame_and_id(columns: Optional[Sequence[str]]) -> List[str]:
+    if columns is None:
+        return list(DEFAULT_HUMANOID_COLUMNS)
+    return [FRAME_COL, ID_COL] + [
+        column for column in columns if column not in (FRAME_COL, ID_COL)
+    ]
+
+
+def _rows_to_block(rows: List[tuple], row_dtype: np.dtype) -> np.ndarray:
+    try:
+        return np.array(rows, dtype=row_dtype)
+    except TypeError:
+        pass
+
+    # NULL cells: NaN in the float columns, like in the pandas loaders
+    block = np.empty(len(rows), dtype=row_dtype)
+    for column, values in zip(row_dtype.names, zip(*rows)):
+        values = np.array(values, dtype=object)
+        if column in _INTEGER_COLUMNS and any(value is None for value in values):
+            raise LoadTrajectoryError(
+                f"The trajectory column {column!r} contains NULL values. "
+                "Please check your file."
+            )
+        block[column] = values.astype(row_dtype[column])
+    return block
+
+
+def _build_trajectory_query(
+    columns: Sequence[str],
+    frame_range: Optional[Tuple[int, int]] = None,
+    agent_ids: Optional[Iterable[int]] = None,
+    order_by_frame: bool = False,
+) -> Tuple[str, List[Any]]:
+    unknown = [column for column in columns if column not in HUMANOID_COLUMNS]
+    if unknown:
+        raise LoadTrajectoryError(
+            f"Unknown trajectory columns {unknown}. "
+            f"Supported are: {', '.join(HUMANOID_COLUMNS)}."
+        )
+
+    selection = ", ".join(
+        (
+            HUMANOID_COLUMNS[column]
+            if HUMANOID_COLUMNS[column] == column
+            else f"{HUMANOID_COLUMNS[column]} as {column}"
+        )
+        for column in columns
+    )
+    where, params = _build_trajectory_filter(frame_range, agent_ids)
+    query = f"SELECT {selection} FROM trajectory_data{where}"
+    if order_by_frame:
+        query += " ORDER BY frame"
+
+    return query, params
+
+
+def _build_trajectory_filter(
+    frame_range: Optional[Tuple[int, int]] = None,
+    agent_ids: Optional[Iterable[int]] = None,
+) -> Tuple[str, List[Any]]:
+    conditions = []
+    params: List[Any] = []
+    if frame_range is not None:
+        conditions.append("frame BETWEEN ? AND ?")
+        params.extend(int(frame) for frame in frame_range)
+    if agent_ids is not None:
+        agent_ids = [int(agent_id) for agent_id in agent_ids]
+        conditions.append(f"id IN ({', '.join('?' * len(agent_ids))})")
+        params.extend(agent_ids)
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
 def load_walkable_area_from_jupedsim_sqlite(
     trajectory_file: pathlib.Path,
 ) -> WalkableArea:
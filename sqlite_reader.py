@@ -25,34 +25,8 @@ def load_trajectory_to_dataframe(sqlite_file_path: str) -> pd.DataFrame:
         raise FileNotFoundError(f"File not found: {file_path}")
 
     try:
-        # Connect to the SQLite database
-        with sqlite3.connect(str(file_path)) as conn:
-            # Check if the 'trajectory_data' table exists
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='trajectory_data'"
-            )
-            if not cur.fetchone():
-                raise ValueError(
-                    "The SQLite file does not contain a 'trajectory_data' table."
-                )
-
-            # Query the trajectory data
-            query = """
-                SELECT 
-                    frame, id, 
-                    pos_x AS x, pos_y AS y,
-                    head_pos_x, head_pos_y, head_pos_z,
-                    pelvis_pos_x, pelvis_pos_y, pelvis_pos_z,
-                    shoulder_rotation_angle_z,
-                    trunk_rotation_angle_x, trunk_rotation_angle_y,
-                    heel_right_pos_x, heel_right_pos_y, heel_right_pos_z,
-                    heel_left_pos_x, heel_left_pos_y, heel_left_pos_z
-                FROM trajectory_data
-            """
-            df = pd.read_sql_query(query, conn)
-
-        return df
+        data = load_trajectory_arrays_from_jupedsim_sqlite(file_path)
+        return pd.DataFrame(data, copy=False)
 
     except sqlite3.Error as e:
         raise RuntimeError(f"SQLite error: {e}") from e
@@ -5,6 +5,8 @@ import pedpy
 from numpy.random import normal
 from shapely import Polygon
 
+from spawn_cache import distribute_by_number_cached
+
 
 area = Polygon([(0, 0), (12, 0), (12, 12), (10, 12), (10, 2), (0, 2)])
 walkable_area = pedpy.WalkableArea(area)
@@ -13,7 +15,7 @@ pedpy.plot_walkable_area(walkable_area=walkable_area).set_aspect("equal")
 
 spawning_area = Polygon([(0, 0), (6, 0), (6, 2), (0, 2)])
 num_agents = 20
-pos_in_spawning_area = jps.distributions.distribute_by_number(
+pos_in_spawning_area = distribute_by_number_cached(
     polygon=spawning_area,
     number_of_agents=num_agents,
     distance_to_agents=0.4,
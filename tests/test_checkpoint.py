@@ -0,0 +1,132 @@
+"""Resuming from a checkpoint appends the same frames as an uninterrupted run."""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+
+jps = pytest.importorskip("jupedsim")
+shapely = pytest.importorskip("shapely")
+
+from checkpoint import Checkpointer, resume_simulation  # noqa: E402
+from humanoid_writer import (  # noqa: E402
+    AppendingTrajectoryWriter,
+    HumanoidTrajectoryWriter,
+)
+
+WRITER_OPTIONS = {"columns": ["pos_x", "pos_y"], "every_nth_frame": 10}
+
+
+class GatedSimulation(jps.Simulation):
+    """Passes only every nth iteration to the writer, like some JuPedSim builds."""
+
+    def iterate(self, count: int = 1) -> None:
+        if self._writer and self.iteration_count() == 0:
+            self._writer.begin_writing(self)
+            self._writer.write_iteration_state(self)
+        for _ in range(count):
+            self._obj.iterate()
+            if (
+                self._writer
+                and self.iteration_count() % self._writer.every_nth_frame() == 0
+            ):
+                self._writer.write_iteration_state(self)
+
+
+def create_trajectory_writer(trajectory_file, writer_options):
+    # like humanoid_writer.create_trajectory_writer, with the JuPedSim writer
+    # of the model without a humanoid state
+    if writer_options is None:
+        return jps.SqliteTrajectoryWriter(
+            output_file=trajectory_file, every_nth_frame=10
+        )
+    writer_options = dict(writer_options)
+    if writer_options.pop("native", False):
+        return AppendingTrajectoryWriter(
+            output_file=trajectory_file,
+            writer_class=jps.SqliteTrajectoryWriter,
+            **writer_options,
+        )
+    return HumanoidTrajectoryWriter(output_file=trajectory_file, **writer_options)
+
+
+def setup_simulation(
+    trajectory_file, writer_options=None, simulation_class=jps.Simulation
+):
+    simulation = simulation_class(
+        model=jps.CollisionFreeSpeedModel(),
+        geometry=shapely.box(0, 0, 100, 20),
+        trajectory_writer=create_trajectory_writer(trajectory_file, writer_options),
+    )
+    exit_id = simulation.add_exit_stage(shapely.box(98, 0, 100, 20))
+    journey_id = simulation.add_journey(jps.JourneyDescription([exit_id]))
+    for index in range(20):
+        simulation.add_agent(
+            jps.CollisionFreeSpeedModelAgentParameters(
+                journey_id=journey_id,
+                stage_id=exit_id,
+                position=(1 + (index % 5), 2 + 3 * (index // 5)),
+                desired_speed=0.8 + 0.02 * index,
+            )
+        )
+    return simulation
+
+
+def read_trajectory(trajectory_file):
+    with sqlite3.connect(trajectory_file) as connection:
+        data = pd.read_sql_query(
+            "SELECT * FROM trajectory_data ORDER BY frame, id", connection
+        )
+    # agents are numbered per process, not per simulation
+    data["id"] -= data["id"].min()
+    return data
+
+
+def close_writer(simulation):
+    # the JuPedSim writer commits every frame
+    close = getattr(simulation._writer, "close", None)
+    if close is not None:
+        close()
+
+
+@pytest.mark.parametrize("writer_options", [WRITER_OPTIONS, None])
+@pytest.mark.parametrize("simulation_class", [jps.Simulation, GatedSimulation])
+def test_resume_with_decimated_frames(tmp_path, simulation_class, writer_options):
+    iterations, checkpoint_iteration = 800, 500
+
+    reference_file = tmp_path / "reference.sqlite"
+    simulation = setup_simulation(reference_file, writer_options, simulation_class)
+    while simulation.iteration_count() < iterations:
+        simulation.iterate()
+    close_writer(simulation)
+
+    trajectory_file = tmp_path / "resumed.sqlite"
+    checkpoint_file = tmp_path / "run.checkpoint.npz"
+    simulation = setup_simulation(trajectory_file, writer_options, simulation_class)
+    checkpointer = Checkpointer(
+        simulation, checkpoint_file, interval=checkpoint_iteration
+    )
+    # continue beyond the checkpoint, these frames are replaced on resume
+    while simulation.iteration_count() < checkpoint_iteration + 120:
+        simulation.iterate()
+        checkpointer()
+    close_writer(simulation)
+
+    checkpointer = resume_simulation(
+        checkpoint_file,
+        setup_simulation,
+        trajectory_file=trajectory_file,
+        writer_options=writer_options,
+        simulation_class=simulation_class,
+    )
+    assert checkpointer.iteration() == checkpoint_iteration
+    simulation = checkpointer.simulation
+    while checkpointer.iteration() < iterations:
+        simulation.iterate()
+    close_writer(simulation)
+
+    assert not list(tmp_path.glob("*.continuation.sqlite"))
+
+    resumed = read_trajectory(trajectory_file)
+    assert resumed["frame"].max() == iterations // 10
+    pd.testing.assert_frame_equal(resumed, read_trajectory(reference_file))
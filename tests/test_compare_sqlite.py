@@ -0,0 +1,104 @@
+"""The first divergence is found in outputs streamed in unaligned chunks."""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from build_quick_runners.compare_sqlite import _aligned_chunks, find_first_divergence
+from sqlite_loader_moded_pepy_fun import HUMANOID_COLUMNS
+
+COLUMNS = list(dict.fromkeys(HUMANOID_COLUMNS.values()))
+
+
+def trajectory(frames=10, agents=3):
+    frame, agent_id = (
+        values.ravel() for values in np.meshgrid(np.arange(frames), np.arange(agents))
+    )
+    data = pd.DataFrame({"frame": frame, "id": agent_id + 1})
+    for index, column in enumerate(COLUMNS[2:]):
+        data[column] = 0.1 * data["frame"] + data["id"] + index
+    return data.sort_values(["frame", "id"], ignore_index=True)
+
+
+def write(path, data):
+    with sqlite3.connect(path) as con:
+        data[COLUMNS].to_sql("trajectory_data", con, index=False)
+    return path
+
+
+@pytest.fixture
+def reference(tmp_path):
+    return write(tmp_path / "reference.sqlite", trajectory())
+
+
+def test_identical(tmp_path, reference):
+    actual = write(tmp_path / "actual.sqlite", trajectory())
+
+    assert find_first_divergence(actual, reference, frames_per_chunk=3) is None
+
+
+def test_first_divergence(tmp_path, reference):
+    data = trajectory()
+    for frame, agent_id, offset in [(7, 2, 0.5), (7, 3, 0.5), (9, 1, 1.0)]:
+        data.loc[(data["frame"] == frame) & (data["id"] == agent_id), "pos_x"] += offset
+    # within the absolute tolerance
+    data.loc[data["frame"] == 2, "pos_y"] += 1e-9
+    actual = write(tmp_path / "actual.sqlite", data)
+
+    divergence = find_first_divergence(actual, reference, frames_per_chunk=3)
+
+    assert (divergence.frame, divergence.id) == (7, 2)
+    assert divergence.columns == ["pos_x"]
+    assert divergence.errors["pos_x"] == pytest.approx(0.5)
+    assert divergence.missing_in is None
+    assert (
+        find_first_divergence(
+            actual, reference, tolerances={"pos_x": (1.0, 0.0)}, frames_per_chunk=3
+        )
+        is None
+    )
+
+
+def test_missing_rows(tmp_path, reference):
+    data = trajectory()
+    actual = write(tmp_path / "actual.sqlite", data.drop(index=[14]))
+    divergence = find_first_divergence(actual, reference, frames_per_chunk=4)
+    assert (divergence.frame, divergence.id) == (4, 3)
+    assert divergence.missing_in == "actual"
+
+    # frames after the end of the reference
+    longer = write(tmp_path / "longer.sqlite", trajectory(frames=12))
+    divergence = find_first_divergence(longer, reference, frames_per_chunk=4)
+    assert (divergence.frame, divergence.id) == (10, 1)
+    assert divergence.missing_in == "reference"
+
+
+def split(data, bounds):
+    # chunks of whole frames, starting at the given frames
+    starts = data["frame"].searchsorted(bounds)
+    stops = np.append(starts[1:], len(data))
+    return iter([data.iloc[start:stop] for start, stop in zip(starts, stops)])
+
+
+def test_aligned_chunks():
+    data = trajectory(frames=8)
+    actual = data[data["id"] != 2]
+    reference = data[data["frame"] < 6]
+
+    pairs = list(
+        _aligned_chunks(split(actual, [0, 3, 5]), split(reference, [0, 2, 3, 4]))
+    )
+
+    for actual_chunk, reference_chunk in pairs:
+        assert not (actual_chunk.empty and reference_chunk.empty)
+        if not (actual_chunk.empty or reference_chunk.empty):
+            assert set(actual_chunk["frame"]) == set(reference_chunk["frame"])
+    # every row exactly once, frames ascending
+    for side, expected in enumerate([actual, reference]):
+        chunks = pd.concat([pair[side] for pair in pairs])
+        pd.testing.assert_frame_equal(chunks, expected)
+    # frames 6 and 7 only in the actual output
+    assert pairs[-1][1].empty
+    assert set(pairs[-1][0]["frame"]) <= {6, 7}
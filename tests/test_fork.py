@@ -0,0 +1,75 @@
+"""The unperturbed branch of a fork reproduces an uninterrupted run."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+jps = pytest.importorskip("jupedsim")
+shapely = pytest.importorskip("shapely")
+
+import batch_runner  # noqa: E402
+from checkpoint import Checkpoint, CheckpointError  # noqa: E402
+from fork import Branch, perturb_state, run_fork  # noqa: E402
+from test_checkpoint import (  # noqa: E402
+    WRITER_OPTIONS,
+    GatedSimulation,
+    read_trajectory,
+    setup_simulation,
+)
+
+MAX_ITERATIONS = 800
+
+
+@pytest.mark.parametrize("simulation_class", [jps.Simulation, GatedSimulation])
+def test_branch_off_the_frame_interval(tmp_path, monkeypatch, simulation_class):
+    # the branch point is not a multiple of every_nth_frame
+    branch_iteration = 255
+
+    reference_file = tmp_path / "reference.sqlite"
+    simulation = setup_simulation(reference_file, WRITER_OPTIONS, simulation_class)
+    while simulation.iteration_count() <= MAX_ITERATIONS:
+        simulation.iterate()
+    simulation._writer.close()
+
+    monkeypatch.setitem(batch_runner.SCENARIOS, "fork_test", __name__)
+    summary = run_fork(
+        "fork_test",
+        [Branch("baseline")],
+        branch_iteration,
+        tmp_path / "fork",
+        params={"simulation_class": simulation_class},
+        processes=1,
+        writer_options=WRITER_OPTIONS,
+        progress=False,
+    )
+    assert "error" not in summary
+    assert summary.loc[0, "iterations"] == MAX_ITERATIONS + 1
+
+    branch = read_trajectory(summary.loc[0, "trajectory_file"])
+    assert branch["frame"].max() == MAX_ITERATIONS // 10
+    pd.testing.assert_frame_equal(branch, read_trajectory(reference_file))
+
+
+def test_perturb_state():
+    checkpoint = Checkpoint(
+        iteration=10,
+        delta_time=0.01,
+        agent_parameters="CollisionFreeSpeedModelAgentParameters",
+        reference_stage_id=1,
+        reference_journey_id=2,
+        agents={
+            "id": np.array([1, 2], dtype=np.int64),
+            "journey_id": np.array([2, 2], dtype=np.int64),
+            "stage_id": np.array([1, 1], dtype=np.int64),
+            "position": np.array([[0.0, 0.0], [1.0, 1.0]]),
+        },
+    )
+    perturb_state(checkpoint, "position", offset=(0.5, 0.0), agent_ids=[2])
+    np.testing.assert_array_equal(
+        checkpoint.agents["position"], [[0.0, 0.0], [1.5, 1.0]]
+    )
+
+    for key in ["id", "journey_id", "stage_id"]:
+        with pytest.raises(CheckpointError, match="identifier"):
+            perturb_state(checkpoint, key, offset=1)
+        assert checkpoint.agents[key].dtype == np.int64
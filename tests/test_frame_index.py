@@ -0,0 +1,75 @@
+"""Queries of the spatial frame index match a brute force search."""
+
+import numpy as np
+import pytest
+import shapely
+
+from frame_index import FrameIndex, SpatialFrameIndex, sort_by_frame
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(1)
+    frames = np.repeat(np.arange(5), 40)
+    x = rng.uniform(-3, 12, len(frames))
+    y = rng.uniform(0, 6, len(frames))
+    x[[3, 50, 51]] = np.nan
+    y[[7, 51]] = np.nan
+    # rows of a frame are not contiguous before sorting
+    order = rng.permutation(len(frames))
+    return {
+        "frame": frames[order],
+        "id": np.tile(np.arange(40), 5)[order],
+        "x": x[order],
+        "y": y[order],
+    }
+
+
+def test_frame_index():
+    index = FrameIndex(np.array([2, 2, 3, 5, 5, 5]))
+    assert len(index) == 3
+    assert (index.min_frame, index.max_frame) == (2, 5)
+    assert index.rows(5) == slice(3, 6)
+    assert index.rows(4) == slice(0, 0)
+    assert 3 in index and 4 not in index
+    assert len(FrameIndex(np.empty(0, dtype=int))) == 0
+
+
+def test_sort_by_frame(data):
+    ordered = sort_by_frame(data)
+    assert np.all(np.diff(ordered["frame"]) >= 0)
+    assert sort_by_frame(ordered) is ordered
+
+
+@pytest.mark.parametrize("cell_size", [0.4, 1.0, 5.0])
+def test_queries_match_brute_force(data, cell_size):
+    index = SpatialFrameIndex(data, cell_size=cell_size, max_cached_frames=2)
+    x, y, frames = index.data["x"], index.data["y"], index.data["frame"]
+    point, radius = (4.0, 3.0), 2.5
+    polygon = shapely.Polygon([(0, 0), (8, 1), (5, 5)])
+
+    for frame in range(6):
+        in_frame = frames == frame
+        distance = np.hypot(x - point[0], y - point[1])
+        expected = np.flatnonzero(in_frame & (distance <= radius))
+        np.testing.assert_array_equal(
+            index.query_radius(frame, point, radius), expected
+        )
+
+        expected = np.flatnonzero(in_frame & shapely.intersects_xy(polygon, x, y))
+        np.testing.assert_array_equal(index.query_polygon(frame, polygon), expected)
+
+        rows = np.flatnonzero(in_frame)
+        i, j = np.triu_indices(len(rows), k=1)
+        close = np.hypot(x[rows[i]] - x[rows[j]], y[rows[i]] - y[rows[j]]) <= 1.5
+        expected = {tuple(sorted(pair)) for pair in zip(rows[i][close], rows[j][close])}
+        first, second = index.neighbor_pairs(frame, 1.5)
+        assert {tuple(sorted(pair)) for pair in zip(first, second)} == expected
+        assert len(first) == len(expected)
+
+
+def test_only_nan_positions():
+    nan = np.full(3, np.nan)
+    index = SpatialFrameIndex({"frame": np.zeros(3, dtype=int), "x": nan, "y": nan})
+    assert len(index.query_radius(0, (0.0, 0.0), 10.0)) == 0
+    assert len(index.neighbor_pairs(0, 10.0)[0]) == 0
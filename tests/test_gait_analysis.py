@@ -0,0 +1,110 @@
+"""Gait metrics of synthetic trajectories with known speed and steps."""
+
+import numpy as np
+import pytest
+
+from gait_analysis import (
+    compute_pelvis_speed,
+    compute_steps,
+    detect_heel_strikes,
+    sort_by_agent,
+    summarize_gait,
+)
+
+FPS = 10
+FRAMES = 50
+
+
+def walk(agent_id, speed):
+    # both heels lift alternately, a heel strike every 0.5 s
+    frames = np.arange(FRAMES)
+    time = frames / FPS
+    x = speed * time
+    lift = np.sin(2 * np.pi * time)
+    return {
+        "frame": frames,
+        "id": np.full(FRAMES, agent_id),
+        "pelvis_pos_x": x,
+        "pelvis_pos_y": np.zeros(FRAMES),
+        "pelvis_pos_z": np.ones(FRAMES),
+        "heel_right_pos_x": x,
+        "heel_right_pos_y": np.full(FRAMES, -0.1),
+        "heel_right_pos_z": np.maximum(0.0, lift),
+        "heel_left_pos_x": x,
+        "heel_left_pos_y": np.full(FRAMES, 0.1),
+        "heel_left_pos_z": np.maximum(0.0, -lift),
+    }
+
+
+@pytest.fixture
+def data():
+    agents = [walk(1, 1.0), walk(2, 0.5)]
+    data = {
+        column: np.concatenate([agent[column] for agent in agents])
+        for column in agents[0]
+    }
+    # rows of an agent are not contiguous before sorting
+    order = np.random.default_rng(1).permutation(len(data["id"]))
+    return sort_by_agent({column: values[order] for column, values in data.items()})
+
+
+def test_compute_pelvis_speed(data):
+    speed = compute_pelvis_speed(data, FPS, window=4)
+
+    first_rows = [0, FRAMES]
+    assert np.isnan(speed["pelvis_speed"][first_rows]).all()
+    expected = np.repeat([1.0, 0.5], FRAMES)
+    np.testing.assert_allclose(
+        np.delete(speed["pelvis_speed"], first_rows), np.delete(expected, first_rows)
+    )
+    # the average never includes the other agent
+    np.testing.assert_allclose(speed["smoothed_pelvis_speed"], expected)
+
+
+def test_detect_heel_strikes(data):
+    strikes = detect_heel_strikes(data)
+
+    np.testing.assert_array_equal(strikes["id"], np.repeat([1, 2], 9))
+    np.testing.assert_array_equal(strikes["frame"], np.tile(np.arange(5, 50, 5), 2))
+    np.testing.assert_array_equal(
+        strikes["foot"], np.tile(["right", "left"] * 4 + ["right"], 2)
+    )
+    np.testing.assert_allclose(strikes["x"][:9], np.arange(5, 50, 5) / FPS)
+    np.testing.assert_allclose(strikes["y"][:2], [-0.1, 0.1])
+
+
+def test_compute_steps(data):
+    steps = compute_steps(detect_heel_strikes(data), FPS)
+
+    # no step from the last heel strike of one agent to the next agent
+    np.testing.assert_array_equal(steps["id"], np.repeat([1, 2], 8))
+    np.testing.assert_array_equal(steps["frame"], np.tile(np.arange(10, 50, 5), 2))
+    np.testing.assert_allclose(
+        steps["length"], np.repeat([np.hypot(0.5, 0.2), np.hypot(0.25, 0.2)], 8)
+    )
+    np.testing.assert_allclose(steps["duration"], 0.5)
+
+
+def test_summarize_gait(data):
+    summary = summarize_gait(data, FPS)
+
+    assert summary["id"].tolist() == [1, 2]
+    np.testing.assert_allclose(summary["mean_speed"], [1.0, 0.5])
+    assert summary["steps"].tolist() == [8, 8]
+    np.testing.assert_allclose(
+        summary["mean_step_length"], [np.hypot(0.5, 0.2), np.hypot(0.25, 0.2)]
+    )
+    np.testing.assert_allclose(summary["cadence"], 120)
+    # the heel is on the ground from the strike up to and including the
+    # frame before it lifts off
+    np.testing.assert_allclose(summary["mean_stance_duration"], 0.6)
+    np.testing.assert_allclose(summary["mean_swing_duration"], 0.4)
+
+
+def test_summarize_gait_without_rows(data):
+    empty = {column: values[:0] for column, values in data.items()}
+
+    summary = summarize_gait(empty, FPS)
+
+    assert summary.empty
+    assert "steps" in summary.columns
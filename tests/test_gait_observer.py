@@ -0,0 +1,74 @@
+"""Steps are counted by default for models providing heel positions."""
+
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("jupedsim")
+
+from gait_observer import GaitStatisticsObserver, humanoid_heel_heights  # noqa: E402
+
+
+class HumanoidState:
+    # both heels lift alternately, one step per half period
+    def __init__(self, phase):
+        self.phase = phase
+
+    right_heel_pos = property(lambda self: (0.0, 0.1, max(0.0, math.sin(self.phase))))
+    left_heel_pos = property(lambda self: (0.0, -0.1, max(0.0, -math.sin(self.phase))))
+
+
+class PointState:
+    def __init__(self, phase):
+        self.phase = phase
+
+    desired_speed = property(lambda self: 1.0)
+
+
+class Agent:
+    def __init__(self, agent_id, position, model):
+        self.id = agent_id
+        self.position = position
+        self.model = model
+
+
+class Simulation:
+    """Agent walking at 1 m/s with a step every 0.5 s."""
+
+    def __init__(self, state_class):
+        self.state_class = state_class
+        self.time = 0.0
+
+    def agents(self):
+        model = self.state_class(2 * math.pi * self.time)
+        return [Agent(1, (self.time, 0.0), model)]
+
+    def elapsed_time(self):
+        return self.time
+
+
+def observe(simulation, seconds=5.0, delta_time=0.01, **observer_args):
+    observer = GaitStatisticsObserver(simulation, **observer_args)
+    for iteration in range(round(seconds / delta_time) + 1):
+        simulation.time = iteration * delta_time
+        observer()
+    return observer
+
+
+def test_steps_of_humanoid_model():
+    observer = observe(Simulation(HumanoidState))
+    assert observer.heel_heights is humanoid_heel_heights
+    summary = observer.summary()
+    assert summary.loc[0, "steps"] == 10
+    assert summary.loc[0, "mean_speed"] == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize(
+    "state_class, observer_args",
+    [(PointState, {}), (HumanoidState, {"heel_heights": None})],
+)
+def test_no_steps(state_class, observer_args):
+    summary = observe(Simulation(state_class), **observer_args).summary()
+    assert np.isnan(summary.loc[0, "steps"])
+    assert summary.loc[0, "distance"] == pytest.approx(5.0)
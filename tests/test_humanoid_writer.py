@@ -0,0 +1,60 @@
+"""Model attributes of the trajectory columns are looked up in the model state."""
+
+import pytest
+
+jps = pytest.importorskip("jupedsim")
+shapely = pytest.importorskip("shapely")
+
+from humanoid_writer import (  # noqa: E402
+    HumanoidTrajectoryWriter,
+    resolve_model_attribute,
+)
+
+
+class ModelState:
+    right_heel_pos = property(lambda self: (0.1, 0.2, 0.0))
+    heel_left_position = property(lambda self: (0.1, -0.2, 0.05))
+    head_position = property(lambda self: (0.0, 0.0, 1.7))
+    head_velocity = property(lambda self: (1.0, 0.0, 0.0))
+    PelvisRotationAngleZ = property(lambda self: 0.3)
+    Xcom = property(lambda self: (0.5, 0.0))
+
+
+@pytest.mark.parametrize(
+    "attribute, components, expected",
+    [
+        ("heel_left_position", 3, "heel_left_position"),
+        ("heel_right_position", 3, "right_heel_pos"),
+        ("head_position", 3, "head_position"),
+        ("pelvis_rotation_angle_z", None, "PelvisRotationAngleZ"),
+    ],
+)
+def test_resolve_model_attribute(attribute, components, expected):
+    assert resolve_model_attribute(ModelState(), attribute, components) == expected
+
+
+@pytest.mark.parametrize(
+    "attribute, components", [("toe_left_position", 3), ("Xcom", 3)]
+)
+def test_resolve_missing_model_attribute(attribute, components):
+    with pytest.raises(AttributeError, match=attribute):
+        resolve_model_attribute(ModelState(), attribute, components)
+
+
+def test_missing_columns_fail_before_writing(tmp_path):
+    trajectory_file = tmp_path / "trajectory.sqlite"
+    simulation = jps.Simulation(
+        model=jps.CollisionFreeSpeedModel(),
+        geometry=shapely.box(0, 0, 10, 10),
+        trajectory_writer=HumanoidTrajectoryWriter(output_file=trajectory_file),
+    )
+    exit_id = simulation.add_exit_stage(shapely.box(9, 0, 10, 10))
+    journey_id = simulation.add_journey(jps.JourneyDescription([exit_id]))
+    simulation.add_agent(
+        jps.CollisionFreeSpeedModelAgentParameters(
+            journey_id=journey_id, stage_id=exit_id, position=(1, 1)
+        )
+    )
+    with pytest.raises(jps.TrajectoryWriter.Exception, match="head_position"):
+        simulation.iterate()
+    assert not trajectory_file.exists()
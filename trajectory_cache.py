@@ -0,0 +1,221 @@
+"""Persistent cache of trajectory arrays converted from JuPedSim sqlite files.
+
+Each cached trajectory is a directory with one ``.npy`` file per column and a
+``meta.json`` describing the source file. The directory name is derived from
+the path, modification time and size of the sqlite file, the requested columns
+and dtype and :data:`CACHE_SCHEMA_VERSION`, so a changed output file is never
+served from a stale entry. The columns are returned as read-only memory maps,
+loading a cached trajectory therefore only reads the pages actually accessed.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from sqlite_loader_moded_pepy_fun import (
+    _validate_is_file,
+    _with_frame_and_id,
+    load_trajectory_arrays_from_jupedsim_sqlite,
+)
+
+CACHE_SCHEMA_VERSION = 2
+"""Version of the cache layout, increase to invalidate all existing entries."""
+
+DEFAULT_CACHE_DIR = pathlib.Path(
+    os.environ.get(
+        "TRAJECTORY_CACHE_DIR",
+        pathlib.Path.home() / ".cache" / "jupedsim_test_sandbox" / "trajectories",
+    )
+)
+
+DEFAULT_MAX_CACHE_BYTES = 10 * 1024**3
+
+_META_FILE = "meta.json"
+
+
+def load_trajectory_arrays_cached(
+    trajectory_file: pathlib.Path,
+    columns: Optional[Sequence[str]] = None,
+    float_dtype: npt.DTypeLike = np.float64,
+    cache_dir: Optional[pathlib.Path] = None,
+    max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+) -> Dict[str, np.ndarray]:
+    """Loads the trajectory arrays of the sqlite file, converting it only once.
+
+    On a cache miss the file is loaded with
+    :func:`~sqlite_loader_moded_pepy_fun.load_trajectory_arrays_from_jupedsim_sqlite`
+    and stored in the cache, entries of older versions of the same file are
+    removed and the least recently used entries are evicted until the cache
+    fits into max_cache_bytes.
+
+    Args:
+        trajectory_file: trajectory file in JuPedSim sqlite format
+        columns: columns to load, named as in
+            :data:`~sqlite_loader_moded_pepy_fun.HUMANOID_COLUMNS` (default:
+            :data:`~sqlite_loader_moded_pepy_fun.DEFAULT_HUMANOID_COLUMNS`)
+        float_dtype: dtype of the position and angle columns
+        cache_dir: directory of the cache (default: :data:`DEFAULT_CACHE_DIR`)
+        max_cache_bytes: upper bound of the total size of the cache
+
+    Returns:
+        Dict mapping each column to a read-only, memory mapped array (a
+        read-only array in memory if another process evicts the new entry
+        right away)
+    """
+    _validate_is_file(trajectory_file)
+    cache_dir = pathlib.Path(cache_dir or DEFAULT_CACHE_DIR)
+    columns = _with_frame_and_id(columns)
+    float_dtype = np.dtype(float_dtype)
+
+    meta = _source_meta(trajectory_file, columns, float_dtype)
+    entry = cache_dir / _cache_key(meta)
+
+    try:
+        return _read_entry(entry, columns)
+    except (OSError, ValueError):
+        # missing entries, e.g., evicted by another process meanwhile, and
+        # unreadable ones are rewritten
+        pass
+
+    _invalidate_outdated(cache_dir, meta)
+    data = load_trajectory_arrays_from_jupedsim_sqlite(
+        trajectory_file, columns=columns, float_dtype=float_dtype
+    )
+    _write_entry(entry, meta, data)
+    evict_trajectory_cache(cache_dir, max_cache_bytes, keep=entry)
+
+    try:
+        return _read_entry(entry, columns)
+    except (OSError, ValueError):
+        # evicted by another process right away, the arrays just loaded are
+        # returned instead
+        for values in data.values():
+            values.flags.writeable = False
+        return data
+
+
+def evict_trajectory_cache(
+    cache_dir: Optional[pathlib.Path] = None,
+    max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+    keep: Optional[pathlib.Path] = None,
+) -> List[pathlib.Path]:
+    """Removes the least recently used entries until the cache is small enough.
+
+    Args:
+        cache_dir: directory of the cache (default: :data:`DEFAULT_CACHE_DIR`)
+        max_cache_bytes: upper bound of the total size of the cache
+        keep: entry which is never evicted, e.g., the one just written
+
+    Returns:
+        The removed entries
+    """
+    cache_dir = pathlib.Path(cache_dir or DEFAULT_CACHE_DIR)
+    entries = []
+    for entry in _entries(cache_dir):
+        try:
+            last_access = (entry / _META_FILE).stat().st_mtime
+            entries.append((last_access, _entry_size(entry), entry))
+        except OSError:
+            # removed by another process meanwhile
+            continue
+    entries.sort(key=lambda item: item[0])
+    total = sum(size for _, size, _ in entries)
+
+    removed = []
+    for _, size, entry in entries:
+        if total <= max_cache_bytes:
+            break
+        if keep is not None and entry == keep:
+            continue
+        total -= size
+        shutil.rmtree(entry, ignore_errors=True)
+        removed.append(entry)
+    return removed
+
+
+def clear_trajectory_cache(cache_dir: Optional[pathlib.Path] = None) -> None:
+    """Removes all entries from the cache.
+
+    Args:
+        cache_dir: directory of the cache (default: :data:`DEFAULT_CACHE_DIR`)
+    """
+    for entry in _entries(pathlib.Path(cache_dir or DEFAULT_CACHE_DIR)):
+        shutil.rmtree(entry, ignore_errors=True)
+
+
+def _source_meta(
+    trajectory_file: pathlib.Path, columns: Sequence[str], float_dtype: np.dtype
+) -> dict:
+    stat = trajectory_file.stat()
+    return {
+        "schema_version": CACHE_SCHEMA_VERSION,
+        "source": str(trajectory_file.resolve()),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "columns": list(columns),
+        "float_dtype": float_dtype.str,
+    }
+
+
+def _cache_key(meta: dict) -> str:
+    return hashlib.sha256(json.dumps(meta, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def _read_entry(entry: pathlib.Path, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    # the modification time of the meta file is the last access of the entry
+    os.utime(entry / _META_FILE)
+    return {
+        column: np.load(entry / f"{column}.npy", mmap_mode="r") for column in columns
+    }
+
+
+def _write_entry(entry: pathlib.Path, meta: dict, data: Dict[str, np.ndarray]) -> None:
+    # write into a temporary directory first, so concurrent readers never see
+    # a partially written entry
+    tmp = entry.with_name(f"{entry.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for column, values in data.items():
+        np.save(tmp / f"{column}.npy", values)
+    (tmp / _META_FILE).write_text(json.dumps(dict(meta, created=time.time()), indent=2))
+
+    try:
+        tmp.rename(entry)
+    except OSError:
+        # another process has written the same entry in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _invalidate_outdated(cache_dir: pathlib.Path, meta: dict) -> None:
+    # removes the entries converted from an older version of the same file
+    fingerprint = ("schema_version", "mtime_ns", "size")
+    for entry in _entries(cache_dir):
+        try:
+            cached = json.loads((entry / _META_FILE).read_text())
+        except (OSError, ValueError):
+            continue
+        if cached.get("source") == meta["source"] and any(
+            cached.get(key) != meta[key] for key in fingerprint
+        ):
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def _entries(cache_dir: pathlib.Path) -> List[pathlib.Path]:
+    if not cache_dir.is_dir():
+        return []
+    return [
+        entry
+        for entry in cache_dir.iterdir()
+        if entry.is_dir() and (entry / _META_FILE).is_file()
+    ]
+
+
+def _entry_size(entry: pathlib.Path) -> int:
+    return sum(file.stat().st_size for file in entry.iterdir() if file.is_file())
@@ -1,13 +1,285 @@
+"""3D visualisation of humanoid trajectories stored in JuPedSim sqlite files.
+
+Usage::
+
+    python visualisator_HPP.py <simulation_file> [<video_file>] [options]
+
+Without a video file the trajectory is shown interactively, otherwise it is
+rendered headless into the video. See ``--help`` for the options, e.g.,
+``--preset experiments`` for the view used for the comparison with
+experiments and ``--benchmark`` to measure the rendering speed.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import dataclasses
+import os
+import pathlib
 import sqlite3
+import subprocess
+import time
+from typing import Dict, List, Optional, Tuple
+
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.widgets import Slider, Button
 import matplotlib.animation as animation
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
 from shapely import wkt
-import sys
+
+from frame_index import FrameIndex, sort_by_frame
+from humanoid_skeleton import SKELETON_COLORS, compute_skeleton_segments
+from sqlite_loader_moded_pepy_fun import load_trajectory_arrays_from_jupedsim_sqlite
+from trajectory_cache import load_trajectory_arrays_cached
+
+VISUALISATOR_COLUMNS = [
+    "x",
+    "y",
+    "ori_x",
+    "ori_y",
+    "pelvis_pos_x",
+    "pelvis_pos_y",
+    "pelvis_pos_z",
+    "heel_right_pos_x",
+    "heel_right_pos_y",
+    "heel_right_pos_z",
+    "heel_left_pos_x",
+    "heel_left_pos_y",
+    "heel_left_pos_z",
+    "toe_right_pos_x",
+    "toe_right_pos_y",
+    "toe_right_pos_z",
+    "toe_left_pos_x",
+    "toe_left_pos_y",
+    "toe_left_pos_z",
+    "pelvis_rotation_angle_z",
+    "shoulder_rotation_angle_z",
+    "trunk_rotation_angle_x",
+    "trunk_rotation_angle_y",
+]
+
+
+def draw_geometries(ax, geometries):
+    """Draws the geometries once on the ground of the (static) scene."""
+    for geom in geometries:
+        if geom.geom_type == "Polygon":
+            x, y = geom.exterior.xy
+            z = np.zeros_like(x)
+            ax.plot(x, y, z, color="blue", alpha=0.6, linewidth=1, zorder=1)
+            for interior in geom.interiors:
+                x, y = interior.xy
+                ax.plot(x, y, color="black", alpha=0.6, linewidth=1, zorder=1)
+
+
+def create_agent_artists(ax, animated=False):
+    """Creates the (initially empty) artists drawing the agents of a frame.
+
+    The artists are created once and only their data is replaced per frame,
+    see :func:`update_agent_artists`.
+    """
+    artists = {
+        name: Line3DCollection([], colors=SKELETON_COLORS[name])
+        for name in ["right_foot", "left_foot", "body"]
+    }
+    artists["collision_circle"] = Line3DCollection(
+        [], colors=SKELETON_COLORS["collision_circle"], linestyles="--", linewidths=1
+    )
+    for collection in artists.values():
+        ax.add_collection3d(collection, autolim=False)
+    (artists["head"],) = ax.plot(
+        [], [], [], "o", color=SKELETON_COLORS["head"], markersize=2
+    )
+
+    for artist in artists.values():
+        artist.set_animated(animated)
+    return artists
+
+
+def update_agent_artists(artists, agent_data):
+    """Replaces the data of the agent artists with the agents of one frame."""
+    skeleton = compute_skeleton_segments(agent_data)
+    for name, artist in artists.items():
+        if name == "head":
+            artist.set_data_3d(*skeleton[name].T)
+        else:
+            artist.set_segments(skeleton[name])
+
+
+@dataclasses.dataclass
+class TrajectoryFrames:
+    """Frame indexed trajectory of a simulation together with its scene."""
+
+    source: pathlib.Path
+    geometries: List
+    bounds: Tuple[float, float, float, float]
+    data: Dict[str, np.ndarray]
+    index: FrameIndex
+
+    @property
+    def min_frame(self) -> int:
+        return self.index.min_frame
+
+    @property
+    def max_frame(self) -> int:
+        return self.index.max_frame
+
+    def frame(self, frame: int) -> Dict[str, np.ndarray]:
+        """Columns of all agents in the given frame."""
+        rows = self.index.rows(frame)
+        return {column: values[rows] for column, values in self.data.items()}
+
+    def close(self):
+        """Nothing to release, like :meth:`LazyTrajectoryFrames.close`."""
+
+
+@dataclasses.dataclass
+class RenderOptions:
+    """How the trajectory is rendered, see :func:`render`.
+
+    Without an output_file the trajectory is shown interactively, otherwise
+    it is exported headless into the video file.
+    """
+
+    elev: float = 30
+    azim: float = 60
+    roll: float = 0
+    show_axis_labels: bool = False
+    show_tick_labels: bool = False
+    """Tick labels of the x and y axis."""
+    show_z_tick_labels: bool = False
+    show_title: bool = False
+    blit: bool = True
+    output_file: Optional[pathlib.Path] = None
+    processes: Optional[int] = None
+    frame_stride: int = 1
+    resolution: Tuple[int, int] = (1000, 800)
+    dpi: int = 100
+    fps: int = 30
+    frames_per_task: int = 25
+
+
+PRESETS = {
+    "default": RenderOptions(),
+    # view used for the comparison with experiments, without z tick labels
+    "experiments": RenderOptions(
+        elev=45,
+        azim=45,
+        show_axis_labels=True,
+        show_tick_labels=True,
+        show_z_tick_labels=False,
+        show_title=True,
+    ),
+}
+
+
+class LazyTrajectoryFrames:
+    """Trajectory of a simulation which is only loaded around the shown frames.
+
+    The trajectory is queried in blocks of consecutive frames (using the
+    frame index of the trajectory table). The most recently used blocks are
+    kept in memory and the blocks following the last accessed frame are
+    prefetched by a background thread, so opening a huge file only loads the
+    first block.
+    """
+
+    def __init__(
+        self,
+        source: pathlib.Path,
+        geometries: List,
+        bounds: Tuple[float, float, float, float],
+        frames_per_block: int = 50,
+        max_blocks: int = 8,
+        prefetch_blocks: int = 2,
+    ):
+        """Create the lazy trajectory of the given file.
+
+        Args:
+            source: trajectory file in JuPedSim sqlite format
+            geometries: geometries of the scene
+            bounds: bounding box of the scene (xmin, xmax, ymin, ymax)
+            frames_per_block: number of frames queried at once
+            max_blocks: number of blocks kept in memory
+            prefetch_blocks: number of blocks prefetched after the accessed one
+        """
+        self.source = pathlib.Path(source)
+        self.geometries = geometries
+        self.bounds = bounds
+        self.frames_per_block = frames_per_block
+        self.max_blocks = max(max_blocks, prefetch_blocks + 1)
+        self.prefetch_blocks = prefetch_blocks
+
+        with sqlite3.connect(self.source) as conn:
+            self._min_frame, self._max_frame = conn.execute(
+                "SELECT MIN(frame), MAX(frame) FROM trajectory_data"
+            ).fetchone()
+
+        # block number -> future of (data, index), in order of last access
+        self._blocks = collections.OrderedDict()
+        self._prefetcher = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def min_frame(self) -> int:
+        return self._min_frame
+
+    @property
+    def max_frame(self) -> int:
+        return self._max_frame
+
+    def frame(self, frame: int) -> Dict[str, np.ndarray]:
+        """Columns of all agents in the given frame."""
+        block = (frame - self._min_frame) // self.frames_per_block
+        future = self._blocks.get(block)
+        # a block whose prefetch has not started yet is not waited for behind
+        # the other queued prefetches, but loaded right away
+        if future is None or future.cancelled() or future.cancel():
+            future = concurrent.futures.Future()
+            future.set_result(self._load_block(block))
+            self._blocks[block] = future
+        self._blocks.move_to_end(block)
+        data, index = future.result()
+
+        self._prefetch(block)
+        rows = index.rows(frame)
+        return {column: values[rows] for column, values in data.items()}
+
+    def close(self):
+        """Stops the prefetching and frees the loaded blocks."""
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+        self._blocks.clear()
+
+    def _prefetch(self, block):
+        last_block = (self._max_frame - self._min_frame) // self.frames_per_block
+        for next_block in range(block + 1, block + 1 + self.prefetch_blocks):
+            next_block = next_block % (last_block + 1)  # playback wraps around
+            if next_block not in self._blocks:
+                self._blocks[next_block] = self._prefetcher.submit(
+                    self._load_block, next_block
+                )
+
+        while len(self._blocks) > self.max_blocks:
+            _, future = self._blocks.popitem(last=False)
+            future.cancel()
+
+    def _load_block(self, block):
+        first_frame = self._min_frame + block * self.frames_per_block
+        data = sort_by_frame(
+            load_trajectory_arrays_from_jupedsim_sqlite(
+                self.source,
+                columns=VISUALISATOR_COLUMNS,
+                frame_range=(first_frame, first_frame + self.frames_per_block - 1),
+                int_dtype=np.int32,
+            )
+        )
+        return data, FrameIndex(data["frame"])
 
 
-def create_visualisator(simulation_file_name, saving_file_name=""):
+def load_scene(simulation_file_name):
+    """Loads the geometries and the bounding box (xmin, xmax, ymin, ymax)."""
     conn = sqlite3.connect(simulation_file_name)
     cursor = conn.cursor()
 
@@ -17,205 +289,136 @@ def create_visualisator(simulation_file_name, saving_file_name=""):
 
     geometries = [wkt.loads(r[0]) for r in rows]
 
-    # Get the frame data
-    cursor.execute("SELECT * FROM trajectory_data ORDER BY frame")
-    frame_data = cursor.fetchall()
-
     # Get bounding box
     def get_meta(key):
         cursor.execute("SELECT value FROM metadata WHERE key = ?", (key,))
         return float(cursor.fetchone()[0])
 
-    xmin = get_meta("xmin")
-    xmax = get_meta("xmax")
-    ymin = get_meta("ymin")
-    ymax = get_meta("ymax")
+    bounds = (get_meta("xmin"), get_meta("xmax"), get_meta("ymin"), get_meta("ymax"))
+    conn.close()
 
-    # Anthropometric constants
-    height = 1.75
-    trunk_length = height * 0.3495
-    shoulder_width = height * 0.45 / 1.7
-    neck_length = height * 0.1396
+    return geometries, bounds
 
-    max_frame = max(frame_data, key=lambda x: x[0])[0]
 
-    # Figure + axes
-    fig = plt.figure(figsize=(10, 8))
-    ax = fig.add_subplot(111, projection="3d")
-    ax.view_init(elev=30, azim=60, roll=0)
+def load_frames(simulation_file_name, lazy=False):
+    """Loads geometries, bounding box and frame indexed trajectory of a file.
 
-    # Play/Pause button
-    ax_play = plt.axes([0.8, 0.025, 0.1, 0.04])
-    button_play = Button(ax_play, "Play")
-    is_playing = True
+    Args:
+        simulation_file_name: trajectory file in JuPedSim sqlite format
+        lazy: only load the frames around the accessed ones, see
+            :class:`LazyTrajectoryFrames`, instead of the whole (cached)
+            trajectory
 
-    # Slider
-    ax_slider = plt.axes([0.2, 0.1, 0.55, 0.03])
-    slider = Slider(ax_slider, "Frame", 1, max_frame, valinit=1, valfmt="%0.0f")
-
-    # Set view params
-    def set_plot_view_param():
-        # ax.set_xlabel("X")
-        # ax.set_ylabel("Y")
-        # ax.set_zlabel("Z")
-        ax.set_xlim(xmin, xmax)
-        ax.set_ylim(ymin, ymax)
-        ax.set_zlim(0, 2)
-        ax.set_aspect("equal", adjustable="box")
+    Returns:
+        :class:`TrajectoryFrames` or :class:`LazyTrajectoryFrames`, to be
+        closed after rendering
+    """
+    source = pathlib.Path(simulation_file_name)
+    geometries, bounds = load_scene(source)
+    if lazy:
+        return LazyTrajectoryFrames(source, geometries, bounds)
+
+    # Get the frame data, indexed by frame
+    frame_data = sort_by_frame(
+        load_trajectory_arrays_cached(source, columns=VISUALISATOR_COLUMNS)
+    )
+
+    return TrajectoryFrames(
+        source=source,
+        geometries=geometries,
+        bounds=bounds,
+        data=frame_data,
+        index=FrameIndex(frame_data["frame"]),
+    )
+
+
+def set_plot_view_param(ax, bounds, options):
+    xmin, xmax, ymin, ymax = bounds
+    ax.view_init(elev=options.elev, azim=options.azim, roll=options.roll)
+    if options.show_axis_labels:
+        ax.set_xlabel("X")
+        ax.set_ylabel("Y")
+        ax.set_zlabel("Z")
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    ax.set_zlim(0, 2)
+    ax.set_aspect("equal", adjustable="box")
+    if not options.show_tick_labels:
         ax.set_xticklabels([])
         ax.set_yticklabels([])
+    if not options.show_z_tick_labels:
         ax.set_zticklabels([])
 
-    # Plot function
-    def plot_frame(frame):
-        ax.cla()
-        set_plot_view_param()
-
-        # All agents in this frame
-        agent_data = [row for row in frame_data if row[0] == frame]
-
-        for agent in agent_data:
-            pos_x, pos_y = agent[2], agent[3]
-            ori_x, ori_y = agent[4], agent[5]
-            pelvis_pos = np.array(agent[9:12])
-            heel_right_pos = np.array(agent[12:15])
-            heel_left_pos = np.array(agent[15:18])
-            toe_right_pos = np.array(agent[18:21])
-            toe_left_pos = np.array(agent[21:24])
-
-            pelvis_rotation_angle_z = agent[24]
-            shoulder_rotation_angle_z = agent[25]
-            trunk_rotation_angle_x = agent[26]
-            trunk_rotation_angle_y = agent[27]
-
-            # Pelvis segment
-            # pelvis_right_x = (
-            #     pelvis_pos[0] + np.cos(pelvis_rotation_angle_z) * pelvis_width * 0.5
-            # )
-            # pelvis_right_y = (
-            #     pelvis_pos[1] + np.sin(pelvis_rotation_angle_z) * pelvis_width * 0.5
-            # )
-            # pelvis_left_x = (
-            #     pelvis_pos[0] - np.cos(pelvis_rotation_angle_z) * pelvis_width * 0.5
-            # )
-            # pelvis_left_y = (
-            #     pelvis_pos[1] - np.sin(pelvis_rotation_angle_z) * pelvis_width * 0.5
-            # )
-
-            # ax.plot(
-            #     [pelvis_right_x, pelvis_left_x],
-            #     [pelvis_right_y, pelvis_left_y],
-            #     [pelvis_pos[2], pelvis_pos[2]],
-            #     "b-",
-            # )
-
-            # Feet
-            ax.plot(
-                [heel_right_pos[0], toe_right_pos[0]],
-                [heel_right_pos[1], toe_right_pos[1]],
-                [heel_right_pos[2], heel_right_pos[2]],
-                "g-",
-            )
-            ax.plot(
-                [heel_left_pos[0], toe_left_pos[0]],
-                [heel_left_pos[1], toe_left_pos[1]],
-                [heel_left_pos[2], heel_left_pos[2]],
-                "r-",
-            )
 
-            # Legs
-            ax.plot(
-                [pos_x, heel_right_pos[0]],  # [pelvis_right_x, heel_right_pos[0]],
-                [pos_y, heel_right_pos[1]],  # [pelvis_right_y, heel_right_pos[1]],
-                [pelvis_pos[2], heel_right_pos[2]],
-                "b-",
-            )
-            ax.plot(
-                [pos_x, heel_left_pos[0]],  # [pelvis_left_x, heel_left_pos[0]],
-                [pos_y, heel_left_pos[1]],  # [pelvis_left_y, heel_left_pos[1]],
-                [pelvis_pos[2], heel_left_pos[2]],
-                "b-",
-            )
+def setup_scene(ax, frames, options, animated=False):
+    """Draws the static scene and returns the artists updated per frame."""
+    set_plot_view_param(ax, frames.bounds, options)
+    draw_geometries(ax, frames.geometries)
+    artists = create_agent_artists(ax, animated=animated)
+    if options.show_title:
+        ax.title.set_animated(animated)
+    return artists
 
-            # C7 position
-            c7_pos_x = pos_x + ori_x * np.sin(trunk_rotation_angle_y) * trunk_length
-            c7_pos_y = pos_y + ori_y * np.sin(trunk_rotation_angle_x) * trunk_length
-            c7_pos_z = pelvis_pos[2] + trunk_length * np.cos(
-                trunk_rotation_angle_x
-            ) * np.cos(trunk_rotation_angle_y)
 
-            ax.plot(
-                [pos_x, c7_pos_x], [pos_y, c7_pos_y], [pelvis_pos[2], c7_pos_z], "b-"
-            )
+def plot_frame(ax, artists, frames, frame, options):
+    update_agent_artists(artists, frames.frame(frame))
+    if options.show_title:
+        ax.set_title(f"Frame {frame}")
 
-            # Head
-            head_pos_x = c7_pos_x
-            head_pos_y = c7_pos_y
-            head_pos_z = c7_pos_z + neck_length
-            ax.plot([head_pos_x], [head_pos_y], [head_pos_z], "bo", markersize=2)
 
-            # Shoulders
-            shoulder_right_x = (
-                c7_pos_x + np.cos(shoulder_rotation_angle_z) * shoulder_width * 0.5
-            )
-            shoulder_right_y = (
-                c7_pos_y + np.sin(shoulder_rotation_angle_z) * shoulder_width * 0.5
-            )
-            shoulder_left_x = (
-                c7_pos_x - np.cos(shoulder_rotation_angle_z) * shoulder_width * 0.5
-            )
-            shoulder_left_y = (
-                c7_pos_y - np.sin(shoulder_rotation_angle_z) * shoulder_width * 0.5
-            )
+def render(frames: TrajectoryFrames, options: RenderOptions = RenderOptions()):
+    """Shows the frames interactively or exports them into options.output_file.
 
-            ax.plot(
-                [shoulder_right_x, shoulder_left_x],
-                [shoulder_right_y, shoulder_left_y],
-                [pelvis_pos[2] + trunk_length, pelvis_pos[2] + trunk_length],
-                "b-",
-            )
+    Args:
+        frames: trajectory to render, see :func:`load_frames`
+        options: view and output options
+    """
+    if options.output_file is not None:
+        export_video(frames, options)
+    else:
+        show_interactive(frames, options)
 
-            ## radius
-            # Calculate distances from pelvis center to each foot heel
-            distance_right = np.linalg.norm(heel_right_pos[:2] - pelvis_pos[:2])
-            distance_left = np.linalg.norm(heel_left_pos[:2] - pelvis_pos[:2])
-
-            # colision radius
-            radius = 0.3
-
-            # Create a circle in the XY plane centered at the pelvis position
-            theta = np.linspace(0, 2 * np.pi, 100)
-            circle_x = pelvis_pos[0] + radius * np.cos(theta)
-            circle_y = pelvis_pos[1] + radius * np.sin(theta)
-            circle_z = np.full_like(
-                circle_x, pelvis_pos[2]
-            )  # Keep circle at pelvis height
-
-            ax.plot(
-                circle_x,
-                circle_y,
-                circle_z,
-                "k--",
-                linewidth=1,
-            )
 
-            # Plot all the geometries on the ground
-            for geom in geometries:
-                if geom.geom_type == "Polygon":
-                    x, y = geom.exterior.xy
-                    z = np.zeros_like(x)
-                    ax.plot(x, y, z, color="blue", alpha=0.6, linewidth=1, zorder=1)
-                    for interior in geom.interiors:
-                        x, y = interior.xy
-                        ax.plot(x, y, color="black", alpha=0.6, linewidth=1, zorder=1)
+def show_interactive(frames: TrajectoryFrames, options: RenderOptions):
+    blit = options.blit
+    max_frame = frames.max_frame
 
-        # ax.set_title(f"Frame {frame}")
+    # Figure + axes
+    fig = plt.figure(figsize=(10, 8))
+    ax = fig.add_subplot(111, projection="3d")
+
+    # Play/Pause button
+    ax_play = plt.axes([0.8, 0.025, 0.1, 0.04])
+    button_play = Button(ax_play, "Play")
+    is_playing = True
+
+    # Slider (with blitting, only its bar and value are redrawn while playing)
+    ax_slider = plt.axes([0.2, 0.1, 0.55, 0.03])
+    slider = Slider(
+        ax_slider,
+        "Frame",
+        1,
+        max_frame,
+        valinit=1,
+        valfmt="%0.0f",
+        handle_style={"size": 0} if blit else None,
+    )
+    if blit:
+        slider.drawon = False
+        slider.poly.set_animated(True)
+        slider.valtext.set_animated(True)
+
+    # Static scene: view and geometries are only drawn once
+    agent_artists = setup_scene(ax, frames, options, animated=blit)
+    animated_artists = [*agent_artists.values(), slider.poly, slider.valtext]
+    if options.show_title:
+        animated_artists.append(ax.title)
 
     # Slider update callback
     def slider_update(val):
-        frame = int(slider.val)
-        plot_frame(frame)
-        fig.canvas.draw_idle()
+        plot_frame(ax, agent_artists, frames, int(slider.val), options)
+        if not (blit and is_playing):
+            fig.canvas.draw_idle()
 
     slider.on_changed(slider_update)
 
@@ -226,6 +429,7 @@ def create_visualisator(simulation_file_name, saving_file_name=""):
             current_frame = int(slider.val)
             next_frame = (current_frame + 1) if current_frame < max_frame else 1
             slider.set_val(next_frame)
+        return animated_artists
 
     # Button callback
     def toggle_play(event):
@@ -236,21 +440,258 @@ def create_visualisator(simulation_file_name, saving_file_name=""):
     button_play.on_clicked(toggle_play)
 
     # Initialize plot
-    plot_frame(1)
+    plot_frame(ax, agent_artists, frames, 1, options)
 
     # Animation loop
     ani = animation.FuncAnimation(
-        fig, animate, frames=max_frame, interval=50, cache_frame_data=False
+        fig,
+        animate,
+        frames=max_frame,
+        interval=50,
+        blit=blit,
+        cache_frame_data=False,
     )
+    plt.show()
 
-    if saving_file_name != "":
-        writer = animation.FFMpegWriter(fps=30, metadata=dict(artist="Me"))
-        ani.save(saving_file_name, writer=writer)
-    else:
-        plt.show()
+
+## Headless rendering ###
+
+
+class HeadlessRenderer:
+    """Renders frames into RGBA images without a GUI."""
+
+    def __init__(self, frames: TrajectoryFrames, options: RenderOptions):
+        width, height = options.resolution
+        fig = Figure(
+            figsize=(width / options.dpi, height / options.dpi), dpi=options.dpi
+        )
+        self.canvas = FigureCanvasAgg(fig)
+        self.ax = fig.add_subplot(111, projection="3d")
+        self.artists = setup_scene(self.ax, frames, options)
+        self.frames = frames
+        self.options = options
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.canvas.get_width_height()
+
+    def render(self, frame: int) -> bytes:
+        plot_frame(self.ax, self.artists, self.frames, frame, self.options)
+        self.canvas.draw()
+        return bytes(self.canvas.buffer_rgba())
+
+
+# renderer of an export worker process, see _init_export_worker
+_export_worker: Dict[str, HeadlessRenderer] = {}
+
+
+def _init_export_worker(simulation_file_name, options, lazy):
+    _export_worker["renderer"] = HeadlessRenderer(
+        load_frames(simulation_file_name, lazy=lazy), options
+    )
+
+
+def _render_frames(frames):
+    return [_export_worker["renderer"].render(frame) for frame in frames]
+
+
+def export_video(frames: TrajectoryFrames, options: RenderOptions):
+    """Renders the trajectory headless into options.output_file.
+
+    The frames are split into tasks of options.frames_per_task frames which
+    are rendered by a pool of worker processes. The rendered images are piped
+    in order into a single ffmpeg process (see the matplotlib rc parameter
+    "animation.ffmpeg_path"), at most two tasks per worker are in flight to
+    bound the memory.
+
+    Args:
+        frames: trajectory to render, the workers load it again (in the
+            same way) from its source file
+        options: view and output options
+    """
+    frame_numbers = np.arange(
+        frames.min_frame, frames.max_frame + 1, options.frame_stride
+    )
+    tasks = [
+        frame_numbers[start : start + options.frames_per_task]
+        for start in range(0, len(frame_numbers), options.frames_per_task)
+    ]
+
+    # the size of the images rendered by the workers
+    width, height = FigureCanvasAgg(
+        Figure(
+            figsize=(
+                options.resolution[0] / options.dpi,
+                options.resolution[1] / options.dpi,
+            ),
+            dpi=options.dpi,
+        )
+    ).get_width_height()
+    processes = options.processes or os.cpu_count()
+
+    ffmpeg = subprocess.Popen(
+        [
+            matplotlib.rcParams["animation.ffmpeg_path"],
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgba",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            str(options.fps),
+            "-i",
+            "-",
+            # libx264 requires an even width and height
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-pix_fmt",
+            "yuv420p",
+            str(options.output_file),
+        ],
+        stdin=subprocess.PIPE,
+    )
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_export_worker,
+        initargs=(
+            frames.source,
+            options,
+            isinstance(frames, LazyTrajectoryFrames),
+        ),
+    ) as executor:
+        max_pending = 2 * processes
+        pending = collections.deque()
+        tasks = iter(tasks)
+        try:
+            while True:
+                for task in tasks:
+                    pending.append(executor.submit(_render_frames, task))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                for image in pending.popleft().result():
+                    ffmpeg.stdin.write(image)
+        finally:
+            ffmpeg.stdin.close()
+
+    # forked workers inherit the pipe to ffmpeg, it only sees the end of the
+    # input once they have exited
+    if ffmpeg.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed with exit code {ffmpeg.returncode}.")
+
+
+def benchmark(
+    frames: TrajectoryFrames, options: RenderOptions, num_frames: int = 100
+) -> float:
+    """Measures the headless rendering speed of a single process.
+
+    Args:
+        frames: trajectory to render
+        options: view options, the output options are ignored
+        num_frames: number of frames to render, starting with the first one
+
+    Returns:
+        Rendered frames per second
+    """
+    renderer = HeadlessRenderer(frames, options)
+    frame_numbers = range(
+        frames.min_frame, min(frames.min_frame + num_frames, frames.max_frame + 1)
+    )
+
+    start = time.perf_counter()
+    for frame in frame_numbers:
+        renderer.render(frame)
+    return len(frame_numbers) / (time.perf_counter() - start)
+
+
+def create_visualisator(
+    simulation_file_name, saving_file_name="", blit=True, lazy=False
+):
+    with contextlib.closing(load_frames(simulation_file_name, lazy=lazy)) as frames:
+        render(
+            frames,
+            dataclasses.replace(
+                PRESETS["default"],
+                output_file=(
+                    pathlib.Path(saving_file_name) if saving_file_name else None
+                ),
+                blit=blit,
+            ),
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="3D visualisation of humanoid trajectories."
+    )
+    parser.add_argument("simulation_file", type=pathlib.Path)
+    parser.add_argument(
+        "video_file",
+        type=pathlib.Path,
+        nargs="?",
+        help="export into this video instead of showing the trajectory",
+    )
+    parser.add_argument("--preset", choices=PRESETS, default="default")
+    parser.add_argument("--elev", type=float)
+    parser.add_argument("--azim", type=float)
+    parser.add_argument("--roll", type=float)
+    parser.add_argument("--no-blit", dest="blit", action="store_false", default=None)
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="only load the frames around the shown one, e.g., for huge files",
+    )
+    parser.add_argument("--processes", type=int, help="export worker processes")
+    parser.add_argument("--frame-stride", type=int, help="export every n-th frame")
+    parser.add_argument(
+        "--resolution",
+        type=lambda value: tuple(int(size) for size in value.split("x")),
+        help="export resolution as WIDTHxHEIGHT",
+    )
+    parser.add_argument("--fps", type=int, help="frame rate of the video")
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="FRAMES",
+        help="only measure the headless rendering speed over FRAMES frames",
+    )
+    args = parser.parse_args(argv)
+
+    options = dataclasses.replace(
+        PRESETS[args.preset],
+        output_file=args.video_file,
+        **{
+            field: getattr(args, field)
+            for field in [
+                "elev",
+                "azim",
+                "roll",
+                "blit",
+                "processes",
+                "frame_stride",
+                "resolution",
+                "fps",
+            ]
+            if getattr(args, field) is not None
+        },
+    )
+    with contextlib.closing(
+        load_frames(args.simulation_file, lazy=args.lazy)
+    ) as frames:
+        if args.benchmark:
+            agents = len(frames.frame(frames.min_frame)["id"])
+            fps = benchmark(frames, options, args.benchmark)
+            print(f"{fps:.2f} frames/s ({agents} agents in the first frame)")
+            return
+
+        render(frames, options)
 
 
 if __name__ == "__main__":
-    file_name = sys.argv[1]
-    saving_file_name = sys.argv[2] if len(sys.argv) > 2 else ""
-    create_visualisator(file_name, saving_file_name)
+    main()